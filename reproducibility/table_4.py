@@ -18,19 +18,17 @@ model_list = [
 data_name = "INS_MMBench_fundamental"
 
 
-for model in model_list:
-    cmd = [
-        "python",
-        "run.py",
-        "--data", data_name,
-        "--model", model,
-        "--verbose",
-        "--nproc", "4"
-    ]
-    print(f"Running: {' '.join(cmd)}")
-
-    result = subprocess.run(cmd, capture_output=True, text=True)
-    print(result.stdout)
+# All models in one process: the API models run concurrently, evaluated as soon as they finish
+cmd = [
+    "python",
+    "-m", "vlmeval.sweep",
+    "--data", data_name,
+    "--model", *model_list,
+    "--verbose",
+    "--nproc", "4"
+]
+print(f"Running: {' '.join(cmd)}")
+subprocess.run(cmd, check=True)
 
 target_columns = [
     "Overall",
@@ -8,32 +8,17 @@ model_list = [
     "Gemini1_5Flash"
 ]
 
-dataset_list = [
-    "multi_step_claim",
-    "multi_step_liability",
-    "multi_step_health",
-    "multi_step_property",
-    "multi_step_agri"
+# All models and datasets in one process: the API models run concurrently, each dataset is loaded once
+cmd = [
+    "python",
+    "-m", "vlmeval.sweep",
+    "--data", "multi_step_*",  # multi_step_claim, _liability, _health, _property and _agri
+    "--model", *model_list,
+    "--verbose",
+    "--nproc", "4"
 ]
-
-all_records = []
-
-for model in model_list:
-    for dataset in dataset_list:
-        print(f"Running model={model} on dataset={dataset}")
-        
-        cmd = [
-            "python",
-            "run.py",
-            "--data", dataset,
-            "--model", model,
-            "--verbose",
-            "--nproc", "4"
-        ]
-
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        
-        output = result.stdout
+print(f"Running: {' '.join(cmd)}")
+subprocess.run(cmd, check=True)
 
 
 # Note that the output is not directly a table. Instead, the output is the source result for generating the table in latex. 
@@ -1,10 +1,9 @@
-import torch
-import torch.distributed as dist
 from vlmeval.smp import *
-from vlmeval.evaluate import *
+import vlmeval.evaluate as evaluate
 from vlmeval.inference import infer_data_job
 from vlmeval.config import supported_VLM
-from vlmeval.utils import dataset_URLs, DATASET_TYPE, abbr2full, MMMU_result_transfer
+from vlmeval.api import init_run, response_cache_stats
+from vlmeval.utils import dataset_URLs, abbr2full, MMMU_result_transfer, materialize_images
 
 
 def parse_args():
@@ -14,11 +13,29 @@ def parse_args():
     parser.add_argument('--work-dir', type=str, default='.', help='select the output directory')
     parser.add_argument('--mode', type=str, default='all', choices=['all', 'infer'])
     parser.add_argument('--nproc', type=int, default=4, help='Parallel API calling')
+    parser.add_argument(
+        '--engine', type=str, default='mp', choices=['mp', 'async'],
+        help='Execution engine for API VLMs: a process pool (mp) or asyncio (async, --nproc in-flight requests)')
+    parser.add_argument(
+        '--shard', type=str, default='static', choices=['static', 'dynamic'],
+        help='Split local model inference across ranks statically (rank::world_size) or with a shared work queue')
     parser.add_argument('--retry', type=int, default=None, help='retry numbers for API VLMs')
+    parser.add_argument(
+        '--max-concurrency', type=int, default=None, help='The upper bound of in-flight requests of API VLMs')
     parser.add_argument('--judge', type=str, default=None)
     parser.add_argument('--ignore', action='store_true', help='Ignore failed indices. ')
     parser.add_argument('--verbose', action='store_true')
     parser.add_argument('--rerun', action='store_true')
+    parser.add_argument(
+        '--stream', action='store_true',
+        help='Evaluate the predictions (judge calls included) while the inference is running')
+    parser.add_argument(
+        '--export', type=str, nargs='+', default=[], choices=['xlsx', 'csv', 'tsv'],
+        help='Also export the prediction and evaluation record files in these formats at the end')
+    parser.add_argument(
+        '--prepare', action='store_true', help='Decode all images of the datasets (in parallel) before the inference')
+    parser.add_argument(
+        '--cache', action='store_true', help='Serve repeated API VLM requests from the response cache (always on for judges)')
     args = parser.parse_args()
     return args
 
@@ -28,21 +45,30 @@ def main():
 
     args = parse_args()
     assert len(args.data), '--data should be a list of data files'
-
-    if args.retry is not None:
-        for k, v in supported_VLM.items():
-            if hasattr(v, 'keywords') and 'retry' in v.keywords:
-                v.keywords['retry'] = args.retry
-                supported_VLM[k] = v
-            if hasattr(v, 'keywords') and 'verbose' in v.keywords:
-                v.keywords['verbose'] = args.verbose
-                supported_VLM[k] = v
+    # The API workers and judges started below share the rate limiter state of the run
+    init_run()
+    if args.cache:
+        os.environ['VLMEVAL_CACHE'] = '1'
 
     rank, world_size = get_rank_and_world_size()
     if world_size > 1:
+        import torch
+        import torch.distributed as dist
         local_rank = os.environ.get('LOCAL_RANK', 0)
-        torch.cuda.set_device(int(local_rank))
-        dist.init_process_group(backend='nccl', timeout=datetime.timedelta(seconds=10800))
+        # gloo allows to run distributed inference on CPU (e.g. to try out stub models)
+        backend = 'nccl' if torch.cuda.is_available() else 'gloo'
+        if backend == 'nccl':
+            torch.cuda.set_device(int(local_rank))
+        dist.init_process_group(backend=backend, timeout=datetime.timedelta(seconds=10800))
+
+    if args.prepare:
+        if rank == 0:
+            for dataset_name in args.data:
+                dataset_name = dataset_name if dataset_name in dataset_URLs else abbr2full(dataset_name)
+                if dataset_name in dataset_URLs:
+                    materialize_images(dataset_name)
+        if world_size > 1:
+            barrier()
 
     for _, model_name in enumerate(args.model):
         model = None
@@ -66,13 +92,29 @@ def main():
                 else:
                     custom_flag = True
 
-            result_file = f'{pred_root}/{model_name}_{dataset_name}.xlsx'
+            result_file = result_path(f'{pred_root}/{model_name}_{dataset_name}')
             if osp.exists(result_file) and args.rerun:
                 os.system(f'rm {pred_root}/{model_name}_{dataset_name}_*')
 
             if model is None:
                 model = model_name  # which is only a name
 
+            # Per-run overrides of API VLMs, applied when the model is built (supported_VLM is left untouched)
+            model_kwargs = {}
+            if model_name in supported_VLM and supported_VLM.is_api(model_name):
+                model_kwargs = dict(max_concurrency=args.max_concurrency)
+                if args.retry is not None:
+                    model_kwargs.update(retry=args.retry, verbose=args.verbose)
+
+            judge_kwargs = evaluate.build_judge_kwargs(
+                dataset_name, judge=args.judge, nproc=args.nproc, verbose=args.verbose, retry=args.retry)
+
+            # Datasets that may skip the evaluation below are evaluated after the inference only
+            stream = None
+            skip_stream = listinstr(['MMBench', 'MMMU_TEST'], dataset_name)
+            if args.stream and rank == 0 and args.mode == 'all' and not skip_stream:
+                stream = evaluate.build_stream(result_file, dataset_name, custom_flag=custom_flag, **judge_kwargs)
+
             model = infer_data_job(
                 model,
                 work_dir=pred_root,
@@ -80,7 +122,11 @@ def main():
                 dataset_name=dataset_name,
                 verbose=args.verbose,
                 api_nproc=args.nproc,
-                ignore_failed=args.ignore)
+                ignore_failed=args.ignore,
+                engine=args.engine,
+                shard=args.shard,
+                model_kwargs=model_kwargs,
+                stream=stream)
 
             if rank == 0:
                 if dataset_name in ['MMMU_TEST']:
@@ -99,61 +145,19 @@ def main():
                     )
                     continue
 
-            judge_kwargs = {
-                'nproc': args.nproc,
-                'verbose': args.verbose,
-            }
-            if args.retry is not None:
-                judge_kwargs['retry'] = args.retry
-            if args.judge is not None:
-                judge_kwargs['model'] = args.judge
-            else:
-                if DATASET_TYPE(dataset_name) in ['multi-choice', 'Y/N']:
-                    judge_kwargs['model'] = 'chatgpt-0613'
-                elif listinstr(['MMVet', 'MathVista', 'LLaVABench'], dataset_name):
-                    judge_kwargs['model'] = 'gpt-4-turbo'
-            if 'OPENAI_API_KEY_JUDGE' in os.environ and len(os.environ['OPENAI_API_KEY_JUDGE']):
-                judge_kwargs['key'] = os.environ['OPENAI_API_KEY_JUDGE']
-            if 'OPENAI_API_BASE_JUDGE' in os.environ and len(os.environ['OPENAI_API_BASE_JUDGE']):
-                judge_kwargs['api_base'] = os.environ['OPENAI_API_BASE_JUDGE']
-
-            if rank == 0 and args.mode == 'all':
-                if DATASET_TYPE(dataset_name) == 'multi-choice':
-                    dataset_name = 'default' if custom_flag else dataset_name
-                    multiple_choice_eval(
-                        result_file,
-                        dataset=dataset_name,
-                        **judge_kwargs)
-
-                elif DATASET_TYPE(dataset_name) == 'Y/N':
-                    YOrN_eval(
-                        result_file,
-                        dataset=dataset_name,
-                        **judge_kwargs)
-                elif DATASET_TYPE(dataset_name) == 'multi_step_claim':
-                    multi_step_claim_eval(result_file)
-                elif DATASET_TYPE(dataset_name) == 'multi_step_property':
-                    multi_step_property_eval(result_file)
-                elif DATASET_TYPE(dataset_name) == 'multi_step_agri':
-                    multi_step_agri_eval(result_file)
-                elif DATASET_TYPE(dataset_name) == 'multi_step_liability':
-                    multi_step_liability_eval(result_file)
-                elif DATASET_TYPE(dataset_name) == 'multi_step_health':
-                    multi_step_health_eval(result_file)    
-                elif DATASET_TYPE(dataset_name) == 'Caption':
-                    COCO_eval(result_file)
-                elif dataset_name == 'MMVet':
-                    MMVet_eval(result_file, **judge_kwargs)
-                elif dataset_name == 'OCRBench':
-                    OCRBench_eval(result_file)
-                elif listinstr(['OCRVQA', 'TextVQA', 'ChartQA', 'DocVQA', 'InfoVQA', 'textfree_test'], dataset_name):
-                    VQAEval(result_file)
-                elif listinstr(['MathVista'], dataset_name):
-                    MathVista_eval(result_file, **judge_kwargs)
-                elif listinstr(['LLaVABench'], dataset_name):
-                    LLaVABench_eval(result_file, **judge_kwargs)
-                else:
-                    logger.error(f'Dataset {dataset_name} is not handled by evaluator, will be skipped. ')
+            if stream is not None:
+                stream.finish()
+            elif rank == 0 and args.mode == 'all':
+                evaluate.evaluate_result(result_file, dataset_name, custom_flag=custom_flag, **judge_kwargs)
+
+            if rank == 0 and len(args.export):
+                suffix = result_file.split('.')[-1]
+                for pth in ls(pred_root, match=f'{model_name}_{dataset_name}', mode='file'):
+                    if pth.endswith(f'.{suffix}'):
+                        logger.info(f'Exported {pth} to {export_result(pth, args.export)}')
+
+    if rank == 0 and args.mode == 'all':
+        logger.info(f'Response cache hits / misses of this run: {response_cache_stats()}')
 
 
 if __name__ == '__main__':
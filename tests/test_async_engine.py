@@ -0,0 +1,127 @@
+import asyncio
+import threading
+import pandas as pd
+import pytest
+import vlmeval.inference as inference
+from vlmeval.utils.checkpoint import CheckpointJournal
+
+aiohttp = pytest.importorskip('aiohttp')
+from aiohttp import web  # noqa: E402
+
+N_ITEMS = 24
+NPROC = 4
+MODEL_NAME = 'StubGPT'
+
+
+class StubServer:
+    """A local OpenAI-compatible chat completion endpoint, that answers every question after ``delay``
+    seconds and records the peak number of in-flight requests."""
+
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.questions = []
+        self.inflight = 0
+        self.max_inflight = 0
+
+    async def handle(self, request):
+        payload = await request.json()
+        question = [x['text'] for x in payload['messages'][-1]['content'] if x['type'] == 'text'][0]
+        self.questions.append(question)
+        self.inflight += 1
+        self.max_inflight = max(self.max_inflight, self.inflight)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.inflight -= 1
+        return web.json_response(dict(choices=[dict(message=dict(content=answer_of(question)))]))
+
+    def start(self):
+        started = threading.Event()
+        self.loop = asyncio.new_event_loop()
+
+        async def serve():
+            app = web.Application()
+            app.router.add_post('/v1/chat/completions', self.handle)
+            self.runner = web.AppRunner(app)
+            await self.runner.setup()
+            site = web.TCPSite(self.runner, '127.0.0.1', 0)
+            await site.start()
+            self.port = site._server.sockets[0].getsockname()[1]
+            started.set()
+
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        asyncio.run_coroutine_threadsafe(serve(), self.loop)
+        assert started.wait(10)
+        return f'http://127.0.0.1:{self.port}/v1/chat/completions'
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self.runner.cleanup(), self.loop).result(10)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(10)
+        self.loop.close()
+
+
+def answer_of(question):
+    return f'The answer to {question}'
+
+
+class StubDataset:
+
+    def __init__(self, n=N_ITEMS):
+        questions = [f'question {i}?' for i in range(n)]
+        self.data = pd.DataFrame(dict(index=list(range(n)), question=questions))
+
+    def build_prompt(self, line):
+        # A remote image is sent by URL, the stub server never fetches it
+        return dict(text=line['question'], image=f'http://127.0.0.1/{line["index"]}.jpg')
+
+
+@pytest.fixture
+def server():
+    server = StubServer()
+    yield server, server.start()
+    server.stop()
+
+
+@pytest.fixture
+def run_api(server, tmp_path, monkeypatch):
+    from vlmeval.api import GPT4V
+    _, api_base = server
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv('VLMEVAL_CACHE', raising=False)
+    (tmp_path / MODEL_NAME).mkdir()
+    # tiktoken downloads its encodings, the prompts are short anyway
+    monkeypatch.setattr(GPT4V, 'get_token_len', lambda self, inputs: 100)
+    model = GPT4V(model='gpt-4-vision-preview', key='sk-stub', api_base=api_base, retry=2, wait=0, verbose=False)
+    dataset = StubDataset()
+    monkeypatch.setattr(inference, 'TSVDataset', lambda dataset_name: dataset)
+    monkeypatch.setattr(inference, 'build_model', lambda model_name, model_kwargs=None: model)
+
+    def run():
+        return inference.infer_data_api(
+            MODEL_NAME, 'stub', set(dataset.data['index']), api_nproc=NPROC, engine='async')
+    return run
+
+
+def test_async_engine_answers_every_index(server, run_api):
+    stub, _ = server
+    res = run_api()
+    assert res == {i: answer_of(f'question {i}?') for i in range(N_ITEMS)}
+    assert sorted(stub.questions) == sorted(f'question {i}?' for i in range(N_ITEMS))
+    assert 1 < stub.max_inflight <= NPROC
+
+
+def test_async_engine_resumes_from_the_journal(server, run_api):
+    stub, _ = server
+    done = {i: f'journaled {i}' for i in range(0, N_ITEMS, 3)}
+    # A run killed before its first compaction: the journal only, no snapshot
+    ckpt = CheckpointJournal(f'{MODEL_NAME}/{MODEL_NAME}_stub_supp.pkl', compact_every=N_ITEMS)
+    for k, v in done.items():
+        ckpt.append(k, v)
+    ckpt.sync()
+    ckpt.fout.close()
+
+    res = run_api()
+    assert sorted(stub.questions) == sorted(f'question {i}?' for i in range(N_ITEMS) if i not in done)
+    assert res == {i: done.get(i, answer_of(f'question {i}?')) for i in range(N_ITEMS)}
@@ -0,0 +1,74 @@
+import pandas as pd
+import pytest
+from vlmeval.inference import batch_size_of, infer_batch, infer_item
+from vlmeval.utils.scheduler import schedule
+
+torch = pytest.importorskip('torch')
+transformers = pytest.importorskip('transformers')
+
+PAD_ID = 0
+MAX_NEW_TOKENS = 6
+
+
+class TinyLM:
+    """A randomly initialized 2-layer GPT-2 on CPU, behind the ``generate`` / ``batch_generate`` interface
+    of the local VLMs (``batch_generate`` left-pads the prompts like ``QwenVL`` does)."""
+
+    def __init__(self, batch_size=4):
+        from transformers import GPT2Config, GPT2LMHeadModel
+        torch.manual_seed(0)
+        config = GPT2Config(
+            vocab_size=101, n_positions=256, n_embd=32, n_layer=2, n_head=2, bos_token_id=None, eos_token_id=None)
+        self.model = GPT2LMHeadModel(config).eval()
+        self.batch_size = batch_size
+
+    @staticmethod
+    def encode(text):
+        return torch.tensor([ord(c) % 100 + 1 for c in text])
+
+    def _generate(self, input_ids, attention_mask):
+        with torch.inference_mode():
+            output_ids = self.model.generate(
+                input_ids, attention_mask=attention_mask, max_new_tokens=MAX_NEW_TOKENS, do_sample=False,
+                pad_token_id=PAD_ID)
+        return [' '.join(str(t) for t in x[input_ids.shape[1]:].tolist()) for x in output_ids]
+
+    def generate(self, prompt, image_path, dataset=None):
+        input_ids = self.encode(prompt)[None]
+        return self._generate(input_ids, torch.ones_like(input_ids))[0]
+
+    def batch_generate(self, structs, dataset=None):
+        from vlmeval.utils.batching import left_pad
+        input_ids, attention_mask = left_pad([self.encode(s['text']) for s in structs], PAD_ID)
+        return self._generate(input_ids, attention_mask)
+
+
+class StubDataset:
+
+    def __init__(self, n=20):
+        questions = [f'question {i}? ' * (i % 5 + 1) for i in range(n)]
+        self.data = pd.DataFrame(dict(index=list(range(n)), question=questions))
+
+    def build_prompt(self, line):
+        return dict(text=line['question'], image=None)
+
+
+def test_left_pad():
+    from vlmeval.utils.batching import left_pad
+    input_ids, attention_mask = left_pad([torch.tensor([5, 6, 7]), torch.tensor([8])], PAD_ID)
+    assert input_ids.tolist() == [[5, 6, 7], [PAD_ID, PAD_ID, 8]]
+    assert attention_mask.tolist() == [[1, 1, 1], [0, 0, 1]]
+
+
+def test_batch_generate_matches_sequential():
+    model, dataset = TinyLM(batch_size=4), StubDataset()
+    data = dataset.data
+    batched = {}
+    batches = schedule(data, batch_size_of(model, 'stub'))
+    assert max(len(b) for b in batches) == 4
+    for batch in batches:
+        lines = [data.iloc[i] for i in batch]
+        for line, response in zip(lines, infer_batch(model, dataset, lines, 'stub')):
+            batched[line['index']] = response
+    sequential = {line['index']: infer_item(model, dataset, line, 'stub') for _, line in data.iterrows()}
+    assert batched == sequential
@@ -0,0 +1,33 @@
+import json
+import os
+import subprocess
+import sys
+
+# `import vlmeval.inference` takes about 0.5s (without the models, evaluators and their dependencies),
+# importing torch / transformers alone takes several seconds. Override with $VLMEVAL_IMPORT_BUDGET.
+IMPORT_BUDGET = float(os.environ.get('VLMEVAL_IMPORT_BUDGET', 1.0))
+HEAVY_MODULES = ['torch', 'transformers']
+
+PROBE = """
+import json, sys, time
+t = time.perf_counter()
+import vlmeval.inference
+print(json.dumps(dict(seconds=time.perf_counter() - t, modules=[m for m in {} if m in sys.modules])))
+"""
+
+
+def measure_import():
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    out = subprocess.run(
+        [sys.executable, '-c', PROBE.format(HEAVY_MODULES)], cwd=root, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def test_import_does_not_load_heavy_modules():
+    assert measure_import()['modules'] == []
+
+
+def test_import_time_budget():
+    # Best of 3 fresh interpreters, the first one may also pay for writing the bytecode cache
+    seconds = min(measure_import()['seconds'] for _ in range(3))
+    assert seconds < IMPORT_BUDGET, f'import vlmeval.inference took {seconds:.2f}s, budget {IMPORT_BUDGET}s'
@@ -0,0 +1,26 @@
+import pandas as pd
+import vlmeval.evaluate.incremental as incremental
+from vlmeval.evaluate.incremental import parse_incremental
+
+
+def parse_upper(prediction):
+    return [prediction.upper()]
+
+
+def test_parse_incremental_reparses_changes_only(tmp_path):
+    cache_file = str(tmp_path / 'x_parsed.pkl')
+    data = pd.DataFrame(dict(index=[1, 2, 3], prediction=['a', 'b', 'c']))
+    assert parse_incremental(data, parse_upper, ['parsed'], cache_file) == 3
+    data.loc[1, 'prediction'] = 'B'
+    assert parse_incremental(data, parse_upper, ['parsed'], cache_file) == 1
+    assert list(data['parsed']) == ['A', 'B', 'C']
+
+
+def test_parse_incremental_reparses_after_a_parser_change(tmp_path, monkeypatch):
+    cache_file = str(tmp_path / 'x_parsed.pkl')
+    data = pd.DataFrame(dict(index=[1, 2], prediction=['a', 'b']))
+    parse_incremental(data, parse_upper, ['parsed'], cache_file)
+    # e.g. a fixed regex in the module of the parser
+    monkeypatch.setattr(incremental, 'parser_version', lambda parse: 'fixed')
+    assert parse_incremental(data, lambda x: [x * 2], ['parsed'], cache_file) == 2
+    assert list(data['parsed']) == ['aa', 'bb']
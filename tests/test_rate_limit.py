@@ -0,0 +1,54 @@
+import os
+import subprocess
+import sys
+import time
+from vlmeval.api.rate_limit import RateLimiter
+
+
+def test_import_leaves_the_environment():
+    env = {k: v for k, v in os.environ.items() if k != 'VLMEVAL_RUN_ID'}
+    probe = 'import os, vlmeval.api, vlmeval.api.base; print("VLMEVAL_RUN_ID" in os.environ)'
+    out = subprocess.run([sys.executable, '-c', probe], env=env, capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == 'False'
+
+
+def test_local_failures_keep_the_window():
+    limiter = RateLimiter('local-failures', max_concurrency=50)
+    # e.g. a tokenizer error, or an HTTP 400
+    for _ in range(10):
+        limiter.release(False, sent=limiter.acquire())
+    assert limiter.stats()['window'] == 50
+    assert limiter.stats()['failure'] == 10
+
+
+def test_congestion_shrinks_the_window_once_per_round_trip():
+    limiter = RateLimiter('burst', max_concurrency=64)
+    sent = [limiter.acquire() for _ in range(40)]
+    time.sleep(0.01)
+    # All the requests sent with the window of 40 hit the rate limit
+    for t in sent:
+        limiter.release(False, rate_limited=True, sent=t)
+    assert limiter.stats()['window'] == 20
+    # A request sent after the decrease shrinks it again
+    limiter.release(False, overloaded=True, sent=limiter.acquire())
+    assert limiter.stats()['window'] < 20
+
+
+def test_additive_increase_per_round_trip():
+    limiter = RateLimiter('increase', max_concurrency=64, min_concurrency=1)
+    for t in [limiter.acquire() for _ in range(8)]:
+        limiter.release(False, rate_limited=True, sent=t)
+    assert limiter.stats()['window'] == 4
+    for _ in range(5):
+        sent = [limiter.acquire() for _ in range(4)]
+        time.sleep(0.02)
+        for t in sent:
+            limiter.release(True, sent=t)
+    # One slot per round trip, not one per success
+    assert 4 + 3 <= limiter.stats()['window'] <= 4 + 5
+
+
+def test_limiters_of_a_model_share_their_state():
+    a, b = RateLimiter('shared-name'), RateLimiter('shared-name')
+    a.acquire()
+    assert b.stats()['inflight'] == 1
@@ -0,0 +1,31 @@
+import sqlite3
+from vlmeval.api.cache import ResponseCache
+
+
+def stats_rows(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute('SELECT model, hits, misses FROM stats').fetchall()
+    finally:
+        conn.close()
+
+
+def test_cache_key_covers_the_endpoint():
+    from vlmeval.api import OpenAIWrapper
+    official = OpenAIWrapper('gpt-4', key='sk-stub', verbose=False)
+    proxy = OpenAIWrapper('gpt-4', key='sk-stub', api_base='http://127.0.0.1:8000/v1/chat/completions', verbose=False)
+    assert official.cache_key('question') == OpenAIWrapper('gpt-4', key='sk-stub', verbose=False).cache_key('question')
+    assert official.cache_key('question') != proxy.cache_key('question')
+
+
+def test_lookups_are_counted_in_memory(tmp_path):
+    path = str(tmp_path / 'cache.sqlite')
+    cache = ResponseCache(path, flush_interval=3600)
+    cache.put('key', 'answer', model='m')
+    for _ in range(3):
+        assert cache.get('key', model='m') == 'answer'
+        assert cache.get('other', model='m') is None
+    # Nothing is written until the counters are flushed
+    assert stats_rows(path) == []
+    assert cache.stats() == {'m': dict(hits=3, misses=3)}
+    assert stats_rows(path) == [('m', 3, 3)]
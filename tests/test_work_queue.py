@@ -0,0 +1,75 @@
+import multiprocessing as mp
+import os
+import os.path as osp
+import time
+import pandas as pd
+from vlmeval.inference import infer_data_dynamic, infer_item
+from vlmeval.utils.checkpoint import ResultWriter, load_results
+from vlmeval.utils.work_queue import WorkQueue
+
+N_ITEMS = 48
+
+
+class StubDataset:
+    """A text-only dataset of ``n`` questions of various lengths."""
+
+    def __init__(self, n=N_ITEMS):
+        questions = [f'q{i} ' * (i % 7 + 1) for i in range(n)]
+        self.data = pd.DataFrame(dict(index=list(range(1000, 1000 + n)), question=questions))
+
+    def build_prompt(self, line):
+        return dict(text=line['question'], image=None)
+
+
+class StubModel:
+    """A deterministic CPU stand-in of a local VLM, ``delay`` seconds per generation."""
+
+    def __init__(self, delay=0):
+        self.delay = delay
+
+    def generate(self, prompt, image_path, dataset=None):
+        time.sleep(self.delay)
+        return prompt[::-1].upper()
+
+
+def run_rank(rank, world_size, queue_file, out_file, delay):
+    os.environ['LOCAL_RANK'], os.environ['WORLD_SIZE'] = str(rank), str(world_size)
+    with ResultWriter(out_file) as writer:
+        infer_data_dynamic(StubModel(delay), StubDataset(), 'stub', writer, WorkQueue(queue_file), {})
+
+
+def sequential():
+    dataset, model = StubDataset(), StubModel()
+    return {line['index']: infer_item(model, dataset, line, 'stub') for _, line in dataset.data.iterrows()}
+
+
+def run_ranks(tmp_path, delays, chunk_size=4):
+    queue_file = str(tmp_path / 'queue.json')
+    WorkQueue.create(queue_file, list(range(N_ITEMS)), chunk_size, straggler_factor=2)
+    out_files = [str(tmp_path / f'{rank}{len(delays)}_stub.jsonl') for rank in range(len(delays))]
+    ctx = mp.get_context('spawn')
+    procs = [
+        ctx.Process(target=run_rank, args=(rank, len(delays), queue_file, out_files[rank], delay))
+        for rank, delay in enumerate(delays)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join(timeout=120)
+        assert p.exitcode == 0
+    return queue_file, [load_results(pth) if osp.exists(pth) else {} for pth in out_files]
+
+
+def test_dynamic_sharding_matches_sequential(tmp_path):
+    queue_file, shards = run_ranks(tmp_path, [0.01, 0.01, 0.01])
+    merged = {}
+    for shard in shards:
+        merged.update(shard)
+    assert merged == sequential()
+    state = WorkQueue(queue_file)._update(lambda state, now: state)
+    assert sorted(state['done']) == list(range(len(state['chunks'])))
+
+
+def test_fast_rank_takes_over_slow_rank(tmp_path):
+    _, (fast, slow) = run_ranks(tmp_path, [0.005, 0.1])
+    assert {**slow, **fast} == sequential()
+    assert len(fast) > len(slow)
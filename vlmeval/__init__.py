@@ -1,11 +1,17 @@
-try:
-    import torch
-except ImportError:
-    pass
+import importlib
 
-from .smp import *
-from .api import *
-from .evaluate import *
-from .utils import *
-from .vlm import *
-from .config import *
\ No newline at end of file
+# The public names of the sub-packages are resolved on first access (PEP 562), so that importing
+# `vlmeval` (or `vlmeval.smp`) does not pull torch, the model zoo and every evaluator in. Names are
+# looked up in the sub-packages in this order (the cheap ones first).
+_submodules = ['smp', 'utils', 'api', 'evaluate', 'vlm', 'config']
+
+
+def __getattr__(name):
+    if name in _submodules + ['inference']:
+        return importlib.import_module(f'.{name}', __name__)
+    if not name.startswith('__'):
+        for sub in _submodules:
+            module = importlib.import_module(f'.{sub}', __name__)
+            if hasattr(module, name):
+                return getattr(module, name)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
@@ -1,11 +1,37 @@
-from .gpt import OpenAIWrapper, GPT4V
-from .gpt_int import OpenAIWrapperInternal, GPT4V_Internal
-from .hf_chat_model import HFChatModel
-from .gemini import GeminiWrapper, GeminiProVision
-from .qwen_vl_api import QwenVLWrapper, QwenVLAPI
-from .glm_vision import GLMVisionAPI
+import importlib
+
+# API wrappers are imported on first access (PEP 562): each wrapper module pulls its own SDK
+# (e.g. google.generativeai, torch), which a run with another API does not need.
+_registry = {
+    'OpenAIWrapper': 'gpt',
+    'GPT4V': 'gpt',
+    'OpenAIWrapperInternal': 'gpt_int',
+    'GPT4V_Internal': 'gpt_int',
+    'HFChatModel': 'hf_chat_model',
+    'GeminiWrapper': 'gemini',
+    'GeminiProVision': 'gemini',
+    'QwenVLWrapper': 'qwen_vl_api',
+    'QwenVLAPI': 'qwen_vl_api',
+    'GLMVisionAPI': 'glm_vision',
+    'configure_http_pool': 'session',
+    'http_pool_stats': 'session',
+    'response_cache_stats': 'cache',
+    'init_run': 'rate_limit',
+}
 
 __all__ = [
     'OpenAIWrapper', 'HFChatModel', 'OpenAIWrapperInternal', 'GeminiWrapper',
-    'GPT4V', 'GPT4V_Internal', 'GeminiProVision','QwenVLWrapper','QwenVLAPI', 'GLMVisionAPI'
+    'GPT4V', 'GPT4V_Internal', 'GeminiProVision','QwenVLWrapper','QwenVLAPI', 'GLMVisionAPI',
+    'configure_http_pool', 'http_pool_stats', 'response_cache_stats', 'init_run'
 ]
+
+
+def __getattr__(name):
+    if name in _registry:
+        module = importlib.import_module(f'.{_registry[name]}', __name__)
+        return getattr(module, name)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
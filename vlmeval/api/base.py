@@ -1,7 +1,12 @@
+import os
 import time
-import random as rd
+import asyncio
+import os.path as osp
+from functools import partial
 from abc import abstractmethod
 from ..smp import get_logger
+from .rate_limit import RateLimiter, backoff_time
+from .cache import cache_key, get_response_cache
 
 class BaseAPI:
     
@@ -11,9 +16,23 @@ class BaseAPI:
                  system_prompt=None, 
                  verbose=True,
                  fail_msg='Failed to obtain answer via API.',
+                 rpm=None,
+                 tpm=None,
+                 max_concurrency=256,
+                 cache=None,
                  **kwargs):
+        # `wait` is the base delay (seconds) of the exponential backoff after a failed try
         self.wait = wait 
         self.retry = retry
+        # Requests / min, tokens / min and the concurrency bound shared by all workers of the model
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_concurrency = max_concurrency
+        self._rate_limiter = None
+        # Serve identical requests from the on-disk response cache, defaults to $VLMEVAL_CACHE
+        if cache is None:
+            cache = bool(int(os.environ.get('VLMEVAL_CACHE', 0)))
+        self.cache = cache
         self.system_prompt = system_prompt
         self.kwargs = kwargs
         self.verbose = verbose
@@ -31,7 +50,67 @@ class BaseAPI:
         # if ret_code is 0, means succeed
         return ret_code, answer, log
 
-    def generate(self, inputs, **kwargs):
+    @property
+    def rate_limiter(self):
+        if self._rate_limiter is None:
+            name = getattr(self, 'model', None) or type(self).__name__
+            self._rate_limiter = RateLimiter(
+                name, rpm=self.rpm, tpm=self.tpm, max_concurrency=self.max_concurrency)
+        return self._rate_limiter
+
+    def estimate_tokens(self, inputs, **kwargs):
+        # A rough estimation for the tokens / min budget: ~4 chars per token, 85 tokens per image
+        items = inputs if isinstance(inputs, list) else [inputs]
+        tokens = 0
+        for item in items:
+            if isinstance(item, dict):
+                item = item.get('value', item.get('content', ''))
+            item = str(item)
+            tokens += 85 if osp.exists(item) or item.startswith('http') else len(item) // 4
+        return tokens + kwargs.get('max_tokens', getattr(self, 'max_tokens', 0))
+
+    def cache_key(self, inputs, **kwargs):
+        # Everything that shapes the request payload of the wrapper
+        gen_kwargs = dict(
+            temperature=getattr(self, 'temperature', None),
+            max_tokens=getattr(self, 'max_tokens', None),
+            system_prompt=self.system_prompt,
+            img_size=getattr(self, 'img_size', None),
+            img_detail=getattr(self, 'img_detail', None))
+        gen_kwargs.update(kwargs)
+        # The same model name may be served by different endpoints (e.g. a proxy of the judge)
+        endpoint = [type(self).__name__, getattr(self, 'api_base', None)]
+        return cache_key(self.rate_limiter.name, inputs, endpoint=endpoint, **gen_kwargs)
+
+    @staticmethod
+    def congestion_info(ret_code, log):
+        """Tell if a failed try is caused by congestion: rate limiting (HTTP 429) or an overloaded server
+        (HTTP 5xx), and the Retry-After hint in seconds.
+
+        Returns:
+            bool, bool, float: Rate limited, overloaded, and the hint (None if not given).
+        """
+        status = getattr(log, 'status_code', getattr(log, 'status', ret_code))
+        rate_limited = status == 429 or ret_code == 429
+        overloaded = any(isinstance(x, int) and 500 <= x < 600 for x in [status, ret_code])
+        if not rate_limited and not overloaded:
+            return False, False, None
+        retry_after = None
+        headers = getattr(log, 'headers', None)
+        if headers is not None and headers.get('Retry-After', None) is not None:
+            try:
+                retry_after = float(headers.get('Retry-After'))
+            except ValueError:
+                pass
+        return rate_limited, overloaded, retry_after
+
+    async def agenerate_inner(self, inputs, **kwargs):
+        # Wrappers without a native asyncio client run the blocking call in the default executor
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, partial(self.generate_inner, inputs, **kwargs))
+
+    @staticmethod
+    def check_inputs(inputs):
         input_type = None
         if isinstance(inputs, str):
             input_type = 'str'
@@ -41,24 +120,82 @@ class BaseAPI:
             input_type = 'dictlist'
         assert input_type is not None, input_type
 
+    def generate(self, inputs, **kwargs):
+        self.check_inputs(inputs)
+        limiter = self.rate_limiter
+        tokens = self.estimate_tokens(inputs, **kwargs)
+
+        key = None
+        if self.cache:
+            key = self.cache_key(inputs, **kwargs)
+            answer = get_response_cache().get(key, model=limiter.name)
+            if answer is not None:
+                return answer
+
         answer = None
         for i in range(self.retry):
-            T = rd.random() * self.wait * 2
-            time.sleep(T)
+            sent = limiter.acquire(tokens)
+            success, rate_limited, overloaded, retry_after = False, False, False, None
             try:
                 ret_code, answer, log = self.generate_inner(inputs, **kwargs)
                 if ret_code == 0 and self.fail_msg not in answer and answer != '':
+                    success = True
                     if self.verbose:
                         print(answer)
+                    if key is not None:
+                        get_response_cache().put(key, answer, model=limiter.name)
                     return answer
-                elif self.verbose:
+                rate_limited, overloaded, retry_after = self.congestion_info(ret_code, log)
+                if self.verbose:
                     self.logger.info(f"RetCode: {ret_code}\nAnswer: {answer}\nLog: {log}")
             except Exception as err:
                 if self.verbose:
                     self.logger.error(f'An error occured during try {i}:')
                     self.logger.error(err)
+            finally:
+                limiter.release(success, rate_limited, retry_after, overloaded=overloaded, sent=sent)
+            # Only back off after a failure, and not after the last try
+            if i < self.retry - 1:
+                time.sleep(backoff_time(i, self.wait, retry_after=retry_after))
         
         return self.fail_msg if answer in ['', None] else answer
-        
 
-        
\ No newline at end of file
+    async def agenerate(self, inputs, **kwargs):
+        """The asyncio counterpart of ``generate``, with the same retry and rate limit policy."""
+        self.check_inputs(inputs)
+        limiter = self.rate_limiter
+        tokens = self.estimate_tokens(inputs, **kwargs)
+
+        key = None
+        if self.cache:
+            key = self.cache_key(inputs, **kwargs)
+            answer = get_response_cache().get(key, model=limiter.name)
+            if answer is not None:
+                return answer
+
+        answer = None
+        for i in range(self.retry):
+            sent = await limiter.aacquire(tokens)
+            success, rate_limited, overloaded, retry_after = False, False, False, None
+            try:
+                ret_code, answer, log = await self.agenerate_inner(inputs, **kwargs)
+                if ret_code == 0 and self.fail_msg not in answer and answer != '':
+                    success = True
+                    if self.verbose:
+                        print(answer)
+                    if key is not None:
+                        get_response_cache().put(key, answer, model=limiter.name)
+                    return answer
+                rate_limited, overloaded, retry_after = self.congestion_info(ret_code, log)
+                if self.verbose:
+                    self.logger.info(f"RetCode: {ret_code}\nAnswer: {answer}\nLog: {log}")
+            except Exception as err:
+                if self.verbose:
+                    self.logger.error(f'An error occured during try {i}:')
+                    self.logger.error(err)
+            finally:
+                await limiter.arelease(success, rate_limited, retry_after, overloaded=overloaded, sent=sent)
+            if i < self.retry - 1:
+                await asyncio.sleep(backoff_time(i, self.wait, retry_after=retry_after))
+
+        return self.fail_msg if answer in ['', None] else answer
@@ -0,0 +1,196 @@
+import hashlib
+import json
+import os
+import os.path as osp
+import sqlite3
+import threading
+import time
+from multiprocessing.util import Finalize, register_after_fork
+from ..smp import cached_md5
+from .rate_limit import run_id
+
+CACHE_PATH = os.environ.get(
+    'VLMEVAL_CACHE_PATH', osp.join(osp.expanduser('~'), '.cache', 'vlmeval', 'response_cache.sqlite'))
+CACHE_MAX_BYTES = int(os.environ.get('VLMEVAL_CACHE_MAX_BYTES', 2 * 1024 ** 3))
+# The hit / miss counters of a run are dropped this long (seconds) after its last update
+STATS_TTL = 30 * 24 * 3600
+
+def _content(item):
+    # Replace local image paths by the hash of their content, so that moving / re-dumping images
+    # does not invalidate the cache, while a changed image does
+    if isinstance(item, str):
+        if not item.startswith('http') and osp.isfile(item):
+            return 'file-md5:' + cached_md5(item)
+        return item
+    if isinstance(item, dict):
+        return {k: _content(v) for k, v in item.items()}
+    if isinstance(item, (list, tuple)):
+        return [_content(x) for x in item]
+    return item
+
+
+def cache_key(model, inputs, endpoint=None, **kwargs):
+    """The content address of a request: sha256 over the model, the endpoint serving it (the same model
+    name may be served by different endpoints), the message payload (with image content hashed rather
+    than paths) and the generation kwargs (temperature, max_tokens, ...)."""
+    struct = dict(model=model, endpoint=endpoint, inputs=_content(inputs), kwargs=kwargs)
+    return hashlib.sha256(json.dumps(struct, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class ResponseCache:
+    """Content-addressed on-disk cache of API responses, shared by all processes (SQLite in WAL mode).
+
+    Entries are evicted in least-recently-used order once their total size exceeds ``max_bytes``.
+    Hit / miss counters are kept per run (see ``init_run``) and per model, for ``STATS_TTL``. Lookups
+    do not write: the counters and the access times of the hits are accumulated in memory, and written
+    at most every ``flush_interval`` seconds, when the stats are read and when the process exits.
+
+    Args:
+        path (str): The SQLite file. Defaults to ``CACHE_PATH``.
+        max_bytes (int): The size bound of the cached responses. Defaults to ``CACHE_MAX_BYTES``.
+        evict_every (int): Check the size bound every this many insertions. Defaults to 100.
+        flush_interval (float): The minimal interval (seconds) between two writes of the counters.
+            Defaults to 1.
+    """
+
+    def __init__(self, path=CACHE_PATH, max_bytes=CACHE_MAX_BYTES, evict_every=100, flush_interval=1.0):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.evict_every = evict_every
+        self.flush_interval = flush_interval
+        self._conns = {}
+        self._puts = 0
+        self._lock = threading.Lock()
+        self._pending_pid, self._counts, self._touched = None, {}, {}
+        self._last_flush = time.time()
+
+    def __getstate__(self):
+        # Connections are neither picklable nor fork-safe, each process opens its own
+        state = self.__dict__.copy()
+        state['_conns'], state['_lock'] = {}, None
+        state['_pending_pid'], state['_counts'], state['_touched'] = None, {}, {}
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @property
+    def conn(self):
+        key = (os.getpid(), threading.get_ident())
+        if key not in self._conns:
+            dirname = osp.dirname(self.path)
+            if dirname:
+                os.makedirs(dirname, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS responses '
+                '(key TEXT PRIMARY KEY, model TEXT, response TEXT, size INTEGER, last_access REAL)')
+            conn.execute('CREATE INDEX IF NOT EXISTS responses_access ON responses (last_access)')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS stats '
+                '(run TEXT, model TEXT, hits INTEGER, misses INTEGER, updated REAL, PRIMARY KEY (run, model))')
+            self._conns[key] = conn
+        return self._conns[key]
+
+    def _pending(self):
+        # The counters and access times not written yet, of the current process (a forked worker
+        # starts with none)
+        if self._pending_pid != os.getpid():
+            self._pending_pid, self._counts, self._touched = os.getpid(), {}, {}
+        return self._counts, self._touched
+
+    def get(self, key, model=''):
+        row = self.conn.execute('SELECT response FROM responses WHERE key = ?', (key, )).fetchone()
+        now = time.time()
+        with self._lock:
+            counts, touched = self._pending()
+            counts.setdefault(model, [0, 0])[0 if row is not None else 1] += 1
+            if row is not None:
+                touched[key] = now
+            flush = now - self._last_flush >= self.flush_interval
+        if flush:
+            self.flush()
+        return None if row is None else json.loads(row[0])
+
+    def flush(self):
+        """Write the pending hit / miss counters and access times, in a single transaction."""
+        with self._lock:
+            counts, touched = self._pending()
+            self._counts, self._touched = {}, {}
+            self._last_flush = time.time()
+        if not len(counts) and not len(touched):
+            return
+        run, now = run_id(), time.time()
+        conn = self.conn
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.executemany(
+                'UPDATE responses SET last_access = ? WHERE key = ?', [(t, k) for k, t in touched.items()])
+            conn.executemany(
+                'INSERT INTO stats VALUES (?, ?, ?, ?, ?) ON CONFLICT (run, model) DO UPDATE SET '
+                'hits = hits + excluded.hits, misses = misses + excluded.misses, updated = excluded.updated',
+                [(run, model, hits, misses, now) for model, (hits, misses) in counts.items()])
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+    def put(self, key, response, model=''):
+        value = json.dumps(response, ensure_ascii=False)
+        self.conn.execute(
+            'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)',
+            (key, model, value, len(value.encode()), time.time()))
+        with self._lock:
+            self._puts += 1
+            evict = self._puts % self.evict_every == 0
+        if evict:
+            self.evict()
+
+    def evict(self):
+        self.conn.execute('DELETE FROM stats WHERE updated < ?', (time.time() - STATS_TTL, ))
+        total = self.conn.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Drop the least recently used entries until 90% of the bound is reached
+        target = total - int(self.max_bytes * 0.9)
+        freed = 0
+        rows = self.conn.execute('SELECT key, size FROM responses ORDER BY last_access').fetchall()
+        keys = []
+        for k, size in rows:
+            if freed >= target:
+                break
+            keys.append((k, ))
+            freed += size
+        self.conn.executemany('DELETE FROM responses WHERE key = ?', keys)
+
+    def stats(self, run=None):
+        """Hit / miss counters of the run ``run`` (the current run by default), by model."""
+        self.flush()
+        run = run_id() if run is None else run
+        rows = self.conn.execute('SELECT model, hits, misses FROM stats WHERE run = ?', (run, )).fetchall()
+        return {model: dict(hits=hits, misses=misses) for model, hits, misses in rows}
+
+
+_cache = None
+
+
+def get_response_cache():
+    global _cache
+    if _cache is None:
+        _cache = ResponseCache()
+        _flush_at_exit(_cache)
+        # Forked workers drop the finalizers of their parent
+        register_after_fork(_cache, _flush_at_exit)
+    return _cache
+
+
+def _flush_at_exit(cache):
+    # Run at the exit of the main process and of the multiprocessing workers (which skip `atexit`)
+    Finalize(cache, cache.flush, exitpriority=10)
+
+
+def response_cache_stats():
+    return get_response_cache().stats()
@@ -3,6 +3,7 @@ from vlmeval.smp import *
 from vlmeval.api.base import BaseAPI
 from vlmeval.utils.dataset import DATASET_TYPE
 from vlmeval.smp.vlm import encode_image_file_to_base64
+from vlmeval.api.session import get_client
 
 import os
 import copy as cp
@@ -57,7 +58,8 @@ class GLMVisionWrapper(BaseAPI):
         messages = self.build_msgs(msgs_raw=inputs, dataset=kwargs.get('dataset', None))
 
         try:
-            client = ZhipuAI(api_key=self.key)  
+            # The client keeps a keep-alive connection pool, build it once per process
+            client = get_client(('zhipuai', self.key), lambda: ZhipuAI(api_key=self.key))
             response = client.chat.completions.create(
                 model=self.model,
                 messages=messages,
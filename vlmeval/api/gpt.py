@@ -1,6 +1,7 @@
 from ..smp import *
 import os, sys
 from .base import BaseAPI
+from .session import get_session, get_async_session
 
 APIBASES = {
     'OFFICIAL': "https://api.openai.com/v1/chat/completions",
@@ -100,9 +101,7 @@ class OpenAIWrapper(BaseAPI):
                     elif msg.startswith('http'):
                         content_list.append(dict(type='image_url', image_url={'url': msg, 'detail': self.img_detail}))
                     elif osp.exists(msg):
-                        from PIL import Image
-                        img = Image.open(msg)
-                        b64 = encode_image_to_base64(img, target_size=self.img_size)
+                        b64 = encode_image_file_to_base64(msg, target_size=self.img_size)
                         img_struct = dict(url=f'data:image/jpeg;base64,{b64}', detail=self.img_detail)
                         content_list.append(dict(type='image_url', image_url=img_struct))
                 input_msgs.append(dict(role='user', content=content_list))
@@ -115,7 +114,8 @@ class OpenAIWrapper(BaseAPI):
                 return input_msgs
         raise NotImplemented("list of list prompt not implemented now. ")
 
-    def generate_inner(self, inputs, **kwargs) -> str:
+    # Returns (headers, payload), or (None, (ret_code, answer, log)) if the request should not be sent
+    def build_request(self, inputs, **kwargs):
         input_msgs = self.prepare_inputs(inputs)
         temperature = kwargs.pop('temperature', self.temperature)
         max_tokens = kwargs.pop('max_tokens', self.max_tokens)
@@ -125,7 +125,7 @@ class OpenAIWrapper(BaseAPI):
         if 0 < max_tokens <= 100:
             self.logger.warning('Less than 100 tokens left, may exceed the context window with some additional meta symbols. ')
         if max_tokens <= 0:
-            return 0, self.fail_msg + 'Input string longer than context window. ', 'Length Exceeded. '
+            return None, (0, self.fail_msg + 'Input string longer than context window. ', 'Length Exceeded. ')
         
         headers = {'Content-Type': 'application/json', 'Authorization': f'Bearer {self.openai_key}'}
         payload = dict(
@@ -135,17 +135,39 @@ class OpenAIWrapper(BaseAPI):
             n=1, 
             temperature=temperature,
             **kwargs)
-        response = requests.post(self.api_base, headers=headers, data=json.dumps(payload), timeout=self.timeout * 1.1)
-        ret_code = response.status_code
-        ret_code = 0 if (200 <= int(ret_code) < 300) else ret_code
+        return headers, payload
+
+    def parse_response(self, status_code, text):
+        ret_code = 0 if (200 <= int(status_code) < 300) else status_code
         answer = self.fail_msg
         try:
-            resp_struct = json.loads(response.text)
+            resp_struct = json.loads(text)
             answer = resp_struct['choices'][0]['message']['content'].strip()
         except:
             pass
+        return ret_code, answer
+
+    def generate_inner(self, inputs, **kwargs) -> str:
+        headers, payload = self.build_request(inputs, **kwargs)
+        if headers is None:
+            return payload
+        response = get_session().post(
+            self.api_base, headers=headers, data=json.dumps(payload), timeout=self.timeout * 1.1)
+        ret_code, answer = self.parse_response(response.status_code, response.text)
         return ret_code, answer, response
 
+    async def agenerate_inner(self, inputs, **kwargs) -> str:
+        import aiohttp
+        headers, payload = self.build_request(inputs, **kwargs)
+        if headers is None:
+            return payload
+        timeout = aiohttp.ClientTimeout(total=self.timeout * 1.1)
+        session = get_async_session()
+        async with session.post(self.api_base, headers=headers, data=json.dumps(payload), timeout=timeout) as response:
+            text = await response.text()
+            ret_code, answer = self.parse_response(response.status, text)
+            return ret_code, answer, response
+
     def get_token_len(self, inputs) -> int:
         import tiktoken
         enc = tiktoken.encoding_for_model(self.model)
@@ -176,4 +198,15 @@ class GPT4V(OpenAIWrapper):
     def interleave_generate(self, ti_list, dataset=None):
         assert self.model == 'gpt-4-vision-preview'
         return super(GPT4V, self).generate(ti_list)
-    
\ No newline at end of file
+
+    async def agenerate(self, image_path, prompt, dataset=None):
+        assert self.model == 'gpt-4-vision-preview'
+        return await super(GPT4V, self).agenerate([image_path, prompt])
+
+    async def amulti_generate(self, image_paths, prompt, dataset=None):
+        assert self.model == 'gpt-4-vision-preview'
+        return await super(GPT4V, self).agenerate(image_paths + [prompt])
+
+    async def ainterleave_generate(self, ti_list, dataset=None):
+        assert self.model == 'gpt-4-vision-preview'
+        return await super(GPT4V, self).agenerate(ti_list)
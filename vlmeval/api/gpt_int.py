@@ -3,6 +3,7 @@ import warnings
 import requests
 from ..smp import *
 from .gpt import GPT_context_window, OpenAIWrapper
+from .session import get_session
 
 
 url = "http://ecs.sv.us.alles-apin.openxlab.org.cn/v1/openai/v2/text/chat"
@@ -74,7 +75,7 @@ class OpenAIWrapperInternal(OpenAIWrapper):
             temperature=temperature,
             **kwargs)
         
-        response = requests.post(url, headers=headers, data=json.dumps(payload), timeout=self.timeout * 1.1)
+        response = get_session().post(url, headers=headers, data=json.dumps(payload), timeout=self.timeout * 1.1)
         ret_code = response.status_code
         ret_code = 0 if (200 <= int(ret_code) < 300) else ret_code
 
@@ -86,6 +87,10 @@ class OpenAIWrapperInternal(OpenAIWrapper):
         except:
             pass
         return ret_code, answer, response
+
+    async def agenerate_inner(self, inputs, **kwargs):
+        # No asyncio client for the internal endpoint, use the executor fallback of BaseAPI
+        return await super(OpenAIWrapper, self).agenerate_inner(inputs, **kwargs)
     
 
 class GPT4V_Internal(OpenAIWrapperInternal):
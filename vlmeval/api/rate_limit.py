@@ -0,0 +1,256 @@
+import atexit
+import json
+import os
+import os.path as osp
+import random as rd
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import portalocker
+
+# (pid, name) -> the state of the limiters without a budget, kept in memory
+_local_states = {}
+_local_lock = threading.Lock()
+# pid -> the threads the asyncio workers of the process update the shared limiter state with (see `aacquire`)
+_executors = {}
+
+
+def _executor():
+    pid = os.getpid()
+    if pid not in _executors:
+        _executors[pid] = ThreadPoolExecutor(4, thread_name_prefix='ratelimit')
+    return _executors[pid]
+
+
+def _state_root(run):
+    return osp.join(tempfile.gettempdir(), 'vlmeval_ratelimit', run)
+
+
+def init_run():
+    """Start a run, if none is started yet. The processes started afterwards (e.g. the workers of
+    ``track_progress_rich``) inherit its id through ``$VLMEVAL_RUN_ID``, and thus share the state of the
+    rate limiters with a budget. ``run.py`` and ``vlmeval.sweep`` call it first thing.
+
+    Returns:
+        str: The run id.
+    """
+    if 'VLMEVAL_RUN_ID' not in os.environ:
+        os.environ['VLMEVAL_RUN_ID'] = str(os.getpid())
+        atexit.register(shutil.rmtree, _state_root(os.environ['VLMEVAL_RUN_ID']), True)
+    return os.environ['VLMEVAL_RUN_ID']
+
+
+def run_id():
+    """The id of the current run, started on first use if ``init_run`` was not called."""
+    return init_run()
+
+
+class RateLimiter:
+    """Per-model rate limiter.
+
+    It combines token buckets for requests / min (``rpm``) and tokens / min (``tpm``) with an AIMD
+    concurrency window. Congestion shrinks the window based on the requests in flight: it is halved
+    after a rate limit error (HTTP 429) and shrunk by ``decrease`` after a server error (HTTP 5xx), at
+    most once per round trip (the responses to the requests sent before a decrease do not shrink it
+    again). Other failures, e.g. a client-side exception, leave it as is. The window grows by one slot
+    per round trip (the moving average of the request latency) while requests succeed. A
+    ``Retry-After`` hint pauses all workers of the model.
+
+    The budgets of a model are shared by all processes of a run (see ``init_run``): with ``rpm`` or
+    ``tpm`` set, the state lives in a small file guarded by ``portalocker``. Otherwise it is kept in
+    memory by each process, and no request pays for the file lock.
+
+    Args:
+        name (str): The model name, limiters with the same name share their state.
+        rpm (float, optional): Requests per minute, None means no limit. Defaults to None.
+        tpm (float, optional): Tokens per minute, None means no limit. Defaults to None.
+        max_concurrency (int): The upper bound of the concurrency window. Defaults to 256.
+        min_concurrency (int): The lower bound of the concurrency window. Defaults to 1.
+        decrease (float): Window shrink factor after a server error. Defaults to 0.8.
+    """
+
+    def __init__(self, name, rpm=None, tpm=None, max_concurrency=256, min_concurrency=1, decrease=0.8):
+        self.name = name
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.decrease = decrease
+        self.shared = bool(rpm or tpm)
+
+    @property
+    def path(self):
+        fname = ''.join([c if c.isalnum() or c in '-_.' else '_' for c in self.name]) + '.json'
+        return osp.join(_state_root(run_id()), fname)
+
+    def _init_state(self):
+        return dict(
+            req=self.rpm if self.rpm else 0, tok=self.tpm if self.tpm else 0, ts=time.time(),
+            window=self.max_concurrency, inflight=0, pause_until=0, rtt=0, last_increase=0, last_decrease=0,
+            success=0, failure=0, rate_limited=0)
+
+    def _apply(self, state, func):
+        now = time.time()
+        # Refill the buckets
+        elapsed = max(now - state['ts'], 0)
+        if self.rpm:
+            state['req'] = min(self.rpm, state['req'] + elapsed * self.rpm / 60)
+        if self.tpm:
+            state['tok'] = min(self.tpm, state['tok'] + elapsed * self.tpm / 60)
+        state['ts'] = now
+        return func(state, now)
+
+    def _update(self, func):
+        if not self.shared:
+            with _local_lock:
+                key = (os.getpid(), self.name)
+                if key not in _local_states:
+                    _local_states[key] = self._init_state()
+                return self._apply(_local_states[key], func)
+        path = self.path
+        os.makedirs(osp.dirname(path), exist_ok=True)
+        with portalocker.Lock(path, mode='a+', timeout=60) as fh:
+            fh.seek(0)
+            raw = fh.read()
+            state = json.loads(raw) if raw else self._init_state()
+            ret = self._apply(state, func)
+            fh.seek(0)
+            fh.truncate()
+            fh.write(json.dumps(state))
+            fh.flush()
+        return ret
+
+    def try_acquire(self, tokens=0):
+        """Take a slot for one request of about ``tokens`` tokens.
+
+        Returns:
+            float: 0 if the slot is acquired, otherwise the time to wait (seconds) before trying again.
+        """
+        def func(state, now):
+            if state['pause_until'] > now:
+                return state['pause_until'] - now
+            if state['inflight'] >= int(state['window']):
+                return 0.05 + rd.random() * 0.1
+            if self.rpm and state['req'] < 1:
+                return (1 - state['req']) * 60 / self.rpm
+            # A single request larger than the whole budget only waits for a full bucket
+            tokens_needed = min(tokens, self.tpm) if self.tpm else 0
+            if self.tpm and state['tok'] < tokens_needed:
+                return (tokens_needed - state['tok']) * 60 / self.tpm
+            if self.rpm:
+                state['req'] -= 1
+            if self.tpm:
+                state['tok'] -= tokens_needed
+            state['inflight'] += 1
+            return 0
+        return self._update(func)
+
+    def acquire(self, tokens=0):
+        """Wait for a slot.
+
+        Returns:
+            float: The time the slot is taken at, to be passed to ``release``.
+        """
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait == 0:
+                return time.time()
+            time.sleep(wait)
+
+    async def aacquire(self, tokens=0):
+        """The asyncio counterpart of ``acquire``.
+
+        The shared state file is locked and updated by a thread, a contended lock does not block the
+        event loop (and the other requests in flight).
+        """
+        import asyncio
+        if not self.shared:
+            while True:
+                wait = self.try_acquire(tokens)
+                if wait == 0:
+                    return time.time()
+                await asyncio.sleep(wait)
+        loop = asyncio.get_running_loop()
+        while True:
+            fut = loop.run_in_executor(_executor(), self.try_acquire, tokens)
+            try:
+                wait = await asyncio.shield(fut)
+            except asyncio.CancelledError:
+                # The slot may still be taken once the request is cancelled, it is given back then
+                fut.add_done_callback(self._cancel_slot)
+                raise
+            if wait == 0:
+                return time.time()
+            await asyncio.sleep(wait)
+
+    def _cancel_slot(self, fut):
+        if not fut.cancelled() and fut.exception() is None and fut.result() == 0:
+            _executor().submit(self._update, lambda state, now: state.update(inflight=max(state['inflight'] - 1, 0)))
+
+    def release(self, success, rate_limited=False, retry_after=None, overloaded=False, sent=None):
+        """Give back the slot and adapt the concurrency window to the outcome of the request.
+
+        Args:
+            success (bool): Whether the request succeeded.
+            rate_limited (bool): Whether it failed with a rate limit error (HTTP 429). Defaults to False.
+            retry_after (float, optional): The Retry-After hint (seconds) of the server. Defaults to None.
+            overloaded (bool): Whether it failed with a server error (HTTP 5xx). Defaults to False.
+            sent (float, optional): The time the slot was taken at (returned by ``acquire``), None if
+                unknown. Defaults to None.
+        """
+        def func(state, now):
+            inflight = state['inflight']
+            state['inflight'] = max(inflight - 1, 0)
+            if success:
+                state['success'] += 1
+                if sent is not None:
+                    rtt = now - sent
+                    state['rtt'] = 0.8 * state['rtt'] + 0.2 * rtt if state['rtt'] else rtt
+                # Additive increase, one slot per round trip
+                if now - state['last_increase'] >= state['rtt']:
+                    state['window'] = min(self.max_concurrency, state['window'] + 1)
+                    state['last_increase'] = now
+                return
+            state['rate_limited' if rate_limited else 'failure'] += 1
+            if not (rate_limited or overloaded):
+                return
+            if retry_after:
+                state['pause_until'] = max(state['pause_until'], now + retry_after)
+            # Multiplicative decrease, once per round trip: the requests sent before the last decrease
+            # got their answers to the larger window
+            if sent is not None and sent < state['last_decrease']:
+                return
+            factor = 0.5 if rate_limited else self.decrease
+            state['window'] = max(self.min_concurrency, min(state['window'], inflight) * factor)
+            state['last_decrease'] = now
+        self._update(func)
+
+    async def arelease(self, success, rate_limited=False, retry_after=None, overloaded=False, sent=None):
+        """The asyncio counterpart of ``release``, run by a thread like ``aacquire``."""
+        import asyncio
+        release = partial(
+            self.release, success, rate_limited=rate_limited, retry_after=retry_after, overloaded=overloaded,
+            sent=sent)
+        if not self.shared:
+            return release()
+        fut = asyncio.get_running_loop().run_in_executor(_executor(), release)
+        # The slot is given back even if the request is cancelled meanwhile
+        await asyncio.shield(fut)
+
+    def stats(self):
+        return self._update(lambda state, now: {
+            k: state[k] for k in ['window', 'inflight', 'success', 'failure', 'rate_limited']})
+
+
+def backoff_time(attempt, base, max_wait=60, retry_after=None):
+    """Exponential backoff with full jitter for the ``attempt``-th (0-based) failure.
+
+    A ``Retry-After`` hint from the server is used as the lower bound.
+    """
+    delay = rd.random() * min(max_wait, base * 2 ** attempt)
+    if retry_after:
+        delay = max(delay, retry_after)
+    return delay
@@ -0,0 +1,132 @@
+import os
+import threading
+from collections import defaultdict
+import requests
+from requests.adapters import HTTPAdapter
+
+# Connection pool settings, can be overridden with `configure_http_pool` or the environment variables
+HTTP_POOL_CONFIG = dict(
+    # The number of hosts to keep a connection pool for
+    pool_hosts=int(os.environ.get('VLMEVAL_HTTP_POOL_HOSTS', 16)),
+    # The number of keep-alive connections (and of concurrent requests) per host
+    per_host=int(os.environ.get('VLMEVAL_HTTP_PER_HOST', 64)),
+    # The total number of connections of an asyncio session
+    pool_size=int(os.environ.get('VLMEVAL_HTTP_POOL_SIZE', 256)),
+    keepalive_timeout=float(os.environ.get('VLMEVAL_HTTP_KEEPALIVE', 60)),
+)
+
+_sessions = {}
+_async_sessions = {}
+_clients = {}
+_async_counter = defaultdict(lambda: 0)
+_lock = threading.Lock()
+
+
+def configure_http_pool(**kwargs):
+    """Update ``HTTP_POOL_CONFIG``, sessions created afterwards use the new settings."""
+    for k in kwargs:
+        assert k in HTTP_POOL_CONFIG, f'Unknown HTTP pool option {k}'
+    HTTP_POOL_CONFIG.update(kwargs)
+    with _lock:
+        _sessions.clear()
+
+
+def get_session():
+    """The keep-alive ``requests.Session`` shared by all API wrappers of the current process.
+
+    Sessions are keyed by pid, so that the workers forked by ``track_progress_rich`` never share the
+    sockets of their parent.
+    """
+    pid = os.getpid()
+    session = _sessions.get(pid, None)
+    if session is None:
+        with _lock:
+            if pid not in _sessions:
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=HTTP_POOL_CONFIG['pool_hosts'],
+                    pool_maxsize=HTTP_POOL_CONFIG['per_host'],
+                    pool_block=True)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                _sessions[pid] = session
+            session = _sessions[pid]
+    return session
+
+
+def get_client(key, build):
+    """A per-process cache for SDK clients that hold their own connection pool (e.g. ZhipuAI).
+
+    Args:
+        key (hashable): The identity of the client, e.g. ('zhipuai', api_key).
+        build (callable): Builds the client when it is not cached yet.
+    """
+    key = (os.getpid(), key)
+    if key not in _clients:
+        with _lock:
+            if key not in _clients:
+                _clients[key] = build()
+    return _clients[key]
+
+
+def get_async_session():
+    """The ``aiohttp.ClientSession`` shared by all API wrappers in the running event loop."""
+    import asyncio
+    import aiohttp
+    loop = asyncio.get_running_loop()
+    session = _async_sessions.get(loop, None)
+    if session is None or session.closed:
+        trace = aiohttp.TraceConfig()
+
+        async def on_create(session, ctx, params):
+            _async_counter['connections'] += 1
+
+        async def on_reuse(session, ctx, params):
+            _async_counter['reused'] += 1
+
+        async def on_request(session, ctx, params):
+            _async_counter['requests'] += 1
+
+        trace.on_connection_create_end.append(on_create)
+        trace.on_connection_reuseconn.append(on_reuse)
+        trace.on_request_start.append(on_request)
+        connector = aiohttp.TCPConnector(
+            limit=HTTP_POOL_CONFIG['pool_size'],
+            limit_per_host=HTTP_POOL_CONFIG['per_host'],
+            keepalive_timeout=HTTP_POOL_CONFIG['keepalive_timeout'])
+        session = aiohttp.ClientSession(connector=connector, trace_configs=[trace])
+        _async_sessions[loop] = session
+    return session
+
+
+async def close_async_sessions():
+    """Close the asyncio session of the running event loop, to be awaited before the loop ends."""
+    import asyncio
+    session = _async_sessions.pop(asyncio.get_running_loop(), None)
+    if session is not None and not session.closed:
+        await session.close()
+
+
+def http_pool_stats():
+    """Connection reuse counters of the current process.
+
+    Returns:
+        dict: The number of requests, of newly opened connections and of requests that reused a
+            keep-alive connection, for the blocking (``sync_*``) and the asyncio (``async_*``) sessions.
+    """
+    requests_num, connections = 0, 0
+    session = _sessions.get(os.getpid(), None)
+    if session is not None:
+        for adapter in set(session.adapters.values()):
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools[key]
+                requests_num += pool.num_requests
+                connections += pool.num_connections
+    return dict(
+        sync_requests=requests_num,
+        sync_connections=connections,
+        sync_reused=requests_num - connections,
+        async_requests=_async_counter['requests'],
+        async_connections=_async_counter['connections'],
+        async_reused=_async_counter['reused'])
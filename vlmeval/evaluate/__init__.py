@@ -1,14 +1,40 @@
-from .yes_or_no import default_rating, MME_rating, YOrN_eval
-from .mmvet_eval import MMVet_eval
-from .multiple_choice import multiple_choice_eval
-from .coco_eval import COCO_eval
-from .vqa_eval import VQAEval
-from .mathvista_eval import MathVista_eval
-from .llavabench import LLaVABench_eval
-from .misc import build_judge
-from .OCRBench import OCRBench_eval
-from .multi_step_claim import multi_step_claim_eval
-from .multi_step_property import multi_step_property_eval
-from .multi_step_agri import multi_step_agri_eval
-from .multi_step_liability import multi_step_liability_eval
-from .multi_step_health import multi_step_health_eval
+import importlib
+
+# Evaluators are imported on first access (PEP 562), each pulls its own dependencies (the judge API
+# client, pycocoevalcap, ...) that the other evaluators do not need.
+_registry = {
+    'default_rating': 'yes_or_no',
+    'MME_rating': 'yes_or_no',
+    'YOrN_eval': 'yes_or_no',
+    'MMVet_eval': 'mmvet_eval',
+    'multiple_choice_eval': 'multiple_choice',
+    'COCO_eval': 'coco_eval',
+    'VQAEval': 'vqa_eval',
+    'MathVista_eval': 'mathvista_eval',
+    'LLaVABench_eval': 'llavabench',
+    'build_judge': 'misc',
+    'JudgeDedup': 'dedup',
+    'build_judge_kwargs': 'dispatch',
+    'evaluate_result': 'dispatch',
+    'StreamEvaluator': 'streaming',
+    'build_stream': 'streaming',
+    'OCRBench_eval': 'OCRBench',
+    'multi_step_claim_eval': 'multi_step_claim',
+    'multi_step_property_eval': 'multi_step_property',
+    'multi_step_agri_eval': 'multi_step_agri',
+    'multi_step_liability_eval': 'multi_step_liability',
+    'multi_step_health_eval': 'multi_step_health',
+}
+
+__all__ = list(_registry)
+
+
+def __getattr__(name):
+    if name in _registry:
+        module = importlib.import_module(f'.{_registry[name]}', __name__)
+        return getattr(module, name)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -0,0 +1,95 @@
+import itertools
+import numpy as np
+import pandas as pd
+
+
+def group_codes(df, keys):
+    """Number the groups of the rows of ``df`` by the ``keys`` columns, in order of first appearance.
+
+    Returns:
+        np.ndarray: The group of every row.
+        pd.DataFrame: The keys of every group.
+    """
+    if not len(keys):
+        return np.zeros(len(df), dtype=int), pd.DataFrame(index=range(min(len(df), 1)))
+    codes = df.groupby(keys, sort=False, dropna=False).ngroup().to_numpy()
+    _, first = np.unique(codes, return_index=True)
+    return codes, df[keys].iloc[first].reset_index(drop=True)
+
+
+def group_sums(df, keys, values=()):
+    """The row count (``count``) and the sums of the ``values`` columns of every group of ``df`` by ``keys``.
+
+    This is the single pass over the rows the ratings are built on, the tables they report are rolled up
+    from it (see ``rollup``). The sums are accumulated in row order (``np.bincount``), as the per-row
+    loops they replace did.
+    """
+    codes, table = group_codes(df, keys)
+    table['count'] = np.bincount(codes, minlength=len(table))
+    for v in values:
+        table[v] = np.bincount(codes, weights=df[v].to_numpy(dtype=float), minlength=len(table))
+    return table
+
+
+def multi_group_sums(groups, **values):
+    """``group_sums`` for rows that belong to several groups (e.g. all the skills of a question).
+
+    Args:
+        groups (list[list]): The groups of every row, a row is counted in a group once per occurrence.
+        **values (array-like): The values of every row, summed per group.
+
+    Returns:
+        pd.DataFrame: The ``group``, ``count`` and ``values`` sums, in order of first appearance.
+    """
+    rows = np.repeat(np.arange(len(groups)), [len(x) for x in groups])
+    df = pd.DataFrame(dict(group=list(itertools.chain.from_iterable(groups))))
+    for k, v in values.items():
+        df[k] = np.asarray(v, dtype=float)[rows]
+    return group_sums(df, ['group'], list(values))
+
+
+def rollup(table, keys, values=()):
+    """Merge the groups of a ``group_sums`` table into the coarser groups of ``keys``.
+
+    The sums of the merged groups are added up again, which is exact for counts and 0 / 1 scores.
+    """
+    columns = ['count'] + list(values)
+    if not len(keys):
+        return table[columns].sum().to_frame().T
+    return table.groupby(keys, sort=False, dropna=False)[columns].sum().reset_index()
+
+
+def ratio(num, den):
+    """``num / den``, NaN where ``den`` is 0 (the mean of an empty group)."""
+    num, den = np.asarray(num, dtype=float), np.asarray(den, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(den > 0, num / den, np.nan)[()]
+
+
+def group_means(table, keys, value):
+    """The mean of ``value`` per group of ``keys`` (a Series indexed by them), from a ``group_sums`` table.
+
+    With no ``keys``, the overall mean.
+    """
+    merged = rollup(table, keys, [value])
+    means = ratio(merged[value], merged['count'])
+    if not len(keys):
+        return means[0]
+    return pd.Series(means, index=pd.MultiIndex.from_frame(merged[keys]) if len(keys) > 1 else merged[keys[0]])
+
+
+def group_heads(df, keys, value, k):
+    """The first ``k`` values of ``value`` of every group of ``df`` by ``keys``, in row order.
+
+    Returns:
+        pd.DataFrame: The keys of every group.
+        np.ndarray: The values, of shape (number of groups, k).
+    """
+    codes, table = group_codes(df, keys)
+    count = np.bincount(codes, minlength=len(table))
+    if len(table) and count.min() < k:
+        raise IndexError(f'Every group by {keys} should have at least {k} rows. ')
+    order = np.argsort(codes, kind='stable')
+    starts = np.cumsum(count) - count
+    vals = df[value].to_numpy()[order]
+    return table, np.stack([vals[starts + i] for i in range(k)], axis=1)
@@ -51,7 +51,8 @@ def COCO_eval(eval_file, nproc=4, verbose=False):
     scorer = COCO_Caption_Scorer(ref,gt)
     coco_caption_score_dict = scorer.compute_scores()
         
-    score_pth = eval_file.replace('.xlsx','_score.json')
+    suffix = eval_file.split('.')[-1]
+    score_pth = eval_file.replace(f'.{suffix}', '_score.json')
     dump(coco_caption_score_dict, score_pth)
     logger.info(f'COCO_eval successfully finished evaluating {eval_file}, results saved in {score_pth}')
     logger.info(f'Score: ')
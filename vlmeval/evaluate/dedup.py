@@ -0,0 +1,118 @@
+import json
+import re
+import threading
+from collections import OrderedDict
+from ..smp import get_logger
+
+
+def canonical_prompt(inputs):
+    """The canonical form of a judge prompt: runs of whitespace collapsed, leading / trailing ones removed."""
+    if isinstance(inputs, str):
+        return re.sub(r'\s+', ' ', inputs).strip()
+    if isinstance(inputs, (list, tuple)):
+        return [canonical_prompt(x) for x in inputs]
+    if isinstance(inputs, dict):
+        return {k: canonical_prompt(v) for k, v in inputs.items()}
+    return inputs
+
+
+def group_duplicates(keys):
+    """Group the positions of ``keys`` by key: {key: [positions]}, in the order of first occurrence."""
+    groups = OrderedDict()
+    for i, k in enumerate(keys):
+        groups.setdefault(k, []).append(i)
+    return groups
+
+
+def log_dedup_stats(name, calls, saved):
+    logger = get_logger('Evaluation')
+    ratio = saved / (calls + saved) * 100 if calls + saved else 0
+    logger.info(f'{name}: {calls} requests sent to the judge, {saved} ({ratio:.1f}%) saved by deduplication. ')
+
+
+class JudgeDedup:
+    """Deduplicate the calls to a judge model within a process.
+
+    Requests are keyed by their canonical form (see ``canonical_prompt``). The answer of a finished
+    request is reused by identical ones, and identical requests issued while one is in flight (from
+    other threads) wait for it instead of calling the judge again. Failed answers are not reused.
+    Other attributes are forwarded to the wrapped model.
+
+    ``share(key, func)`` applies the same policy to any computation, e.g. the option matched by the
+    judge for all circular passes of a question.
+
+    Args:
+        model: The judge, any object with ``generate``. Defaults to None (``share`` only).
+    """
+
+    def __init__(self, model=None):
+        self.model = model
+        self._lock = threading.Lock()
+        self._done = {}
+        self._inflight = {}
+        # The calls made to the judge, and the requests served by a finished or in-flight one
+        self.calls = 0
+        self.saved = 0
+
+    def __getstate__(self):
+        # Locks and events do not cross processes, each process deduplicates on its own
+        state = self.__dict__.copy()
+        state['_lock'], state['_inflight'] = None, {}
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        model = self.__dict__.get('model', None)
+        if model is None:
+            raise AttributeError(name)
+        return getattr(model, name)
+
+    def stats(self):
+        return dict(calls=self.calls, saved=self.saved)
+
+    def share(self, key, func, keep=None):
+        """Return ``func()``, computed once for all callers of ``key``.
+
+        Args:
+            key: A hashable key.
+            func (callable): The computation.
+            keep (callable, optional): Tell if a result can be reused. Defaults to None (all results).
+        """
+        while True:
+            with self._lock:
+                if key in self._done:
+                    self.saved += 1
+                    return self._done[key]
+                event = self._inflight.get(key, None)
+                if event is None:
+                    event = self._inflight[key] = threading.Event()
+                    break
+            # Wait for the in-flight computation, and compute it again if it failed
+            event.wait()
+
+        try:
+            ret = func()
+        except Exception:
+            with self._lock:
+                self._inflight.pop(key).set()
+            raise
+        with self._lock:
+            if keep is None or keep(ret):
+                self._done[key] = ret
+            self._inflight.pop(key).set()
+        return ret
+
+    def _generate(self, inputs, **kwargs):
+        with self._lock:
+            self.calls += 1
+        return self.model.generate(inputs, **kwargs)
+
+    def generate(self, inputs, **kwargs):
+        key = json.dumps([canonical_prompt(inputs), kwargs], sort_keys=True, default=str)
+        fail_msg = getattr(self.model, 'fail_msg', None)
+        return self.share(
+            key, lambda: self._generate(inputs, **kwargs),
+            keep=lambda x: isinstance(x, str) and x != '' and (fail_msg is None or fail_msg not in x))
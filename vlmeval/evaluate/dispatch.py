@@ -0,0 +1,66 @@
+import os
+from vlmeval import evaluate
+from ..smp import get_logger, listinstr
+from ..utils import DATASET_TYPE
+
+
+def build_judge_kwargs(dataset_name, judge=None, nproc=4, verbose=False, retry=None):
+    """The kwargs of the evaluator of ``dataset_name``: the judge model (if any) and its settings."""
+    judge_kwargs = {
+        'nproc': nproc,
+        'verbose': verbose,
+    }
+    if retry is not None:
+        judge_kwargs['retry'] = retry
+    if judge is not None:
+        judge_kwargs['model'] = judge
+    else:
+        if DATASET_TYPE(dataset_name) in ['multi-choice', 'Y/N']:
+            judge_kwargs['model'] = 'chatgpt-0613'
+        elif listinstr(['MMVet', 'MathVista', 'LLaVABench'], dataset_name):
+            judge_kwargs['model'] = 'gpt-4-turbo'
+    if 'OPENAI_API_KEY_JUDGE' in os.environ and len(os.environ['OPENAI_API_KEY_JUDGE']):
+        judge_kwargs['key'] = os.environ['OPENAI_API_KEY_JUDGE']
+    if 'OPENAI_API_BASE_JUDGE' in os.environ and len(os.environ['OPENAI_API_BASE_JUDGE']):
+        judge_kwargs['api_base'] = os.environ['OPENAI_API_BASE_JUDGE']
+    return judge_kwargs
+
+
+def evaluate_result(result_file, dataset_name, custom_flag=False, **judge_kwargs):
+    """Run the evaluator of ``dataset_name`` on the prediction file ``result_file``.
+
+    Returns:
+        bool: False if the dataset is not handled by any evaluator.
+    """
+    logger = get_logger('Evaluation')
+    if DATASET_TYPE(dataset_name) == 'multi-choice':
+        dataset_name = 'default' if custom_flag else dataset_name
+        evaluate.multiple_choice_eval(result_file, dataset=dataset_name, **judge_kwargs)
+    elif DATASET_TYPE(dataset_name) == 'Y/N':
+        evaluate.YOrN_eval(result_file, dataset=dataset_name, **judge_kwargs)
+    elif DATASET_TYPE(dataset_name) == 'multi_step_claim':
+        evaluate.multi_step_claim_eval(result_file)
+    elif DATASET_TYPE(dataset_name) == 'multi_step_property':
+        evaluate.multi_step_property_eval(result_file)
+    elif DATASET_TYPE(dataset_name) == 'multi_step_agri':
+        evaluate.multi_step_agri_eval(result_file)
+    elif DATASET_TYPE(dataset_name) == 'multi_step_liability':
+        evaluate.multi_step_liability_eval(result_file, **judge_kwargs)
+    elif DATASET_TYPE(dataset_name) == 'multi_step_health':
+        evaluate.multi_step_health_eval(result_file)
+    elif DATASET_TYPE(dataset_name) == 'Caption':
+        evaluate.COCO_eval(result_file)
+    elif dataset_name == 'MMVet':
+        evaluate.MMVet_eval(result_file, **judge_kwargs)
+    elif dataset_name == 'OCRBench':
+        evaluate.OCRBench_eval(result_file)
+    elif listinstr(['OCRVQA', 'TextVQA', 'ChartQA', 'DocVQA', 'InfoVQA', 'textfree_test'], dataset_name):
+        evaluate.VQAEval(result_file)
+    elif listinstr(['MathVista'], dataset_name):
+        evaluate.MathVista_eval(result_file, **judge_kwargs)
+    elif listinstr(['LLaVABench'], dataset_name):
+        evaluate.LLaVABench_eval(result_file, **judge_kwargs)
+    else:
+        logger.error(f'Dataset {dataset_name} is not handled by evaluator, will be skipped. ')
+        return False
+    return True
@@ -0,0 +1,56 @@
+import hashlib
+import inspect
+import os.path as osp
+import sys
+import pandas as pd
+from ..smp import load, dump
+
+
+def prediction_hash(prediction):
+    """A short content hash of a prediction, or of a list of predictions (e.g. the rows of a question)."""
+    if isinstance(prediction, (list, tuple)):
+        prediction = '\x00'.join(str(x) for x in prediction)
+    return hashlib.md5(str(prediction).encode('utf-8')).hexdigest()[:16]
+
+
+def parser_version(parse):
+    """A short hash of the source of the module defining ``parse``, which changes with the parser and
+    with the helpers and patterns it uses."""
+    try:
+        source = inspect.getsource(sys.modules[parse.__module__])
+    except (KeyError, OSError, TypeError):
+        # Defined without a source file (e.g. interactively)
+        source = parse.__code__.co_code.hex()
+    return hashlib.md5(source.encode('utf-8')).hexdigest()[:8]
+
+
+def parse_incremental(data, parse, columns, cache_file):
+    """Set ``data[columns]`` to ``data['prediction'].apply(parse)``, parsing the changed rows only.
+
+    The parsed values of every row are stored in ``cache_file`` by index, along with the version of
+    the parser (see ``parser_version``) and the hash of the prediction they were parsed from. Rows whose
+    prediction did not change since the last call (e.g. all but the records retried by
+    ``infer_data_job``) are read back from it, all of them are parsed again once the parser changes.
+
+    Returns:
+        int: The number of rows parsed.
+    """
+    cache = load(cache_file) if osp.exists(cache_file) else {}
+    version = parser_version(parse)
+    rows, parsed = [], 0
+    for idx, pred in zip(data['index'], data['prediction']):
+        key = version + prediction_hash(pred)
+        if idx not in cache or cache[idx][0] != key:
+            cache[idx] = (key, list(parse(pred)))
+            parsed += 1
+        rows.append(cache[idx][1])
+    if parsed:
+        dump(cache, cache_file)
+    data[columns] = pd.DataFrame(rows, index=data.index, columns=columns)
+    return parsed
+
+
+def parsed_checkpoint(input_file):
+    # The parsed predictions of input_file, see `parse_incremental`
+    base_name, _ = osp.splitext(input_file)
+    return f'{base_name}_parsed.pkl'
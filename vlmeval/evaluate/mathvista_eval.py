@@ -1,6 +1,7 @@
 from vlmeval.evaluate.misc import build_judge
+from vlmeval.evaluate.aggregate import multi_group_sums
 from vlmeval.smp import *
-from vlmeval.utils import track_progress_rich
+from vlmeval.utils import track_progress_rich, load_checkpoint
 from vlmeval.utils.matching_util import can_infer
 
 def get_gpt4_ICE():
@@ -107,44 +108,25 @@ def MathVista_auxeval(model, line):
 
 def MathVista_acc(result_file):
     data = load(result_file)
-    tot = defaultdict(lambda: 0)
-    fetch = defaultdict(lambda: 0)
-    hit = defaultdict(lambda: 0)
-    lt = len(data)
-    skill_list = []
-    for i in range(lt):
-        item = data.iloc[i]
-        index = item['index']
-        cate = item['task']
-        tot['Overall'] += 1
+    skills = {}
+    for x in data['skills'].unique():
         try:
-            skills = eval(item['skills'])
+            skills[x] = eval(x)
         except SyntaxError:
-            skills = [item['skills']]
-        for skill in skills:
-            if skill not in skill_list:
-                skill_list.append(skill)
-            tot[skill] += 1
-        tot[cate] += 1
-        if item['log'] == 'Prefetch succeed':
-            fetch['Overall'] += 1
-            fetch[cate] += 1
-            for skill in skills:
-                fetch[skill] += 1
-        if post_check(item, prefetch=False):
-            hit['Overall'] += 1
-            hit[cate] += 1
-            for skill in skills:
-                hit[skill] += 1
-                    
+            skills[x] = [x]
+    # A question counts for the overall score, each of its skills and its task
+    groups = [['Overall'] + list(skills[x]) + [cate] for x, cate in zip(data['skills'], data['task'])]
+    fetch = data['log'] == 'Prefetch succeed'
+    hit = [bool(post_check(item, prefetch=False)) for item in data.to_dict('records')]
+    stats = multi_group_sums(groups, fetch=fetch, hit=hit)
+
     res = defaultdict(list)
-    for k in tot.keys():
-        res['Task&Skill'].append(k)
-        res['tot'].append(tot[k])
-        res['prefetch'].append(fetch[k])
-        res['hit'].append(hit[k])
-        res['prefetch_rate'].append(fetch[k] / tot[k] * 100)
-        res['acc'].append(hit[k] / tot[k] * 100)
+    res['Task&Skill'] = list(stats['group'])
+    res['tot'] = list(stats['count'])
+    res['prefetch'] = list(stats['fetch'].astype(int))
+    res['hit'] = list(stats['hit'].astype(int))
+    res['prefetch_rate'] = list(stats['fetch'] / stats['count'] * 100)
+    res['acc'] = list(stats['hit'] / stats['count'] * 100)
     res = pd.DataFrame(res)
     return res
 
@@ -152,7 +134,7 @@ def MathVista_eval(eval_file, model='gpt-4-turbo', nproc=4, verbose=False):
     logger =  get_logger('Evaluation')
 
     suffix = eval_file.split('.')[-1]
-    storage = eval_file.replace(f'.{suffix}', f'_{model}.xlsx')
+    storage = eval_file.replace(f'.{suffix}', f'_{model}.{suffix}')
     tmp_file = eval_file.replace(f'.{suffix}', f'_{model}.pkl')
     if osp.exists(storage):
         logger.warning(f"GPT scoring file {storage} already exists, will reuse it in MathVista_eval. ")
@@ -166,9 +148,7 @@ def MathVista_eval(eval_file, model='gpt-4-turbo', nproc=4, verbose=False):
         tups = [(model, line) for line in lines]
         indices = [line['index'] for line in lines]
 
-        ans = {}
-        if osp.exists(tmp_file):
-            ans = load(tmp_file)
+        ans = load_checkpoint(tmp_file)
         tups = [x for x, i in zip(tups, indices) if i not in ans]
         indices = [i for i in indices if i not in ans]
         
@@ -191,7 +171,7 @@ def MathVista_eval(eval_file, model='gpt-4-turbo', nproc=4, verbose=False):
         dump(data, storage)
     
     score = MathVista_acc(storage)
-    score_pth = storage.replace('.xlsx','_score.csv')
+    score_pth = storage.replace(f'.{suffix}', '_score.csv')
     
     dump(score,score_pth)
     logger.info(f'MathVista_eval successfully finished evaluating {eval_file}, results saved in {score_pth}')
@@ -8,10 +8,13 @@ def build_judge(version, **kwargs):
         'gpt-4-turbo': 'gpt-4-1106-preview', 
         'gpt-4-0613': 'gpt-4-0613',
         'gpt-4-0314': 'gpt-4-0314',
+        'gpt-4o': 'gpt-4o',
         'chatgpt-1106': 'gpt-3.5-turbo-1106',
         'chatgpt-0613': 'gpt-3.5-turbo-0613'
     }
     model_version = model_map[version]
+    # Judge prompts repeat across reruns, models and datasets, serve them from the response cache
+    kwargs.setdefault('cache', True)
     if INTERNAL:
         model = OpenAIWrapperInternal(model_version, **kwargs)
     else:
@@ -1,6 +1,7 @@
 from vlmeval.evaluate.misc import build_judge
+from vlmeval.evaluate.aggregate import multi_group_sums
 from vlmeval.smp import *
-from vlmeval.utils import track_progress_rich
+from vlmeval.utils import track_progress_rich, load_checkpoint
 
 def build_mmvet_gpt4_prompt(line):
     question = line['question']
@@ -46,26 +47,16 @@ def MMVet_auxeval(model, line):
 
 def MMVet_acc(result_file):
     data = load(result_file)
-    tot = defaultdict(lambda: 0)
-    score = defaultdict(lambda: 0)
-    lt = len(data)
+    cate_list = ['rec','ocr','know','gen','spat','math']
     cate2_list = []
-    for i in range(lt):
-        item = data.iloc[i]
-        cate = item['category']
+    groups = {}
+    for cate in data['category'].unique():
         cate2 = cate.replace(',','_')
+        # A category counts for each of its capabilities, the overall score and itself
+        groups[cate] = [capa for capa in cate_list if capa in cate] + ['Overall', cate2]
         if cate2 not in cate2_list:
             cate2_list.append(cate2)
-        grade = float(item['score'])
-        cate_list = ['rec','ocr','know','gen','spat','math']
-        for capa in cate_list:
-            if capa in cate:
-                tot[capa] += 1
-                score[capa] += grade
-        tot['Overall'] += 1
-        tot[cate2] += 1
-        score['Overall'] += grade
-        score[cate2] += grade
+    stats = multi_group_sums([groups[x] for x in data['category']], score=data['score']).set_index('group')
 
     res = defaultdict(list)
     res2 = defaultdict(list)
@@ -73,12 +64,12 @@ def MMVet_acc(result_file):
     cate2_list.append('Overall')
     for k in cate_list:
         res['Category'].append(k)
-        res['tot'].append(tot[k])
-        res['acc'].append(score[k] / tot[k] * 100)
+        res['tot'].append(stats['count'][k])
+        res['acc'].append(stats['score'][k] / stats['count'][k] * 100)
     for v in cate2_list:
         res2['Category'].append(v)
-        res2['tot'].append(tot[v])
-        res2['acc'].append(score[v] / tot[v] * 100)
+        res2['tot'].append(stats['count'][v])
+        res2['acc'].append(stats['score'][v] / stats['count'][v] * 100)
     res = pd.DataFrame(res)
     res2 = pd.DataFrame(res2)
     return res, res2
@@ -87,7 +78,7 @@ def MMVet_eval(eval_file, model='gpt-4-turbo', nproc=4, verbose=False):
     logger = get_logger('Evaluation')
 
     suffix = eval_file.split('.')[-1]
-    storage = eval_file.replace(f'.{suffix}', f'_{model}.xlsx')
+    storage = eval_file.replace(f'.{suffix}', f'_{model}.{suffix}')
     tmp_file = eval_file.replace(f'.{suffix}', f'_{model}.pkl')
     if osp.exists(storage):
         logger.warning(f"GPT scoring file {storage} already exists, will reuse it in MMVet_eval. ")
@@ -101,9 +92,7 @@ def MMVet_eval(eval_file, model='gpt-4-turbo', nproc=4, verbose=False):
         tups = [(model, line) for line in lines]
         indices = [line['index'] for line in lines]
 
-        ans = {}
-        if osp.exists(tmp_file):
-            ans = load(tmp_file)
+        ans = load_checkpoint(tmp_file)
         tups = [x for x, i in zip(tups, indices) if i not in ans]
         indices = [i for i in indices if i not in ans]
         
@@ -126,8 +115,8 @@ def MMVet_eval(eval_file, model='gpt-4-turbo', nproc=4, verbose=False):
         dump(data, storage)
 
     score, score_fine = MMVet_acc(storage)
-    score_pth = storage.replace('.xlsx', '_score.csv')
-    score_fine_pth = storage.replace('.xlsx', '_score_fine.csv')
+    score_pth = storage.replace(f'.{suffix}', '_score.csv')
+    score_fine_pth = storage.replace(f'.{suffix}', '_score_fine.csv')
 
     dump(score, score_pth)
     dump(score_fine, score_fine_pth)
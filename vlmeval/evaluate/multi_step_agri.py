@@ -1,4 +1,6 @@
 import pandas as pd
+from ..smp import load, dump
+from .incremental import parse_incremental, parsed_checkpoint
 import re
 import os
 
@@ -31,8 +33,8 @@ def extract_numeric(text):
     return None
 
 def multi_step_agri_eval(input_file):
-    # Load dataset from the Excel file
-    data = pd.read_excel(input_file)
+    # Load the prediction file
+    data = load(input_file)
 
     # Define a function to parse the prediction text into its constituent parts
     def parse_prediction(prediction):
@@ -64,8 +66,9 @@ def multi_step_agri_eval(input_file):
             return pd.Series([None, None, None, None])
 
     # Apply the parsing function to the 'prediction' column in the dataset
-    data[['Predicted_Crop_Species', 'Predicted_Fruit_Count', 'Predicted_Pest_Infection', 
-          'Predicted_Insurance_Decision']] = data['prediction'].apply(parse_prediction)
+    # Only the rows whose prediction changed since the last evaluation are parsed again
+    parse_incremental(data, parse_prediction, ['Predicted_Crop_Species', 'Predicted_Fruit_Count', 'Predicted_Pest_Infection', 
+                                               'Predicted_Insurance_Decision'], parsed_checkpoint(input_file))
 
     # Convert fruit count predictions and ground truth 'count' to numeric if possible
     try:
@@ -122,6 +125,6 @@ def multi_step_agri_eval(input_file):
     base_name, ext = os.path.splitext(input_file)
     output_file = f"{base_name}_evaluation{ext}"
 
-    # Save the evaluation results to a new Excel file
-    data.to_excel(output_file, index=False)
+    # Save the evaluation results next to the prediction file
+    dump(data, output_file)
     print(f"Evaluation results saved to {output_file}")
@@ -1,9 +1,11 @@
 import pandas as pd
+from ..smp import load, dump
+from .incremental import parse_incremental, parsed_checkpoint
 import re
 import os
 
 def multi_step_claim_eval(input_file):
-    data = pd.read_excel(input_file)
+    data = load(input_file)
 
     def parse_prediction(prediction):
         try:
@@ -24,7 +26,8 @@ def multi_step_claim_eval(input_file):
         except AttributeError:
             return pd.Series([None, None, 0, None, 0])
 
-    data[['Predicted_Damaged', 'Predicted_Severity', 'Predicted_Repair_Cost', 'Predicted_Claim_Eligible', 'Predicted_Final_Claim']] = data['prediction'].apply(parse_prediction)
+    # Only the rows whose prediction changed since the last evaluation are parsed again
+    parse_incremental(data, parse_prediction, ['Predicted_Damaged', 'Predicted_Severity', 'Predicted_Repair_Cost', 'Predicted_Claim_Eligible', 'Predicted_Final_Claim'], parsed_checkpoint(input_file))
 
     data['Amount'] = data['Amount'].astype(float)
     data['claim'] = data['claim'].astype(float)
@@ -70,5 +73,5 @@ def multi_step_claim_eval(input_file):
     base_name, ext = os.path.splitext(input_file)
     output_file = f"{base_name}_evaluation{ext}"
 
-    data.to_excel(output_file, index=False)
+    dump(data, output_file)
     print(f"saved to {output_file}")
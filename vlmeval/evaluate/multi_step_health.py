@@ -1,4 +1,6 @@
 import pandas as pd
+from ..smp import load, dump
+from .incremental import parse_incremental, parsed_checkpoint
 import re
 import os
 
@@ -35,12 +37,14 @@ def parse_prediction(prediction):
         return pd.Series([None, None, None, None, None])
 
 def multi_step_health_eval(input_file):
-    # Load dataset from the Excel file
-    data = pd.read_excel(input_file)
+    # Load the prediction file
+    data = load(input_file)
 
     # Apply the parsing function to the 'prediction' column
-    data[['Predicted_Scan_Region', 'Predicted_Scan_Result', 'Predicted_Health_Risk', 
-          'Predicted_Underwriting_Decision', 'Predicted_Underwriting_Reason']] = data['prediction'].apply(parse_prediction)
+    # Only the rows whose prediction changed since the last evaluation are parsed again
+    parse_incremental(data, parse_prediction, ['Predicted_Scan_Region', 'Predicted_Scan_Result', 'Predicted_Health_Risk', 
+                                               'Predicted_Underwriting_Decision', 'Predicted_Underwriting_Reason'],
+                      parsed_checkpoint(input_file))
 
     # Compute correctness for each feature by comparing predictions with ground truth.
     # Ground truth columns: 'scan_region', 'scan_result_match', 'health_risk', 'underwriting_decision'
@@ -65,6 +69,6 @@ def multi_step_health_eval(input_file):
     base_name, ext = os.path.splitext(input_file)
     output_file = f"{base_name}_evaluation{ext}"
 
-    # Save the evaluation results to a new Excel file
-    data.to_excel(output_file, index=False)
+    # Save the evaluation results next to the prediction file
+    dump(data, output_file)
     print(f"Evaluation results saved to {output_file}")
\ No newline at end of file
@@ -1,28 +1,25 @@
 import pandas as pd
+from functools import partial
+from ..smp import load, dump, gpt_key_set
+from .incremental import parse_incremental, parsed_checkpoint
+from .dedup import canonical_prompt, group_duplicates, log_dedup_stats
+from .misc import build_judge
+from ..utils import track_progress_async
+from ..utils.checkpoint import CheckpointJournal, load_checkpoint
 import re
 import os
-import concurrent.futures
-from openai import OpenAI
 
-# ---------------- OpenAI API Configuration ----------------
-if 'OPENAI_API_BASE' in os.environ and os.environ['OPENAI_API_BASE'] != '':
-    api_base = os.environ['OPENAI_API_BASE']
-else:
-    api_base = 'https://api.openai.com/v1/chat/completions'
+INTERNAL = os.environ.get('INTERNAL', 0)
 
-env_key = os.environ.get('OPENAI_API_KEY', '')
+# ---------------- Judge Configuration ----------------
+CAUSE_SYSTEM_PROMPT = "You are an expert in traffic accident analysis and legal liability."
 
-client = OpenAI(
-    base_url=api_base,  # Replace with your API endpoint
-    api_key= env_key  # Your API key
-)
-
-def get_res(messages: list):
-    completion = client.chat.completions.create(model="gpt-4o", messages=messages, temperature=0)
-    return completion.choices[0].message.content
+def build_cause_judge(model='gpt-4o', verbose=False, retry=10, **kwargs):
+    # The judge of the accident causes, on the shared judge client (retries, rate limits, response cache)
+    return build_judge(model, system_prompt=CAUSE_SYSTEM_PROMPT, temperature=0, verbose=verbose, retry=retry, **kwargs)
 
 # ---------------- Accident Cause Consistency Evaluation ----------------
-def assess_cause_consistency(gt_cause: str, pred_cause: str) -> str:
+def build_cause_prompt(gt_cause: str, pred_cause: str) -> str:
     prompt = f"""Given the following ground truth accident cause and the predicted accident cause, determine if they are closely related or consistent.
 
 Ground Truth Accident Cause: {gt_cause}
@@ -30,33 +27,57 @@ Predicted Accident Cause: {pred_cause}
 
 Please provide your conclusion in the following format without further explanation:
 [Accident Cause Consistency: Consistent] or [Accident Cause Consistency: Not Consistent]"""
-    
-    messages = [
-        {"role": "system", "content": "You are an expert in traffic accident analysis and legal liability."},
-        {"role": "user", "content": prompt}
-    ]
-    
+    return prompt
+
+def assess_cause_consistency(judge, gt_cause: str, pred_cause: str) -> str:
+    try:
+        answer = judge.generate(build_cause_prompt(gt_cause, pred_cause))
+    except Exception as e:
+        return "error"
+    return "error" if judge.fail_msg in answer else answer.strip()
+
+async def aassess_cause_consistency(judge, gt_cause: str, pred_cause: str) -> str:
     try:
-        answer = get_res(messages)
-        return answer.strip()
+        answer = await judge.agenerate(build_cause_prompt(gt_cause, pred_cause))
     except Exception as e:
         return "error"
+    return "error" if judge.fail_msg in answer else answer.strip()
+
+def cause_checkpoint(input_file):
+    # The judge results of the (gt_cause, pred_cause) pairs of input_file
+    base_name, _ = os.path.splitext(input_file)
+    return f"{base_name}_cause_tmp.pkl"
 
-def assess_cause_consistency_concurrent(pairs: list, max_workers: int = 8):
+def assess_cause_consistency_concurrent(judge, pairs: list, concurrency: int = 4, save=None):
     """
-    Given a list of tuples (gt_cause, pred_cause), concurrently obtain consistency evaluations.
-    Returns a dictionary mapping each (gt_cause, pred_cause) tuple to its GPT evaluation result.
+    Given a list of tuples (gt_cause, pred_cause), obtain their consistency evaluations with at most
+    `concurrency` judge requests in flight.
+    Returns a dictionary mapping each (gt_cause, pred_cause) tuple to its judge result.
+    If save is set, each result is recorded in that checkpoint as soon as it is obtained, so that an
+    interrupted evaluation resumes from there.
     """
     results = {}
-    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-        future_to_pair = {executor.submit(assess_cause_consistency, gt, pred): (gt, pred) for gt, pred in pairs}
-        for future in concurrent.futures.as_completed(future_to_pair):
-            pair = future_to_pair[future]
-            try:
-                result = future.result()
-            except Exception:
-                result = "error"
-            results[pair] = result
+    # Identical (canonical) pairs are judged once
+    groups = group_duplicates([(canonical_prompt(str(gt)), canonical_prompt(str(pred))) for gt, pred in pairs])
+    todo = [pairs[pos[0]] for pos in groups.values()]
+
+    ckpt = CheckpointJournal(save) if save is not None else None
+
+    def record(key, result):
+        for pos in groups[key]:
+            results[pairs[pos]] = result
+            # Failed requests are not recorded, they are sent again on resume
+            if ckpt is not None and result != "error":
+                ckpt.append(pairs[pos], result)
+
+    try:
+        track_progress_async(
+            partial(aassess_cause_consistency, judge), todo, concurrency=concurrency,
+            keys=list(groups), callback=record, description='Accident cause consistency')
+    finally:
+        if ckpt is not None:
+            ckpt.close()
+    log_dedup_stats('Accident cause consistency', len(todo), len(pairs) - len(todo))
     return results
 
 # ---------------- Helper Function for Direct Matching ----------------
@@ -97,14 +118,15 @@ def parse_prediction(prediction):
         return pd.Series([None, None, None, None, None, None])
 
 # ---------------- Main Evaluation Function ----------------
-def multi_step_liability_eval(input_file):
-    # Load dataset from the Excel file
-    data = pd.read_excel(input_file)
+def multi_step_liability_eval(input_file, model='gpt-4o', nproc=4, verbose=False, retry=10, **judge_kwargs):
+    # Load the prediction file
+    data = load(input_file)
 
     # Apply the parsing function to the 'prediction' column
-    data[['Predicted_Weather', 'Predicted_Scene', 'Predicted_Linear',
-          'Predicted_Accident_Occurred', 'Predicted_Accident_Cause', 'Predicted_Responsible_Party']] = \
-          data['prediction'].apply(parse_prediction)
+    # Only the rows whose prediction changed since the last evaluation are parsed again
+    parse_incremental(data, parse_prediction, ['Predicted_Weather', 'Predicted_Scene', 'Predicted_Linear',
+                                               'Predicted_Accident_Occurred', 'Predicted_Accident_Cause', 'Predicted_Responsible_Party'],
+                      parsed_checkpoint(input_file))
 
     # ---------------- Evaluate Accident Cause Consistency via GPT ----------------
     # Create a list of tuples (gt_cause, pred_cause) for rows where both are provided
@@ -115,10 +137,16 @@ def multi_step_liability_eval(input_file):
         if pd.notna(gt_cause) and pd.notna(pred_cause):
             cause_pairs.append((gt_cause, pred_cause))
     
-    if cause_pairs:
-        cause_consistency_results = assess_cause_consistency_concurrent(cause_pairs)
-    else:
-        cause_consistency_results = {}
+    # Pairs judged by a previous (or streaming) run are read from the checkpoint
+    tmp_file = cause_checkpoint(input_file)
+    cause_consistency_results = load_checkpoint(tmp_file)
+    todo = [pair for pair in cause_pairs if pair not in cause_consistency_results]
+    if todo and (INTERNAL or gpt_key_set() or 'key' in judge_kwargs):
+        judge = build_cause_judge(model, verbose=verbose, retry=retry, **judge_kwargs)
+        cause_consistency_results.update(
+            assess_cause_consistency_concurrent(judge, todo, concurrency=nproc, save=tmp_file))
+    elif todo:
+        print("OPENAI_API_KEY is not set, the accident causes can not be evaluated by the judge. ")
 
     def get_consistency(row):
         gt = row.get("causes")
@@ -176,6 +204,6 @@ def multi_step_liability_eval(input_file):
     base_name, ext = os.path.splitext(input_file)
     output_file = f"{base_name}_evaluation{ext}"
 
-    # Save the evaluation results to a new Excel file
-    data.to_excel(output_file, index=False)
+    # Save the evaluation results next to the prediction file
+    dump(data, output_file)
     print(f"Evaluation results saved to {output_file}")
\ No newline at end of file
@@ -1,4 +1,6 @@
 import pandas as pd
+from ..smp import load, dump
+from .incremental import parse_incremental, parsed_checkpoint
 import re
 import ast
 import os
@@ -72,11 +74,13 @@ def parse_prediction(prediction):
         return pd.Series([None, None, None, None, None])
 
 def multi_step_property_eval(input_file):
-    data = pd.read_excel(input_file)
+    data = load(input_file)
     
     # Apply parsing function
-    data[['Predicted_Disaster_Occurred', 'Predicted_Disaster_Type', 'Predicted_House_Count', 
-          'Predicted_Damaged_House_Count', 'Predicted_Insurance_Decision']] = data['prediction'].apply(parse_prediction)
+    # Only the rows whose prediction changed since the last evaluation are parsed again
+    parse_incremental(data, parse_prediction, ['Predicted_Disaster_Occurred', 'Predicted_Disaster_Type', 'Predicted_House_Count', 
+                                               'Predicted_Damaged_House_Count', 'Predicted_Insurance_Decision'],
+                      parsed_checkpoint(input_file))
     
     # Convert numerical values
     for col in ['Predicted_House_Count', 'number', 'Predicted_Damaged_House_Count', 'damage_number']:
@@ -105,6 +109,7 @@ def multi_step_property_eval(input_file):
     print("Average Damaged House Count Difference:", f"{avg_damaged_diff:.2f}" if avg_damaged_diff is not None else "N/A")
     
     # Save results
-    output_file = f"{os.path.splitext(input_file)[0]}_evaluation.xlsx"
-    data.to_excel(output_file, index=False)
+    base_name, ext = os.path.splitext(input_file)
+    output_file = f"{base_name}_evaluation{ext}"
+    dump(data, output_file)
     print(f"Evaluation results saved to {output_file}")
\ No newline at end of file
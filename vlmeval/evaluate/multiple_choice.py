@@ -2,7 +2,10 @@ import os.path as osp
 import pandas as pd
 from tqdm import tqdm
 from vlmeval.evaluate.misc import build_judge
-from vlmeval.utils import can_infer, track_progress_rich, TSVDataset
+from vlmeval.evaluate.dedup import JudgeDedup, log_dedup_stats
+from vlmeval.evaluate.incremental import prediction_hash
+from vlmeval.evaluate.aggregate import group_sums, group_means
+from vlmeval.utils import can_infer, can_infer_batch, track_progress_async, load_checkpoint, TSVDataset
 from vlmeval.smp import *
 import numpy as np
 
@@ -37,24 +40,24 @@ def report_acc(df):
     res = defaultdict(list)
 
     if 'split' in df:
-        splits = list(set(df['split']))
+        splits = list(set(df['split'].unique()))
         res['split'] = splits
     else:
         df['split'] = ['dev'] * len(df)
         res['split'] = ['dev']
 
+    table = group_sums(df, [k for k in ['split', 'l2-category', 'category'] if k in df], ['hit'])
     for group in [None, 'l2-category', 'category']:
         if group is None:
-            res['Overall'] = [np.mean(df[df['split'] == sp]['hit']) for sp in res['split']]
+            res['Overall'] = list(group_means(table, ['split'], 'hit').reindex(res['split']))
         elif group not in df:
             continue
         else:
-            abilities = list(set(df[group]))
-            abilities.sort()
-            for ab in abilities:
+            acc = group_means(table, [group, 'split'], 'hit').unstack('split')
+            acc = acc.reindex(index=sorted(set(df[group].unique())), columns=res['split'])
+            for ab, row in acc.iterrows():
                 ab_name = abbrs[ab] if ab in abbrs else ab
-                sub_df = df[df[group] == ab]
-                res[ab_name] = [np.mean(sub_df[sub_df['split'] == sp]['hit']) for sp in res['split']]
+                res[ab_name] = list(row)
     return pd.DataFrame(res)
 
 def build_prompt(question, options, prediction):
@@ -99,7 +102,6 @@ def prefetch_answer(item):
     return can_infer(item['prediction'], choices)
 
 def extract_answer_from_item(model, item):
-    logger = get_logger('Evaluation')
     # It will return: (pred, raw, llm_time)
     choices = build_choices(item)
     option_str = build_option_str(choices)
@@ -108,12 +110,32 @@ def extract_answer_from_item(model, item):
         prompt = build_prompt_cn(item['question'], option_str, item['prediction'])
     else:
         prompt = build_prompt(item['question'], option_str, item['prediction'])
-    retry = 3
 
     ret = can_infer(item['prediction'], choices)
     if ret: 
         return dict(opt=ret, log=item['prediction'])
-    
+
+    texts = [str(v) for v in choices.values()]
+    if not isinstance(model, JudgeDedup) or len(set(texts)) < len(texts):
+        return judge_answer(model, prompt, choices)
+    # Circular passes of a question only permute the options, the option text matched by the judge
+    # for one pass (with the same prediction) holds for all of them
+    key = ('choice', str(item['question']), item['prediction'], tuple(sorted(texts)))
+
+    def judge():
+        ret = judge_answer(model, prompt, choices, fallback=False)
+        if ret is not None:
+            ret = dict(text=str(choices[ret['opt']]) if ret['opt'] in choices else ret['opt'], log=ret['log'])
+        return ret
+
+    ret = model.share(key, judge, keep=lambda x: x is not None)
+    if ret is None:
+        return judge_answer(model, prompt, choices, retry=0)
+    text2opt = {str(v): k for k, v in choices.items()}
+    return dict(opt=text2opt.get(ret['text'], ret['text']), log=ret['log'])
+
+def judge_answer(model, prompt, choices, retry=3, fallback=True):
+    logger = get_logger('Evaluation')
     while retry:
         ans = model.generate(prompt)
         if 'Failed to obtain answer via API' in ans:
@@ -126,9 +148,10 @@ def extract_answer_from_item(model, item):
                 logger.warning(f'Output includes 0 / > 1 letter among candidates {set(choices)} and Z: {ans}')
         retry -= 1
 
-        if retry == 0:
-            options = list(choices) + ['Z'] if 'Z' not in choices else []
-            return dict(opt=rd.choice(options), log='Failed to predict, thus randomly generate one. ')
+    if not fallback:
+        return None
+    options = list(choices) + ['Z'] if 'Z' not in choices else []
+    return dict(opt=rd.choice(options), log='Failed to predict, thus randomly generate one. ')
             
 def prefetch_sub_data(sub_data, answer_map, verbose=False):
     lt = len(sub_data)
@@ -150,6 +173,12 @@ def prefetch_sub_data(sub_data, answer_map, verbose=False):
     return ret if len(ret) > 1 else ret[0]
             
 def eval_sub_data(model, sub_data, answer_map):
+    res = _eval_sub_data(model, sub_data, answer_map)
+    # The predictions the result holds for, see `multiple_choice_eval`
+    res['pred_hash'] = prediction_hash(list(sub_data['prediction']))
+    return res
+
+def _eval_sub_data(model, sub_data, answer_map):
     res, GT, PRED = prefetch_sub_data(sub_data, answer_map, verbose=True)
     if res is not None:
         return res
@@ -171,35 +200,74 @@ def eval_sub_data(model, sub_data, answer_map):
 
     return dict(hit=1, log=log)
 
-def eval_data_groups(model, data_groups, answer_map, result, result_file, nproc=16):
-    prefetched = [prefetch_sub_data(g, answer_map, verbose=False) for g in data_groups]
-    remain = []
-    for dg, pf in zip(data_groups, prefetched):
-        if pf:
-            result[dg.iloc[0]['index'] % 1e6] = pf
-        else:
-            remain.append(dg)
+def prefetch_data(data, answer_map):
+    """Apply `prefetch_sub_data` to all groups of `data` at once (the rows of a group share `index % 1e6`).
+
+    Returns:
+        dict: {index % 1e6: result} of the groups settled by pre-fetching.
+    """
+    options = [ch for ch in string.ascii_uppercase if ch in data]
+    GT = [answer_map[i] for i in data['index']]
+    predictions = list(data['prediction'])
+    choices = [
+        {ch: v for ch, v in zip(options, values) if not pd.isna(v)}
+        for values in zip(*[data[ch] for ch in options])]
+    PRED = can_infer_batch(predictions, choices)
+
+    keys = (data['index'] % 1e6).tolist()
+    rolling = pd.Series(keys).groupby(keys, sort=False).cumcount().tolist()
+    matched = np.array([bool(p) for p in PRED], dtype=bool)
+    equal = np.array([g == p for g, p in zip(GT, PRED)], dtype=bool)
+
+    ret = {}
+    # The first matched rolling of a group that disagrees with the answer fails the group
+    for i in np.flatnonzero(matched & ~equal):
+        if keys[i] not in ret:
+            log = f"Failed in Prefetching Rolling {rolling[i]}: Answer is {GT[i]}, Prediction is {predictions[i]}, Pre-fetched is {PRED[i]}. "
+            ret[keys[i]] = dict(hit=0, log=log)
+    succeed = pd.Series(equal).groupby(keys, sort=False).all()
+    for k in succeed.index[succeed.values]:
+        ret[k] = dict(hit=1, log="Succeed During Pre-fetching")
+    return ret
+
+def eval_data_groups(model, data, answer_map, result, result_file, nproc=16):
+    # All groups of `data` are (re-)evaluated, the stale results of changed groups are overwritten
+    groups = data.groupby((data['index'] % 1e6).tolist(), sort=False).indices
+    predictions = np.array(data['prediction'], dtype=object)
+    hashes = {k: prediction_hash(list(predictions[pos])) for k, pos in groups.items()}
+    settled = prefetch_data(data, answer_map)
+    for k, v in settled.items():
+        v['pred_hash'] = hashes[k]
+    result.update(settled)
     dump(result, result_file)
-    tups = [(model, x, answer_map) for x in remain]
-    keys = [x.iloc[0]['index'] % 1e6 for x in remain]
-    if len(tups) == 0:
+    keys = [k for k in groups if k not in settled]
+    if len(keys) == 0:
         return
     
     if model is None:
         logger = get_logger('Evaluation')
         logger.warning("Exact Matching mode, will not do GPT-based answer matching. ")
         for k in keys:
-            result[k] = dict(hit=0, log="Failed in Prefetch, no GPT-based answer matching under `exact_matching` policy.")
+            result[k] = dict(
+                hit=0, log="Failed in Prefetch, no GPT-based answer matching under `exact_matching` policy.",
+                pred_hash=hashes[k])
         dump(result, result_file)
         return
 
-    res = track_progress_rich(
+    # The groups are judged by threads of this process, so that all of them share the `JudgeDedup` of the
+    # judge (a process pool would pickle one copy per task, deduplicating within a group only)
+    tups = [(model, data.iloc[groups[k]], answer_map) for k in keys]
+    before = model.stats() if isinstance(model, JudgeDedup) else None
+    res = track_progress_async(
         eval_sub_data,
-        tups, 
-        nproc=nproc,
-        chunksize=nproc, 
-        save=result_file, 
+        tups,
+        concurrency=nproc,
+        save=result_file,
         keys=keys)
+    if before is not None:
+        after = model.stats()
+        log_dedup_stats(
+            f'multiple_choice_eval of {result_file}', after['calls'] - before['calls'], after['saved'] - before['saved'])
     result = load(result_file)
     for k, v in zip(keys, res):
         if k in result:
@@ -233,16 +301,14 @@ def multiple_choice_eval(eval_file, dataset=None, model='chatgpt-0613', nproc=4,
         model_name = 'chatgpt-0613'
         
         if INTERNAL or gpt_key_set():
-            model = build_judge(model_name, verbose=verbose, retry=10)
+            model = JudgeDedup(build_judge(model_name, verbose=verbose, retry=10))
         else:
             logger.error('OPENAI_API_KEY is not set properly, will use exact matching for evaluation')
             model = None
     
     logger.info(f'Evaluating {eval_file}')
     result_file = eval_file.replace(f'.{suffix}', f'_{name_str}_result.pkl')
-    result = {}
-    if osp.exists(result_file):
-        result = load(result_file)
+    result = load_checkpoint(result_file)
         
     data = load(eval_file)
     data = data.sort_values(by='index')
@@ -266,38 +332,26 @@ def multiple_choice_eval(eval_file, dataset=None, model='chatgpt-0613', nproc=4,
     meta_idx_set = set(meta['index'])
     data_main = data_main[data_main['index'].isin(meta_idx_set)]
     
-    lt = len(data_main)
-    hit, tot = 0, 0
-
-    data_groups = []
-    for i in tqdm(range(lt)):
-        # Dealing with the normal part
-        item_main = data_main.iloc[i]
-        idx = item_main['index']
-        
-        if idx in result:
-            correct = result[idx]['hit']
-            assert correct in [0, 1]
-            hit += correct
-            tot += 1
-            continue
-            
-        sub_data = data[data['index'] % int(1e6) == idx]
-        data_groups.append(sub_data)
-
-    if len(data_groups):
+    # Rows of the same question (circular passes included) share `index % 1e6`. A question is evaluated
+    # again if its predictions changed since its result was stored (e.g. failed API calls retried since)
+    keys = (data['index'] % int(1e6)).tolist()
+    hashes = {k: prediction_hash(list(preds)) for k, preds in data['prediction'].groupby(keys, sort=False)}
+    changed = [i for i in data_main['index'] if i in result and result[i].get('pred_hash', hashes[i]) != hashes[i]]
+    if len(changed):
+        logger.info(f'The predictions of {len(changed)} questions changed since their evaluation, re-evaluating them. ')
+    pending = [i for i in data_main['index'] if i not in result] + changed
+    assert all(result[i]['hit'] in [0, 1] for i in data_main['index'] if i in result)
+    data = data[(data['index'] % int(1e6)).isin(set(pending))]
+
+    if len(data):
         eval_data_groups(
             model=model, 
-            data_groups=data_groups, 
+            data=data, 
             answer_map=answer_map,
             nproc=nproc, 
             result=result, 
             result_file=result_file)
         
-    tmp_pth = f'/tmp/{timestr()}.xlsx'
-    dump(data_main, tmp_pth)
-    data_main = load(tmp_pth)
-
     res = load(result_file)
     indices = data_main['index']
 
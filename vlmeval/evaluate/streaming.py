@@ -0,0 +1,241 @@
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from vlmeval.smp import *
+from vlmeval.utils import DATASET_TYPE, TSVDataset
+from vlmeval.utils.checkpoint import CheckpointJournal, load_checkpoint
+from .dedup import JudgeDedup, canonical_prompt, log_dedup_stats
+from .dispatch import evaluate_result
+from .incremental import prediction_hash
+
+INTERNAL = os.environ.get('INTERNAL', 0)
+FAIL_MSG = 'Failed to obtain answer via API.'
+
+
+class StreamEvaluator:
+    """Evaluate the predictions of a dataset while the inference is still running.
+
+    ``feed`` is called with every prediction as soon as it is produced. Subclasses settle what they
+    can inline (exact matching) and hand the rest to the judge in background threads, recording the
+    outcome in the checkpoint of the batch evaluator. ``finish`` runs the batch evaluator on the final
+    prediction file, which then only aggregates the warm checkpoint (and evaluates the predictions
+    that were not fed, e.g. failed API calls retried later). This base class only runs the evaluator
+    at the end, for the evaluators without a judge stage.
+
+    Args:
+        eval_file (str): The prediction file, written once the inference is done.
+        dataset_name (str): The dataset name.
+        custom_flag (bool): Whether the dataset is a custom one. Defaults to False.
+        **judge_kwargs: The kwargs of the evaluator (see ``build_judge_kwargs``).
+    """
+
+    def __init__(self, eval_file, dataset_name, custom_flag=False, **judge_kwargs):
+        self.eval_file = eval_file
+        self.dataset_name = dataset_name
+        self.custom_flag = custom_flag
+        self.judge_kwargs = judge_kwargs
+        self.suffix = eval_file.split('.')[-1]
+        self.logger = get_logger('Evaluation')
+        self._lock = threading.Lock()
+        self._fed = set()
+        self._futures = []
+        self._executor = None
+
+    def feed(self, index, prediction):
+        prediction = str(prediction)
+        with self._lock:
+            # Failed API calls may be retried, the batch evaluator takes the final prediction
+            if FAIL_MSG in prediction or index in self._fed:
+                return
+            self._fed.add(index)
+        self.process(index, prediction)
+
+    def process(self, index, prediction):
+        pass
+
+    def submit(self, func, *args):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.judge_kwargs.get('nproc', 4))
+            self._futures.append(self._executor.submit(func, *args))
+
+    def close(self):
+        pass
+
+    def drain(self):
+        """Wait for the judge calls in flight and flush the checkpoints."""
+        for fut in self._futures:
+            try:
+                fut.result()
+            except Exception as err:
+                # Not checkpointed, the batch evaluator will do it again
+                self.logger.warning(f'Streaming evaluation of {self.eval_file} failed on an item: {err}')
+        if self._executor is not None:
+            self._executor.shutdown()
+        self.close()
+
+    def finish(self):
+        self.drain()
+        return evaluate_result(self.eval_file, self.dataset_name, custom_flag=self.custom_flag, **self.judge_kwargs)
+
+
+class MultipleChoiceStream(StreamEvaluator):
+    """Warm the ``{eval_file}_{judge}_result.pkl`` checkpoint of ``multiple_choice_eval``.
+
+    The rows of a question (its circular passes) are evaluated together once all of them arrived:
+    by pre-fetching inline, and by the judge in the background if pre-fetching does not settle them.
+    """
+
+    def __init__(self, eval_file, dataset_name, custom_flag=False, **judge_kwargs):
+        super().__init__(eval_file, dataset_name, custom_flag=custom_flag, **judge_kwargs)
+        from .misc import build_judge
+        model = judge_kwargs.get('model', 'chatgpt-0613')
+        name_str = 'openai' if model == 'chatgpt-0613' else model
+        self.judge = None
+        if model == 'chatgpt-0613' and (INTERNAL or gpt_key_set()):
+            self.judge = JudgeDedup(build_judge(model, verbose=judge_kwargs.get('verbose', False), retry=10))
+
+        meta = TSVDataset(dataset_name).data
+        for k in list(meta.keys()):
+            meta[k.lower() if k not in list(string.ascii_uppercase) else k] = meta.pop(k)
+        self.meta = meta.drop(columns=['image'])
+        self.answer_map = {i: c for i, c in zip(meta['index'], meta['answer'])}
+        self.positions = {i: p for p, i in enumerate(meta['index'])}
+        # Rows of the same question share `index % 1e6`, the keys of the checkpoint
+        self.keys = {i: k for i, k in zip(meta['index'], (meta['index'] % 1e6).tolist())}
+        self.group_size = Counter(self.keys.values())
+        self.groups = defaultdict(dict)
+
+        result_file = eval_file.replace(f'.{self.suffix}', f'_{name_str}_result.pkl')
+        self.result = load_checkpoint(result_file)
+        self.ckpt = CheckpointJournal(result_file)
+
+    def record(self, key, res):
+        with self._lock:
+            self.result[key] = res
+            self.ckpt.append(key, res)
+
+    def process(self, index, prediction):
+        from .multiple_choice import prefetch_data
+        if index not in self.keys:
+            return
+        key = self.keys[index]
+        with self._lock:
+            group = self.groups[key]
+            group[index] = prediction
+            if len(group) < self.group_size[key]:
+                return
+            self.groups.pop(key)
+        positions = sorted(self.positions[i] for i in group)
+        sub_data = self.meta.iloc[positions].copy()
+        sub_data['prediction'] = [group[i] for i in sub_data['index']]
+        sub_data = sub_data.sort_values(by='index')
+        # Stored results hold as long as the predictions of the question did not change
+        pred_hash = prediction_hash(list(sub_data['prediction']))
+        if key in self.result and self.result[key].get('pred_hash', pred_hash) == pred_hash:
+            return
+        res = prefetch_data(sub_data, self.answer_map)
+        if key in res:
+            self.record(key, dict(res[key], pred_hash=pred_hash))
+        elif self.judge is not None:
+            self.submit(self.judge_group, key, sub_data, pred_hash)
+
+    def judge_group(self, key, sub_data, pred_hash):
+        from .multiple_choice import _eval_sub_data
+        self.record(key, dict(_eval_sub_data(self.judge, sub_data, self.answer_map), pred_hash=pred_hash))
+
+    def close(self):
+        self.ckpt.close()
+        if self.judge is not None:
+            stats = self.judge.stats()
+            log_dedup_stats(f'Streaming multiple_choice_eval of {self.eval_file}', stats['calls'], stats['saved'])
+
+
+class YOrNStream(StreamEvaluator):
+    """Warm the ``{eval_file}_tmp.pkl`` checkpoint of ``YOrN_eval`` with the judge answers of the
+    predictions that ``YOrN_Extraction`` cannot settle."""
+
+    def __init__(self, eval_file, dataset_name, custom_flag=False, **judge_kwargs):
+        super().__init__(eval_file, dataset_name, custom_flag=custom_flag, **judge_kwargs)
+        from .misc import build_judge
+        self.judge = None
+        if INTERNAL or gpt_key_set():
+            self.judge = JudgeDedup(
+                build_judge('chatgpt-0613', verbose=judge_kwargs.get('verbose', False), retry=10))
+        self.questions = {}
+        if self.judge is not None:
+            meta = TSVDataset(dataset_name).data
+            self.questions = {i: q for i, q in zip(meta['index'], meta['question'])}
+        self.ckpt = CheckpointJournal(eval_file.replace(f'.{self.suffix}', '_tmp.pkl'))
+
+    def process(self, index, prediction):
+        from .yes_or_no import YOrN_Extraction
+        if self.judge is None or index not in self.questions or YOrN_Extraction(prediction) != 'Unknown':
+            return
+        self.submit(self.judge_line, index, dict(question=self.questions[index], prediction=prediction))
+
+    def judge_line(self, index, line):
+        from .yes_or_no import YOrN_auxeval
+        ans = YOrN_auxeval(self.judge, line)
+        with self._lock:
+            self.ckpt.append((index, prediction_hash(line['prediction'])), ans)
+
+    def close(self):
+        self.ckpt.close()
+        if self.judge is not None:
+            stats = self.judge.stats()
+            log_dedup_stats(f'Streaming YOrN_eval of {self.eval_file}', stats['calls'], stats['saved'])
+
+
+class LiabilityStream(StreamEvaluator):
+    """Warm the accident cause checkpoint of ``multi_step_liability_eval``: the predicted cause is
+    parsed inline, and its consistency with the ground truth is judged in the background."""
+
+    def __init__(self, eval_file, dataset_name, custom_flag=False, **judge_kwargs):
+        super().__init__(eval_file, dataset_name, custom_flag=custom_flag, **judge_kwargs)
+        from .multi_step_liability import build_cause_judge, cause_checkpoint
+        kwargs = {k: v for k, v in judge_kwargs.items() if k != 'nproc'}
+        self.judge = None
+        if INTERNAL or gpt_key_set() or 'key' in kwargs:
+            self.judge = build_cause_judge(**kwargs)
+        self.causes = {}
+        if self.judge is not None:
+            meta = TSVDataset(dataset_name).data
+            self.causes = {i: c for i, c in zip(meta['index'], meta['causes']) if pd.notna(c)}
+        self.done = load_checkpoint(cause_checkpoint(eval_file))
+        self.dedup = JudgeDedup()
+        self.ckpt = CheckpointJournal(cause_checkpoint(eval_file))
+
+    def process(self, index, prediction):
+        from .multi_step_liability import parse_prediction
+        if index not in self.causes:
+            return
+        pred = parse_prediction(prediction)[4]
+        if pd.notna(pred) and (self.causes[index], pred) not in self.done:
+            self.submit(self.judge_pair, self.causes[index], pred)
+
+    def judge_pair(self, gt, pred):
+        from .multi_step_liability import assess_cause_consistency
+        key = (canonical_prompt(str(gt)), canonical_prompt(str(pred)))
+        res = self.dedup.share(
+            key, lambda: assess_cause_consistency(self.judge, gt, pred), keep=lambda x: x != 'error')
+        if res != 'error':
+            with self._lock:
+                self.ckpt.append((gt, pred), res)
+
+    def close(self):
+        self.ckpt.close()
+
+
+def build_stream(eval_file, dataset_name, custom_flag=False, **judge_kwargs):
+    """The ``StreamEvaluator`` of ``dataset_name``, see ``evaluate_result`` for the batch evaluators."""
+    stream_cls = StreamEvaluator
+    if not custom_flag:
+        dataset_type = DATASET_TYPE(dataset_name)
+        if dataset_type == 'multi-choice' and not listinstr(['MMMU'], dataset_name):
+            stream_cls = MultipleChoiceStream
+        elif dataset_type == 'Y/N':
+            stream_cls = YOrNStream
+        elif dataset_type == 'multi_step_liability':
+            stream_cls = LiabilityStream
+    return stream_cls(eval_file, dataset_name, custom_flag=custom_flag, **judge_kwargs)
@@ -2,176 +2,178 @@
 # Partly adopted from https://github.com/GT-Vision-Lab/VQA
 # Copyright (c) 2014, Aishwarya Agrawal
 
+import atexit
 import re
 from vlmeval.smp import *
 
+PUNCT = [
+    ';', r'/', '[', ']', '"', '{', '}', '(', ')', '=', '+', '\\', '_', '-',
+    '>', '<', '@', '`', ',', '?', '!'
+]
+_punct_set = set(PUNCT)
+_punct_delete = str.maketrans('', '', ''.join(PUNCT))
+COMMA_STRIP = re.compile('(\d)(,)(\d)')  # noqa: W605
+PERIOD_STRIP = re.compile('(?!<=\d)(\.)(?!\d)')  # noqa: W605
+# The reference implementation passes `re.UNICODE` as the `count` of `periodStrip.sub`, so that at most
+# 32 periods are stripped. Kept for score parity.
+PERIOD_STRIP_COUNT = int(re.UNICODE)
+
+ARTICLES = {'a', 'an', 'the'}
+MANUAL_MAP = {
+    'none': '0',
+    'zero': '0',
+    'one': '1',
+    'two': '2',
+    'three': '3',
+    'four': '4',
+    'five': '5',
+    'six': '6',
+    'seven': '7',
+    'eight': '8',
+    'nine': '9',
+    'ten': '10',
+}
+CONTRACTIONS = {
+    'aint': "ain't",
+    'arent': "aren't",
+    'cant': "can't",
+    'couldve': "could've",
+    'couldnt': "couldn't",
+    "couldn'tve": "couldn't've",
+    "couldnt've": "couldn't've",
+    'didnt': "didn't",
+    'doesnt': "doesn't",
+    'dont': "don't",
+    'hadnt': "hadn't",
+    "hadnt've": "hadn't've",
+    "hadn'tve": "hadn't've",
+    'hasnt': "hasn't",
+    'havent': "haven't",
+    'hed': "he'd",
+    "hed've": "he'd've",
+    "he'dve": "he'd've",
+    'hes': "he's",
+    'howd': "how'd",
+    'howll': "how'll",
+    'hows': "how's",
+    "Id've": "I'd've",
+    "I'dve": "I'd've",
+    'Im': "I'm",
+    'Ive': "I've",
+    'isnt': "isn't",
+    'itd': "it'd",
+    "itd've": "it'd've",
+    "it'dve": "it'd've",
+    'itll': "it'll",
+    "let's": "let's",
+    'maam': "ma'am",
+    'mightnt': "mightn't",
+    "mightnt've": "mightn't've",
+    "mightn'tve": "mightn't've",
+    'mightve': "might've",
+    'mustnt': "mustn't",
+    'mustve': "must've",
+    'neednt': "needn't",
+    'notve': "not've",
+    'oclock': "o'clock",
+    'oughtnt': "oughtn't",
+    "ow's'at": "'ow's'at",
+    "'ows'at": "'ow's'at",
+    "'ow'sat": "'ow's'at",
+    'shant': "shan't",
+    "shed've": "she'd've",
+    "she'dve": "she'd've",
+    "she's": "she's",
+    'shouldve': "should've",
+    'shouldnt': "shouldn't",
+    "shouldnt've": "shouldn't've",
+    "shouldn'tve": "shouldn't've",
+    "somebody'd": 'somebodyd',
+    "somebodyd've": "somebody'd've",
+    "somebody'dve": "somebody'd've",
+    'somebodyll': "somebody'll",
+    'somebodys': "somebody's",
+    'someoned': "someone'd",
+    "someoned've": "someone'd've",
+    "someone'dve": "someone'd've",
+    'someonell': "someone'll",
+    'someones': "someone's",
+    'somethingd': "something'd",
+    "somethingd've": "something'd've",
+    "something'dve": "something'd've",
+    'somethingll': "something'll",
+    'thats': "that's",
+    'thered': "there'd",
+    "thered've": "there'd've",
+    "there'dve": "there'd've",
+    'therere': "there're",
+    'theres': "there's",
+    'theyd': "they'd",
+    "theyd've": "they'd've",
+    "they'dve": "they'd've",
+    'theyll': "they'll",
+    'theyre': "they're",
+    'theyve': "they've",
+    'twas': "'twas",
+    'wasnt': "wasn't",
+    "wed've": "we'd've",
+    "we'dve": "we'd've",
+    'weve': "we've",
+    'werent': "weren't",
+    'whatll': "what'll",
+    'whatre': "what're",
+    'whats': "what's",
+    'whatve': "what've",
+    'whens': "when's",
+    'whered': "where'd",
+    'wheres': "where's",
+    'whereve': "where've",
+    'whod': "who'd",
+    "whod've": "who'd've",
+    "who'dve": "who'd've",
+    'wholl': "who'll",
+    'whos': "who's",
+    'whove': "who've",
+    'whyll': "why'll",
+    'whyre': "why're",
+    'whys': "why's",
+    'wont': "won't",
+    'wouldve': "would've",
+    'wouldnt': "wouldn't",
+    "wouldnt've": "wouldn't've",
+    "wouldn'tve": "wouldn't've",
+    'yall': "y'all",
+    "yall'll": "y'all'll",
+    "y'allll": "y'all'll",
+    "yall'd've": "y'all'd've",
+    "y'alld've": "y'all'd've",
+    "y'all'dve": "y'all'd've",
+    'youd': "you'd",
+    "youd've": "you'd've",
+    "you'dve": "you'd've",
+    'youll': "you'll",
+    'youre': "you're",
+    'youve': "you've",
+}
+
+
 def _process_punctuation(inText):
-    outText = inText
-    punct = [
-        ';', r'/', '[', ']', '"', '{', '}', '(', ')', '=', '+', '\\', '_', '-',
-        '>', '<', '@', '`', ',', '?', '!'
-    ]
-    commaStrip = re.compile('(\d)(,)(\d)')  # noqa: W605
-    periodStrip = re.compile('(?!<=\d)(\.)(?!\d)')  # noqa: W605
-    for p in punct:
-        if (p + ' ' in inText or ' ' + p in inText) or (re.search(
-                commaStrip, inText) is not None):
-            outText = outText.replace(p, '')
-        else:
-            outText = outText.replace(p, ' ')
-    outText = periodStrip.sub('', outText, re.UNICODE)
-    return outText
+    present = _punct_set.intersection(inText)
+    if not len(present):
+        outText = inText
+    elif COMMA_STRIP.search(inText) is not None:
+        outText = inText.translate(_punct_delete)
+    else:
+        # A punctuation next to a space is removed, otherwise it is replaced with a space
+        table = {ord(p): ('' if (p + ' ' in inText or ' ' + p in inText) else ' ') for p in present}
+        outText = inText.translate(table)
+    return PERIOD_STRIP.sub('', outText, count=PERIOD_STRIP_COUNT)
 
 
 def _process_digit_article(inText):
-    outText = []
-    tempText = inText.lower().split()
-    articles = ['a', 'an', 'the']
-    manualMap = {
-        'none': '0',
-        'zero': '0',
-        'one': '1',
-        'two': '2',
-        'three': '3',
-        'four': '4',
-        'five': '5',
-        'six': '6',
-        'seven': '7',
-        'eight': '8',
-        'nine': '9',
-        'ten': '10',
-    }
-    contractions = {
-        'aint': "ain't",
-        'arent': "aren't",
-        'cant': "can't",
-        'couldve': "could've",
-        'couldnt': "couldn't",
-        "couldn'tve": "couldn't've",
-        "couldnt've": "couldn't've",
-        'didnt': "didn't",
-        'doesnt': "doesn't",
-        'dont': "don't",
-        'hadnt': "hadn't",
-        "hadnt've": "hadn't've",
-        "hadn'tve": "hadn't've",
-        'hasnt': "hasn't",
-        'havent': "haven't",
-        'hed': "he'd",
-        "hed've": "he'd've",
-        "he'dve": "he'd've",
-        'hes': "he's",
-        'howd': "how'd",
-        'howll': "how'll",
-        'hows': "how's",
-        "Id've": "I'd've",
-        "I'dve": "I'd've",
-        'Im': "I'm",
-        'Ive': "I've",
-        'isnt': "isn't",
-        'itd': "it'd",
-        "itd've": "it'd've",
-        "it'dve": "it'd've",
-        'itll': "it'll",
-        "let's": "let's",
-        'maam': "ma'am",
-        'mightnt': "mightn't",
-        "mightnt've": "mightn't've",
-        "mightn'tve": "mightn't've",
-        'mightve': "might've",
-        'mustnt': "mustn't",
-        'mustve': "must've",
-        'neednt': "needn't",
-        'notve': "not've",
-        'oclock': "o'clock",
-        'oughtnt': "oughtn't",
-        "ow's'at": "'ow's'at",
-        "'ows'at": "'ow's'at",
-        "'ow'sat": "'ow's'at",
-        'shant': "shan't",
-        "shed've": "she'd've",
-        "she'dve": "she'd've",
-        "she's": "she's",
-        'shouldve': "should've",
-        'shouldnt': "shouldn't",
-        "shouldnt've": "shouldn't've",
-        "shouldn'tve": "shouldn't've",
-        "somebody'd": 'somebodyd',
-        "somebodyd've": "somebody'd've",
-        "somebody'dve": "somebody'd've",
-        'somebodyll': "somebody'll",
-        'somebodys': "somebody's",
-        'someoned': "someone'd",
-        "someoned've": "someone'd've",
-        "someone'dve": "someone'd've",
-        'someonell': "someone'll",
-        'someones': "someone's",
-        'somethingd': "something'd",
-        "somethingd've": "something'd've",
-        "something'dve": "something'd've",
-        'somethingll': "something'll",
-        'thats': "that's",
-        'thered': "there'd",
-        "thered've": "there'd've",
-        "there'dve": "there'd've",
-        'therere': "there're",
-        'theres': "there's",
-        'theyd': "they'd",
-        "theyd've": "they'd've",
-        "they'dve": "they'd've",
-        'theyll': "they'll",
-        'theyre': "they're",
-        'theyve': "they've",
-        'twas': "'twas",
-        'wasnt': "wasn't",
-        "wed've": "we'd've",
-        "we'dve": "we'd've",
-        'weve': "we've",
-        'werent': "weren't",
-        'whatll': "what'll",
-        'whatre': "what're",
-        'whats': "what's",
-        'whatve': "what've",
-        'whens': "when's",
-        'whered': "where'd",
-        'wheres': "where's",
-        'whereve': "where've",
-        'whod': "who'd",
-        "whod've": "who'd've",
-        "who'dve": "who'd've",
-        'wholl': "who'll",
-        'whos': "who's",
-        'whove': "who've",
-        'whyll': "why'll",
-        'whyre': "why're",
-        'whys': "why's",
-        'wont': "won't",
-        'wouldve': "would've",
-        'wouldnt': "wouldn't",
-        "wouldnt've": "wouldn't've",
-        "wouldn'tve": "wouldn't've",
-        'yall': "y'all",
-        "yall'll": "y'all'll",
-        "y'allll": "y'all'll",
-        "yall'd've": "y'all'd've",
-        "y'alld've": "y'all'd've",
-        "y'all'dve": "y'all'd've",
-        'youd': "you'd",
-        "youd've": "you'd've",
-        "you'dve": "you'd've",
-        'youll': "you'll",
-        'youre': "you're",
-        'youve': "you've",
-    }
-    for word in tempText:
-        word = manualMap.setdefault(word, word)
-        if word not in articles:
-            outText.append(word)
-    for wordId, word in enumerate(outText):
-        if word in contractions:
-            outText[wordId] = contractions[word]
-    outText = ' '.join(outText)
-    return outText
+    outText = [MANUAL_MAP.get(word, word) for word in inText.lower().split()]
+    outText = [CONTRACTIONS.get(word, word) for word in outText if word not in ARTICLES]
+    return ' '.join(outText)
 
 
 def process_answer(answer):
@@ -183,6 +185,48 @@ def process_answer(answer):
     return answer
 
 
+def normalize_answers(answers):
+    """`process_answer` over a list of answers, each distinct answer is normalized once."""
+    memo = {}
+    for x in answers:
+        if x not in memo:
+            memo[x] = process_answer(x)
+    return [memo[x] for x in answers]
+
+
+# The process pool shared by all `VQAEval` calls of the process, created on first use
+_pool = None
+
+
+def _close_pool():
+    global _pool
+    if _pool is not None:
+        _pool.close()
+        _pool.join()
+        _pool = None
+
+
+def get_pool(nproc=16):
+    global _pool
+    if _pool is None:
+        _pool = mp.Pool(nproc)
+        atexit.register(_close_pool)
+    return _pool
+
+
+def normalize_answers_parallel(answers, nproc=16, min_size=50000):
+    """`normalize_answers` on the shared pool. Only the distinct answer strings are sent to the workers,
+    in one chunk per worker. Lists smaller than `min_size` are normalized in-process."""
+    uniq = list(dict.fromkeys(answers))
+    if nproc <= 1 or len(uniq) < min_size:
+        return normalize_answers(answers)
+    chunks = [uniq[i::nproc] for i in range(nproc)]
+    memo = {}
+    for chunk, res in zip(chunks, get_pool(nproc).map(normalize_answers, chunks)):
+        memo.update(zip(chunk, res))
+    return [memo[x] for x in answers]
+
+
 def process_line(line):
     ret = {}
     if istype(line['answer'], list):
@@ -194,33 +238,28 @@ def process_line(line):
     ret['match'] = [x == ret['pred'] for x in ret['gt']]
     return ret
         
-def VQAEval(eval_file, full_score_weight=0.3, **kwargs):
+def VQAEval(eval_file, full_score_weight=0.3, nproc=16, **kwargs):
     logger = get_logger('Evaluation')
     data = load(eval_file)
     assert 'answer' in data and 'prediction' in data
     data['prediction'] = [str(x) for x in data['prediction']]
     data['answer'] = [str(x) for x in data['answer']]
-    lt = len(data)
-    pool = mp.Pool(16)
-    lines = [data.iloc[i] for i in range(lt)]
-    res = pool.map(process_line, lines)
-    hit = [np.mean(x['match']) >= full_score_weight for x in res]
+    answers = [eval(x) if istype(x, list) else [x] for x in data['answer']]
+    lens = [len(x) for x in answers]
+    normed = normalize_answers_parallel([x for ans in answers for x in ans] + list(data['prediction']), nproc)
+    gts, preds = normed[:sum(lens)], normed[sum(lens):]
+    offsets = np.cumsum([0] + lens)
+    data['hit'] = [
+        np.mean([x == pred for x in gts[st: ed]]) >= full_score_weight
+        for st, ed, pred in zip(offsets[:-1], offsets[1:], preds)]
+
     ret = dict()
     if 'split' in data:
-        splits = set(data['split'])
-        for sp in splits:
-            sub = [r for l, r in zip(lines, res) if l['split'] == sp]
-            hit = [np.mean(x['match']) >= full_score_weight for x in sub]
-            ret[sp] = np.mean(hit) * 100
+        ret.update((data.groupby('split')['hit'].mean() * 100).to_dict())
     else:
-        ret['Overall'] = np.mean(hit) * 100
+        ret['Overall'] = np.mean(data['hit']) * 100
         if 'category' in data:
-            cates = list(set(data['category']))
-            cates.sort()
-            for c in cates:
-                sub = [r for l, r in zip(lines, res) if l['category'] == c]
-                hit = [np.mean(x['match']) >= full_score_weight for x in sub]
-                ret[c] = np.mean(hit) * 100
+            ret.update((data.groupby('category')['hit'].mean() * 100).to_dict())
     ret = d2df(ret)
     ret.round(2)
 
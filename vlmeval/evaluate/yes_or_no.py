@@ -1,35 +1,23 @@
 from vlmeval.evaluate.misc import build_judge
+from vlmeval.evaluate.dedup import canonical_prompt, group_duplicates, log_dedup_stats
+from vlmeval.evaluate.incremental import prediction_hash
+from vlmeval.evaluate.aggregate import group_sums, group_means, group_heads, rollup, ratio
 from vlmeval.smp import *
-from vlmeval.utils import track_progress_rich
+from vlmeval.utils import track_progress_rich, load_checkpoint
 
 INTERNAL = os.environ.get('INTERNAL', 0)
 
 def MME_rating(data_file):
     data = load(data_file)
-    stats = defaultdict(dict)
-    lt = len(data)
-    for i in range(lt):
-        item = data.iloc[i]
-        category = item['category']
-        image_path = item['image_path']
-        score = item['score']
-        if image_path not in stats[category]:
-            stats[category][image_path] = []
-        stats[category][image_path].append(score)
-    
-    def acc(key, mode='normal'):
-        res = stats[key]
-        values = []
-        for val in res.values():
-            if mode == 'normal':
-                values.extend(val)
-            elif mode == 'plus':
-                values.append(val[0] * val[1])
-        return np.mean(values) * 100
-            
+    # The questions of an image come in pairs, `plus` requires both of them to be right
+    images, pairs = group_heads(data, ['category', 'image_path'], 'score', 2)
+    images['plus'] = pairs[:, 0] * pairs[:, 1]
+    normal = group_means(group_sums(data, ['category'], ['score']), ['category'], 'score')
+    plus = group_means(group_sums(images, ['category'], ['plus']), ['category'], 'plus')
+
     scores = {}
-    for k in stats:
-        scores[k] = acc(k) + acc(k, 'plus')
+    for k in normal.index:
+        scores[k] = normal[k] * 100 + plus[k] * 100
 
     super_cates = dict(
         perception=['OCR', 'artwork', 'celebrity', 'color', 'count', 'existence', 'landmark', 'position', 'posters', 'scene'],
@@ -47,74 +35,49 @@ def MME_rating(data_file):
     return ret
 
 def Hallusion_rating(data_file):
-    def calc_fAcc(data):
-        res = defaultdict(list)
-        lt = len(data)
-        for i in range(lt):
-            line = data.iloc[i]
-            res[f"{line['l2-category']}_{line['set_id']}_{line['figure_id']}"].append(line['score'])
-        return np.mean([np.all(x) for x in res.values()]) * 100
-    
-    def calc_qAcc(data):
-        res = defaultdict(list)
-        lt = len(data)
-        for i in range(lt):
-            line = data.iloc[i]
-            res[f"{line['l2-category']}_{line['set_id']}_{line['question_id']}"].append(line['score'])
-        return np.mean([np.all(x) for x in res.values()]) * 100
-    
-    def calc_aAcc(data):
-        return np.mean(data['score']) * 100
+    def calc_acc(table, keys):
+        # The share of the groups of `keys` whose questions are all right
+        groups = rollup(table, keys, ['right'])
+        return np.mean(groups['right'] == groups['count']) * 100
+
+    def calc_rating(table):
+        aAcc = ratio(table['score'].sum(), table['count'].sum()) * 100
+        fAcc = calc_acc(table, ['l2-category', 'set_id', 'figure_id'])
+        qAcc = calc_acc(table, ['l2-category', 'set_id', 'question_id'])
+        return aAcc, fAcc, qAcc
         
     data = load(data_file)
     data['set_id'] = [x.split('_')[3] for x in data['index']]
     data['figure_id'] = [x.split('_')[4] for x in data['index']]
     data['question_id'] = [x.split('_')[5] for x in data['index']]
+    data['right'] = data['score'] != 0
+    keys = [k for k in ['category', 'l2-category'] if k in data] + ['set_id', 'figure_id', 'question_id']
+    table = group_sums(data, keys, ['score', 'right'])
 
     res = dict(split=[], aAcc=[], fAcc=[], qAcc=[])
-    res['split'].append('Overall')
-    res['aAcc'].append(calc_aAcc(data))
-    res['fAcc'].append(calc_fAcc(data))
-    res['qAcc'].append(calc_qAcc(data))
-    
-    if 'category' in data:
-        cates = list(set(data['category']))
-        for c in cates:
-            sub = data[data['category'] == c]
-            res['split'].append(c)
-            res['aAcc'].append(calc_aAcc(sub))
-            res['fAcc'].append(calc_fAcc(sub))
-            res['qAcc'].append(calc_qAcc(sub))
-
-    if 'l2-category' in data:
-        cates = list(set(data['l2-category']))
-        for c in cates:
-            sub = data[data['l2-category'] == c]
-            res['split'].append(c)
-            res['aAcc'].append(calc_aAcc(sub))
-            res['fAcc'].append(calc_fAcc(sub))
-            res['qAcc'].append(calc_qAcc(sub))
+    subsets = [('Overall', table)]
+    for group in ['category', 'l2-category']:
+        if group in data:
+            subsets.extend((c, table[table[group] == c]) for c in list(set(data[group].unique())))
+    for name, sub in subsets:
+        res['split'].append(name)
+        for k, v in zip(['aAcc', 'fAcc', 'qAcc'], calc_rating(sub)):
+            res[k].append(v)
     ret = pd.DataFrame(res)
     return ret
 
 def default_rating(data_file):
     data = load(data_file)
+    keys = [k for k in ['category', 'l2-category'] if k in data]
+    table = group_sums(data, keys, ['score'])
     res = {}
-    res['Overall'] = np.mean(data['score']) * 100
-    if 'category' in data:
-        cates = list(set(data['category']))
-        cates = [c for c in cates if not pd.isna(c)]
-        cates.sort()
-        for c in cates:
-            sub = data[data['category'] == c]
-            res[c] = np.mean(sub['score']) * 100
-    if 'l2-category' in data:
-        cates = list(set(data['l2-category']))
-        cates = [c for c in cates if not pd.isna(c)]
+    res['Overall'] = group_means(table, [], 'score') * 100
+    for k in keys:
+        acc = group_means(table, [k], 'score')
+        cates = [c for c in acc.index if not pd.isna(c)]
         cates.sort()
         for c in cates:
-            sub = data[data['l2-category'] == c]
-            res[c] = np.mean(sub['score']) * 100
+            res[c] = acc[c] * 100
     ret = d2df(res)
     return ret
         
@@ -156,19 +119,31 @@ def YOrN_eval(eval_file, model='chatgpt-0613', nproc=4, verbose=False, dataset=N
     logger = get_logger('Evaluation')
     data = load(eval_file)
     data['prediction'] = [str(x) for x in data['prediction']]
-    storage = eval_file.replace('.xlsx', '_auxmatch.xlsx')
-    tmp_file = eval_file.replace('.xlsx', '_tmp.pkl')
-
-    if not osp.exists(storage):
-        ans_map = {k: YOrN_Extraction(v) for k, v in zip(data['index'], data['prediction'])}
-        if osp.exists(tmp_file):
-            tmp = load(tmp_file)
-            for k in tmp:
-                if ans_map[k] == 'Unknown' and tmp[k] != 'Unknown':
-                    ans_map[k] = tmp[k]
+    suffix = eval_file.split('.')[-1]
+    storage = eval_file.replace(f'.{suffix}', f'_auxmatch.{suffix}')
+    tmp_file = eval_file.replace(f'.{suffix}', '_tmp.pkl')
+
+    # Rows whose prediction did not change since the last evaluation keep their extracted answer
+    prev = {}
+    if osp.exists(storage):
+        stored = load(storage)
+        prev = {k: (str(p), e) for k, p, e in zip(stored['index'], stored['prediction'], stored['extracted'])}
+    changed = set(k for k, p in zip(data['index'], data['prediction']) if k not in prev or prev[k][0] != p)
+    if len(prev):
+        logger.info(f'Reusing {len(data) - len(changed)} rows of {storage}, {len(changed)} rows to be evaluated. ')
+
+    if len(changed):
+        ans_map = {
+            k: YOrN_Extraction(v) if k in changed else prev[k][1] for k, v in zip(data['index'], data['prediction'])}
+        # The judge answers are checkpointed by (index, prediction hash)
+        hashes = {k: prediction_hash(v) for k, v in zip(data['index'], data['prediction']) if k in changed}
+        tmp = load_checkpoint(tmp_file)
+        for k, h in hashes.items():
+            if ans_map[k] == 'Unknown' and tmp.get((k, h), 'Unknown') != 'Unknown':
+                ans_map[k] = tmp[(k, h)]
 
         data['extracted'] = [ans_map[x] for x in data['index']]
-        unknown = data[data['extracted'] == 'Unknown']
+        unknown = data[(data['extracted'] == 'Unknown') & data['index'].isin(changed)]
     
         model_name = 'chatgpt-0613'
 
@@ -181,17 +156,31 @@ def YOrN_eval(eval_file, model='chatgpt-0613', nproc=4, verbose=False, dataset=N
         if model is not None:
             lt = len(unknown)
             lines = [unknown.iloc[i] for i in range(lt)]
-            tups = [(model, line) for line in lines]
-            indices = list(unknown['index'])
+            keys = [(k, hashes[k]) for k in unknown['index']]
+            tmp = load_checkpoint(tmp_file)
+            # Rows with the same (canonical) judge prompt, e.g. the same answer to the same question, are
+            # judged once, by their first row
+            groups = group_duplicates([canonical_prompt(YOrN_match_prompt(line)) for line in lines])
+            todo = []
+            for pos in groups.values():
+                done = [tmp[keys[p]] for p in pos if tmp.get(keys[p], 'Unknown') != 'Unknown']
+                if len(done):
+                    for p in pos:
+                        ans_map[keys[p][0]] = done[0]
+                else:
+                    todo.append(pos)
+            tups = [(model, lines[pos[0]]) for pos in todo]
             if len(tups):
-                res = track_progress_rich(YOrN_auxeval, tups, nproc=nproc, chunksize=nproc, keys=indices, save=tmp_file)
-                for k, v in zip(indices, res):
-                    ans_map[k] = v
+                res = track_progress_rich(
+                    YOrN_auxeval, tups, nproc=nproc, chunksize=nproc, keys=[keys[pos[0]] for pos in todo],
+                    save=tmp_file)
+                for pos, v in zip(todo, res):
+                    for p in pos:
+                        ans_map[keys[p][0]] = v
+            log_dedup_stats(f'YOrN_eval of {eval_file}', len(todo), lt - len(groups))
 
         data['extracted'] = [ans_map[x] for x in data['index']]
         dump(data, storage)
-    else:
-        logger.warning(f"GPT matching file {storage} already exists, will reuse it in YOrN_eval. ")
     
     data = load(storage)
     data["score"] = (data["answer"] == data["extracted"])
@@ -204,7 +193,7 @@ def YOrN_eval(eval_file, model='chatgpt-0613', nproc=4, verbose=False, dataset=N
     else:
         score = default_rating(storage)
 
-    score_tgt = eval_file.replace('.xlsx', '_score.csv')
+    score_tgt = eval_file.replace(f'.{suffix}', '_score.csv')
     dump(score, score_tgt)
 
     logger.info(f'YOrN_eval successfully finished evaluating {eval_file}, results saved in {score_tgt}')
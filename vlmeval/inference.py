@@ -1,8 +1,9 @@
-import torch 
-import torch.distributed as dist
 import datetime
 from vlmeval.config import supported_VLM
-from vlmeval.utils import TSVDataset, track_progress_rich, split_MMMU
+from vlmeval.utils import TSVDataset, track_progress_rich, track_progress_async, load_checkpoint, split_MMMU
+from vlmeval.utils.work_queue import WorkQueue
+from vlmeval.utils.checkpoint import ResultWriter, iter_results, load_results
+from vlmeval.utils.scheduler import schedule
 from vlmeval.smp import *
 
 FAIL_MSG = 'Failed to obtain answer via API.'
@@ -12,34 +13,56 @@ def parse_args():
     parser.add_argument('--data', type=str, nargs='+', required=True)
     parser.add_argument("--model", type=str, nargs='+', required=True)
     parser.add_argument("--nproc", type=int, default=4, required=True)
+    parser.add_argument("--engine", type=str, default='mp', choices=['mp', 'async'])
+    parser.add_argument("--shard", type=str, default='static', choices=['static', 'dynamic'])
     parser.add_argument("--verbose", action='store_true')
     args = parser.parse_args()
     return args
 
+# The asyncio variant of gen_func (e.g. `agenerate` for `generate`), None if the model does not implement one
+def async_gen_func(model, gen_func):
+    from vlmeval.api.base import BaseAPI
+    name = 'a' + gen_func.__name__
+    if not hasattr(model, name):
+        return None
+    # BaseAPI.agenerate takes raw inputs, it is not the VLM interface
+    if getattr(type(model), name) is getattr(BaseAPI, name, None):
+        return None
+    return getattr(model, name)
+
+# The model instance of model_name, with the per-run overrides of model_kwargs (see `ModelRegistry.build`)
+def build_model(model_name, model_kwargs=None):
+    return supported_VLM.build(model_name, **(model_kwargs or {}))
+
 # Only API model is accepted
-def infer_data_api(model_name, dataset_name, index_set, api_nproc=4):
+# Predictions are fed to `stream` (a `StreamEvaluator`) as soon as they are produced
+def infer_data_api(model_name, dataset_name, index_set, api_nproc=4, engine='mp', model_kwargs=None, stream=None):
     rank, world_size = get_rank_and_world_size()   
     assert rank == 0 and world_size == 1
     dataset = TSVDataset(dataset_name)
     data = dataset.data
     data = data[data['index'].isin(index_set)]
 
-    model = supported_VLM[model_name]() if isinstance(model_name, str) else model_name
+    model = build_model(model_name, model_kwargs) if isinstance(model_name, str) else model_name
     is_api = getattr(model, 'is_api', False)
     assert is_api
     
+    out_file = f'{model_name}/{model_name}_{dataset_name}_supp.pkl'
+    # The snapshot may not exist yet while the journal does (interrupted before the first compaction)
+    res = load_checkpoint(out_file)
+    res = {k: v for k, v in res.items() if FAIL_MSG not in v}
+    callback = None
+    if stream is not None:
+        for k, v in res.items():
+            stream.feed(k, v)
+        callback = stream.feed
+
+    data = data[~data['index'].isin(res)]
+    # Longest requests first, results are still collected by index
+    data = data.iloc[[b[0] for b in schedule(data)]]
     lt, indices = len(data), list(data['index'])
     structs = [dataset.build_prompt(data.iloc[i]) for i in range(lt)]
     
-    out_file = f'{model_name}/{model_name}_{dataset_name}_supp.pkl'
-    res = {}
-    if osp.exists(out_file):
-        res = load(out_file)
-        res = {k: v for k, v in res.items() if FAIL_MSG not in v}
-    
-    structs = [s for i, s in zip(indices, structs) if i not in res]
-    indices = [i for i in indices if i not in res]
-    
     gen_func = None
     if listinstr(['MMMU'], dataset_name):
         assert hasattr(model, 'interleave_generate')
@@ -53,8 +76,17 @@ def infer_data_api(model_name, dataset_name, index_set, api_nproc=4):
         gen_func = model.generate
         structs = [dict(image_path=struct['image'], prompt=struct['text'], dataset=dataset_name) for struct in structs]
 
-    inference_results = track_progress_rich(
-        gen_func, structs, nproc=api_nproc, chunksize=api_nproc, save=out_file, keys=indices)
+    if engine == 'async':
+        # api_nproc bounds the number of in-flight requests
+        afunc = async_gen_func(model, gen_func)
+        inference_results = track_progress_async(
+            afunc if afunc is not None else gen_func, structs, concurrency=api_nproc, save=out_file, keys=indices,
+            callback=callback)
+        from vlmeval.api import http_pool_stats
+        get_logger('Inference').info(f'HTTP connection reuse: {http_pool_stats()}')
+    else:
+        inference_results = track_progress_rich(
+            gen_func, structs, nproc=api_nproc, chunksize=api_nproc, save=out_file, keys=indices, callback=callback)
     
     res = load(out_file)
     for idx, text in zip(indices, inference_results):
@@ -62,18 +94,92 @@ def infer_data_api(model_name, dataset_name, index_set, api_nproc=4):
         res[idx] = text
     return res
 
-def infer_data(model_name, dataset_name, out_file, verbose=False, api_nproc=4):
-    res = {}
-    if osp.exists(out_file):
-        res = load(out_file)
+def build_struct(model, dataset, line, dataset_name):
+    if hasattr(model, 'use_custom_prompt') and model.use_custom_prompt(dataset_name):
+        return model.build_prompt(line, dataset=dataset_name)
+    return dataset.build_prompt(line)
+
+def infer_item(model, dataset, line, dataset_name):
+    struct = build_struct(model, dataset, line, dataset_name)
+
+    if dataset_name in ['CORE_MM']:
+        assert hasattr(model, 'multi_generate')
+        response = model.multi_generate(prompt=struct['text'], image_paths=struct['image'], dataset=dataset_name)
+    elif listinstr(['MMMU'], dataset_name):
+        if hasattr(model, 'interleave_generate'):
+            response = model.interleave_generate(ti_list=split_MMMU(struct), dataset=dataset_name)
+        elif len(struct['image']) == 1:
+            response = model.generate(prompt=struct['text'], image_path=struct['image'][0], dataset=dataset_name)
+        else:
+            response = '[MMMU] Failed, multiple images exist while the model only support single-image generate API. '
+    else:
+        response = model.generate(prompt=struct['text'], image_path=struct['image'], dataset=dataset_name)
+    return response
+
+# Models implementing `batch_generate(structs, dataset)` are fed `model.batch_size` single-image samples at once
+def batch_size_of(model, dataset_name):
+    if not hasattr(model, 'batch_generate') or dataset_name in ['CORE_MM'] or listinstr(['MMMU'], dataset_name):
+        return 1
+    return getattr(model, 'batch_size', 1)
+
+def infer_batch(model, dataset, lines, dataset_name):
+    if len(lines) == 1:
+        return [infer_item(model, dataset, lines[0], dataset_name)]
+    structs = [build_struct(model, dataset, line, dataset_name) for line in lines]
+    responses = model.batch_generate(structs, dataset=dataset_name)
+    assert len(responses) == len(structs)
+    return responses
+
+# Local models only, the ranks pull chunks of positions from `queue` (see `WorkQueue`)
+def infer_data_dynamic(model_name, dataset, dataset_name, writer, queue, res, verbose=False, model_kwargs=None,
+                       stream=None):
+    rank, _ = get_rank_and_world_size()
+    model = model_name if not isinstance(model_name, str) else None
+    for cid, positions in queue.iter_chunks(rank):
+        if model is None:
+            model = build_model(model_name, model_kwargs)
+        data = dataset.data.iloc[positions]
+        data = data[~data['index'].isin(res)]
+        batch_size = batch_size_of(model, dataset_name)
+        for batch in schedule(data, batch_size, getattr(model, 'max_batch_tokens', None)):
+            # The chunk was re-dispatched and finished by another rank
+            if queue.is_done(cid):
+                break
+            lines = [data.iloc[i] for i in batch]
+            responses = infer_batch(model, dataset, lines, dataset_name)
+            empty_cache()
+            for line, response in zip(lines, responses):
+                if verbose:
+                    print(response, flush=True)
+                res[line['index']] = response
+                writer.write(line['index'], response)
+                if stream is not None:
+                    stream.feed(line['index'], response)
+        queue.finish(cid, rank)
+
+    return model_name if model is None else model
+
+def infer_data(model_name, dataset_name, out_file, verbose=False, api_nproc=4, engine='mp', queue=None,
+               model_kwargs=None, stream=None):
+    # Responses are appended to out_file as soon as they are produced (see `ResultWriter`)
+    res = load_results(out_file)
+    if stream is not None:
+        for k, v in res.items():
+            stream.feed(k, v)
 
     rank, world_size = get_rank_and_world_size()   
     if rank == 0:
         dataset = TSVDataset(dataset_name)
     if world_size > 1:
-        dist.barrier()
+        barrier()
     dataset = TSVDataset(dataset_name)
 
+    if queue is not None:
+        with ResultWriter(out_file) as writer:
+            return infer_data_dynamic(
+                model_name, dataset, dataset_name, writer, queue, res, verbose=verbose, model_kwargs=model_kwargs,
+                stream=stream)
+
     indices = list(range(rank, len(dataset), world_size))
     lt = len(indices)
     data = dataset.data.iloc[indices]
@@ -89,71 +195,59 @@ def infer_data(model_name, dataset_name, out_file, verbose=False, api_nproc=4):
     data = data[~data['index'].isin(res)]
     lt = len(data)
 
-    model = supported_VLM[model_name]() if isinstance(model_name, str) else model_name
+    model = build_model(model_name, model_kwargs) if isinstance(model_name, str) else model_name
 
     is_api = getattr(model, 'is_api', False)
     if is_api:
         assert world_size == 1
         lt, indices = len(data), list(data['index'])
-        supp = infer_data_api(model_name=model_name, dataset_name=dataset_name, index_set=set(indices), api_nproc=api_nproc)
-        for idx in indices:
-            assert idx in supp
-        res.update(supp)
-        dump(res, out_file)
+        supp = infer_data_api(
+            model_name=model_name, dataset_name=dataset_name, index_set=set(indices), api_nproc=api_nproc,
+            engine=engine, model_kwargs=model_kwargs, stream=stream)
+        with ResultWriter(out_file) as writer:
+            for idx in indices:
+                assert idx in supp
+                writer.write(idx, supp[idx])
         return model_name
 
-    for i in tqdm(range(lt)):
-        idx = data.iloc[i]['index']
-        if idx in res:
-            continue
-
-        if hasattr(model, 'use_custom_prompt') and model.use_custom_prompt(dataset_name):
-            struct = model.build_prompt(data.iloc[i], dataset=dataset_name)
-        else:
-            struct = dataset.build_prompt(data.iloc[i])
-
-        if dataset_name in ['CORE_MM']:
-            assert hasattr(model, 'multi_generate')
-            response = model.multi_generate(prompt=struct['text'], image_paths=struct['image'], dataset=dataset_name)
-        elif listinstr(['MMMU'], dataset_name):
-            if hasattr(model, 'interleave_generate'):
-                response = model.interleave_generate(ti_list=split_MMMU(struct), dataset=dataset_name)
-            elif len(struct['image']) == 1:
-                response = model.generate(prompt=struct['text'], image_path=struct['image'][0], dataset=dataset_name)
-            else:
-                response = '[MMMU] Failed, multiple images exist while the model only support single-image generate API. '
-        else:
-            response = model.generate(prompt=struct['text'], image_path=struct['image'], dataset=dataset_name)
-        torch.cuda.empty_cache()
-        
-        if verbose:
-            print(response, flush=True)
-
-        res[idx] = response
-        if (i + 1) % 20 == 0:
-            dump(res, out_file)
+    # Longest first, in batches of similar cost for models that support batching (see `schedule`)
+    batch_size = batch_size_of(model, dataset_name)
+    batches = schedule(data, batch_size, getattr(model, 'max_batch_tokens', None))
+    pbar = tqdm(total=lt)
+    with ResultWriter(out_file) as writer:
+        for batch in batches:
+            lines = [data.iloc[i] for i in batch]
+            responses = infer_batch(model, dataset, lines, dataset_name)
+            # Once per batch rather than once per item
+            empty_cache()
 
-    dump(res, out_file)
+            for line, response in zip(lines, responses):
+                if verbose:
+                    print(response, flush=True)
+                res[line['index']] = response
+                writer.write(line['index'], response)
+                if stream is not None:
+                    stream.feed(line['index'], response)
+            pbar.update(len(batch))
+    pbar.close()
     return model
 
 def prefetch_acc(result_file):
     data = load(result_file)
-    from vlmeval.evaluate.multiple_choice import build_choices, can_infer
+    from vlmeval.evaluate.multiple_choice import build_choices
+    from vlmeval.utils import can_infer_batch
     tot = defaultdict(lambda: 0)
     match = defaultdict(lambda: 0)
     hit = defaultdict(lambda: 0)
-    lt = len(data)
-    for i in range(lt):
-        item = data.iloc[i]
-        cate = item['category']
+    choices = [build_choices(item) for _, item in data.iterrows()]
+    matches = can_infer_batch(list(data['prediction']), choices)
+    for cate, answer, matched in zip(data['category'], data['answer'], matches):
         tot['Overall'] += 1
         tot[cate] += 1
-        choices = build_choices(item)
-        matched = can_infer(item['prediction'], choices)
         if matched:
             match['Overall'] += 1
             match[cate] += 1
-            if matched == item['answer']:
+            if matched == answer:
                 hit['Overall'] += 1
                 hit[cate] += 1
     res = defaultdict(list)
@@ -170,22 +264,48 @@ def prefetch_acc(result_file):
     res = pd.DataFrame(res)
     return res
 
-def infer_data_job(model, model_name, dataset_name, verbose=False, api_nproc=4, ignore_failed=False):
+def build_work_queue(queue_file, dataset_name, shard_files, chunk_size=None):
+    # Positions already predicted by any rank (in a previous run) are not queued again
+    finished = set()
+    for pth in shard_files:
+        if osp.exists(pth):
+            finished.update(idx for idx, _ in iter_results(pth))
+    data = TSVDataset(dataset_name).data
+    positions = [i for i, idx in enumerate(data['index']) if idx not in finished]
+    _, world_size = get_rank_and_world_size()
+    if chunk_size is None:
+        # About 8 chunks per rank, small enough to balance the load at the tail
+        chunk_size = min(max(1, len(positions) // (world_size * 8)), 32)
+    return WorkQueue.create(queue_file, positions, chunk_size)
+
+def infer_data_job(model, model_name, dataset_name, verbose=False, api_nproc=4, ignore_failed=False, engine='mp',
+                   shard='static', model_kwargs=None, stream=None):
 
-    result_file = f'{model_name}/{model_name}_{dataset_name}.xlsx'
+    result_file = result_path(f'{model_name}/{model_name}_{dataset_name}')
     rank, world_size = get_rank_and_world_size()   
-    tmpl = f'{model_name}/' + '{}' + f'{world_size}_{dataset_name}.pkl'
+    tmpl = f'{model_name}/' + '{}' + f'{world_size}_{dataset_name}.jsonl'
     out_file = tmpl.format(rank)
 
     if not osp.exists(result_file):
-        model = infer_data(model, dataset_name=dataset_name, out_file=out_file, verbose=verbose)
+        queue = None
+        queue_file = f'{model_name}/{world_size}_{dataset_name}_queue.json'
+        if shard == 'dynamic' and world_size > 1:
+            if rank == 0:
+                build_work_queue(queue_file, dataset_name, [tmpl.format(i) for i in range(world_size)])
+            barrier()
+            queue = WorkQueue(queue_file)
+        model = infer_data(
+            model, dataset_name=dataset_name, out_file=out_file, verbose=verbose, api_nproc=api_nproc, engine=engine,
+            queue=queue, model_kwargs=model_kwargs, stream=stream)
         if world_size > 1:
-            dist.barrier()
+            barrier()
 
         if rank == 0:
+            # Stream the records of the rank shards, only the predictions are kept in memory
             data_all = {}
             for i in range(world_size):
-                data_all.update(load(tmpl.format(i)))
+                for idx, pred in iter_results(tmpl.format(i)):
+                    data_all[idx] = pred
 
             data = TSVDataset(dataset_name).data
             assert len(data_all) == len(data)
@@ -195,6 +315,8 @@ def infer_data_job(model, model_name, dataset_name, verbose=False, api_nproc=4,
             dump(data, result_file)             
             for i in range(world_size):
                 os.remove(tmpl.format(i))
+            if queue is not None:
+                os.remove(queue_file)
         return model
     else:
         data = load(result_file)
@@ -208,7 +330,9 @@ def infer_data_job(model, model_name, dataset_name, verbose=False, api_nproc=4,
             assert rank == 0 and world_size == 1
             failed_set = set(failed_set)
             answer_map = {x: y for x, y in zip(data['index'], data['prediction'])}
-            res = infer_data_api(model_name, dataset_name, failed_set, api_nproc=api_nproc)
+            res = infer_data_api(
+                model_name, dataset_name, failed_set, api_nproc=api_nproc, engine=engine, model_kwargs=model_kwargs,
+                stream=stream)
             answer_map.update(res)
             data['prediction'] = [str(answer_map[x]) for x in data['index']]
             dump(data, result_file)
@@ -222,8 +346,13 @@ def main():
 
     rank, world_size = get_rank_and_world_size()
     if world_size > 1:
-        torch.cuda.set_device(rank)
-        dist.init_process_group(backend='nccl', timeout=datetime.timedelta(seconds=5400))
+        import torch
+        import torch.distributed as dist
+        # gloo allows to run distributed inference on CPU (e.g. to try out stub models)
+        backend = 'nccl' if torch.cuda.is_available() else 'gloo'
+        if backend == 'nccl':
+            torch.cuda.set_device(rank)
+        dist.init_process_group(backend=backend, timeout=datetime.timedelta(seconds=5400))
 
     for _, model_name in enumerate(args.model):
         model = None
@@ -238,16 +367,18 @@ def main():
                     logger.error(f'Model {model_name} does not support the `multi_generate` interface, which is required for testing CORE_MM, skip it. ')
                     continue
 
-            result_file = f'{pred_root}/{model_name}_{dataset_name}.xlsx'
+            result_file = result_path(f'{pred_root}/{model_name}_{dataset_name}')
             if model is None:
                 model = model_name # which is only a name
-            model = infer_data_job(model, model_name=model_name, dataset_name=dataset_name, verbose=args.verbose, api_nproc=args.nproc)
+            model = infer_data_job(
+                model, model_name=model_name, dataset_name=dataset_name, verbose=args.verbose, api_nproc=args.nproc,
+                engine=args.engine, shard=args.shard)
                          
             if rank == 0 and listinstr(['MMBench', 'CCBench', 'SEEDBench', 'ScienceQA', 'MMMU'], dataset_name):
                 time.sleep(3)
                 res = prefetch_acc(result_file)
                 print(model_name, res)
-                dump(res, result_file.replace('.xlsx', '_prefetch.xlsx'))
+                dump(res, result_path(f'{pred_root}/{model_name}_{dataset_name}_prefetch', 'csv'))
                 
 if __name__ == '__main__':
     main()
\ No newline at end of file
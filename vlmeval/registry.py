@@ -0,0 +1,64 @@
+import copy as cp
+import importlib
+from collections.abc import Mapping
+from functools import partial
+
+# The packages model classes are looked up in, by name (see their `_registry`)
+CLASS_PACKAGES = ['vlmeval.api', 'vlmeval.vlm']
+
+
+def resolve_class(cls_name):
+    """Import and return the model class ``cls_name``, only the module defining it is imported."""
+    for pkg in CLASS_PACKAGES:
+        module = importlib.import_module(pkg)
+        if cls_name in module._registry:
+            return getattr(module, cls_name)
+    raise ImportError(f'Model class {cls_name} is not provided by {CLASS_PACKAGES}. ')
+
+
+def is_api_class(cls_name):
+    return cls_name in importlib.import_module('vlmeval.api')._registry
+
+
+class ModelRegistry(Mapping):
+    """A declarative registry of models: {name: (class name, kwargs)}.
+
+    Model classes are referenced by name and imported on demand, so looking up a model only imports
+    its own module (and dependencies). ``registry[name]`` is a ``functools.partial`` of the class built
+    on each access: changing it does not affect the registry. Use ``build`` to instantiate a model
+    with per-run overrides (e.g. ``retry``, ``verbose``, ``max_concurrency`` of API models).
+
+    Args:
+        *groups (dict): Groups of model specs, {name: (class name, kwargs)}.
+    """
+
+    def __init__(self, *groups):
+        self.specs = {}
+        for grp in groups:
+            self.specs.update(grp)
+
+    def __getitem__(self, name):
+        cls_name, kwargs = self.specs[name]
+        return partial(resolve_class(cls_name), **cp.deepcopy(kwargs))
+
+    def __iter__(self):
+        return iter(self.specs)
+
+    def __len__(self):
+        return len(self.specs)
+
+    def __contains__(self, name):
+        return name in self.specs
+
+    def spec(self, name):
+        """The (class name, kwargs) of ``name``, without importing anything."""
+        cls_name, kwargs = self.specs[name]
+        return cls_name, cp.deepcopy(kwargs)
+
+    def is_api(self, name):
+        return is_api_class(self.specs[name][0])
+
+    def build(self, name, **overrides):
+        """Instantiate ``name``, with ``overrides`` (None values are ignored) on top of its kwargs."""
+        overrides = {k: v for k, v in overrides.items() if v is not None}
+        return self[name](**overrides)
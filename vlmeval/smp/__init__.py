@@ -1,4 +1,10 @@
 from .file import *
 from .vlm import *
 from .misc import *
-from .log import *
\ No newline at end of file
+from .log import *
+
+
+def __getattr__(name):
+    # The lazily imported modules of `misc` (plt, sns, tabulate, ...)
+    from . import misc
+    return getattr(misc, name)
@@ -7,6 +7,18 @@ import hashlib
 import os.path as osp
 import time
 
+def _arrow_safe(data):
+    # Arrow columns have a single type, object columns mixing types (e.g. int and str answers) are
+    # stored as strings. Missing values are kept.
+    data = data.copy()
+    for k in data.columns:
+        if data[k].dtype != object:
+            continue
+        types = set(type(x) for x in data[k] if not (isinstance(x, float) and x != x) and x is not None)
+        if len(types) > 1:
+            data[k] = [x if (isinstance(x, float) and x != x) or x is None else str(x) for x in data[k]]
+    return data
+
 # LOAD & DUMP
 def dump(data, f, **kwargs):
     def dump_pkl(data, pth, **kwargs):
@@ -29,7 +41,15 @@ def dump(data, f, **kwargs):
     def dump_tsv(data, f, quoting=csv.QUOTE_ALL):
         data.to_csv(f, sep='\t', index=False, encoding='utf-8', quoting=quoting)
 
-    handlers = dict(pkl=dump_pkl, json=dump_json, jsonl=dump_jsonl, xlsx=dump_xlsx, csv=dump_csv, tsv=dump_tsv)
+    def dump_parquet(data, f, **kwargs):
+        _arrow_safe(data).to_parquet(f, index=False)
+
+    def dump_feather(data, f, **kwargs):
+        _arrow_safe(data).reset_index(drop=True).to_feather(f)
+
+    handlers = dict(
+        pkl=dump_pkl, json=dump_json, jsonl=dump_jsonl, xlsx=dump_xlsx, csv=dump_csv, tsv=dump_tsv,
+        parquet=dump_parquet, feather=dump_feather)
     suffix = f.split('.')[-1]
     return handlers[suffix](data, f, **kwargs)
 
@@ -57,10 +77,53 @@ def load(f):
     def load_tsv(f):
         return pd.read_csv(f, sep='\t')
 
-    handlers = dict(pkl=load_pkl, json=load_json, jsonl=load_jsonl, xlsx=load_xlsx, csv=load_csv, tsv=load_tsv)
+    def load_parquet(f):
+        return pd.read_parquet(f)
+
+    def load_feather(f):
+        return pd.read_feather(f)
+
+    handlers = dict(
+        pkl=load_pkl, json=load_json, jsonl=load_jsonl, xlsx=load_xlsx, csv=load_csv, tsv=load_tsv,
+        parquet=load_parquet, feather=load_feather)
     suffix = f.split('.')[-1]
     return handlers[suffix](f) 
 
+def _default_result_format():
+    try:
+        import pyarrow  # noqa: F401
+        return 'parquet'
+    except ImportError:
+        return 'pkl'
+
+# The format of the prediction / evaluation record files of the pipeline, any suffix handled by `load` and
+# `dump`. Spreadsheet formats (xlsx, csv) are only written on request, by `export_result`.
+RESULT_FORMAT = os.environ.get('VLMEVAL_RESULT_FORMAT', _default_result_format())
+RESULT_FORMATS = ['parquet', 'feather', 'pkl', 'xlsx', 'csv', 'tsv']
+
+def result_path(prefix, fmt=None):
+    """The result file ``{prefix}.{fmt}``. Without ``fmt``, an existing file in any of the result formats
+    is returned (so that results of previous runs are reused), ``{prefix}.{RESULT_FORMAT}`` otherwise."""
+    if fmt is not None:
+        return f'{prefix}.{fmt}'
+    for fmt in [RESULT_FORMAT] + RESULT_FORMATS:
+        if osp.exists(f'{prefix}.{fmt}'):
+            return f'{prefix}.{fmt}'
+    return f'{prefix}.{RESULT_FORMAT}'
+
+def export_result(pth, formats=('xlsx', )):
+    """Convert the result file ``pth`` to each of ``formats``, next to it. Returns the written files."""
+    suffix = pth.split('.')[-1]
+    data = load(pth)
+    ret = []
+    for fmt in formats:
+        if fmt == suffix:
+            continue
+        tgt = pth[:-len(suffix)] + fmt
+        dump(data, tgt)
+        ret.append(tgt)
+    return ret
+
 def download_file(url, filename=None):
     import urllib.request
     from tqdm import tqdm
@@ -117,6 +180,16 @@ def md5(file_pth):
             hash.update(chunk)
     return str(hash.hexdigest())
 
+# (path, size, mtime) -> md5, so that unchanged files are hashed only once per process
+_md5_memo = {}
+
+def cached_md5(file_pth):
+    stat = os.stat(file_pth)
+    key = (osp.abspath(file_pth), stat.st_size, stat.st_mtime)
+    if key not in _md5_memo:
+        _md5_memo[key] = md5(file_pth)
+    return _md5_memo[key]
+
 def last_modified(pth):
     stamp = osp.getmtime(pth)
     m_ti = time.ctime(stamp)
@@ -1,12 +1,21 @@
 import logging
+import threading
 
 logger_initialized = {}
+# Loggers are also first requested from worker threads (e.g. the judge threads of the evaluators)
+_init_lock = threading.Lock()
 
 def get_logger(name, log_file=None, log_level=logging.INFO, file_mode='w'):
     logger = logging.getLogger(name)
     if name in logger_initialized:
         return logger
-    
+    with _init_lock:
+        return _init_logger(logger, name, log_file, log_level, file_mode)
+
+def _init_logger(logger, name, log_file, log_level, file_mode):
+    if name in logger_initialized:
+        return logger
+
     for logger_name in logger_initialized:
         if name.startswith(logger_name):
             return logger
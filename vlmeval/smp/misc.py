@@ -16,11 +16,22 @@ from collections import OrderedDict, defaultdict
 from multiprocessing import Pool, current_process
 from tqdm import tqdm
 import datetime
-import matplotlib.pyplot as plt
-import seaborn as sns
-from tabulate import tabulate_formats, tabulate
-from huggingface_hub import scan_cache_dir
-from sty import fg, bg, ef, rs
+import importlib
+import sys
+
+# Heavy modules used by a few helpers only, imported on first access (PEP 562), e.g.
+# `from vlmeval.smp import plt`. Star imports of `vlmeval.smp` do not include them.
+_lazy_modules = dict(plt='matplotlib.pyplot', sns='seaborn', decord='decord')
+_lazy_attrs = dict(
+    tabulate='tabulate', tabulate_formats='tabulate', scan_cache_dir='huggingface_hub',
+    fg='sty', bg='sty', ef='sty', rs='sty')
+
+def __getattr__(name):
+    if name in _lazy_modules:
+        return importlib.import_module(_lazy_modules[name])
+    if name in _lazy_attrs:
+        return getattr(importlib.import_module(_lazy_attrs[name]), name)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
 
 def h2r(value):
     if value[0] == '#':
@@ -32,6 +43,7 @@ def r2h(rgb):
     return '#%02x%02x%02x' % rgb
 
 def colored(s, color):
+    from sty import fg
     if isinstance(color, str):
         color = h2r(color)
     return fg(*color) + s + fg.rs
@@ -51,6 +63,7 @@ def bincount(lst):
     return bins
 
 def get_cache_path(repo_id):
+    from huggingface_hub import scan_cache_dir
     hf_cache_info = scan_cache_dir()
     repos = list(hf_cache_info.repos)
     repo = None
@@ -79,6 +92,16 @@ def get_rank_and_world_size():
     world_size = int(os.environ.get("WORLD_SIZE", 1))
     return local_rank, world_size
 
+def barrier():
+    # torch is only imported by distributed runs and local models
+    import torch.distributed as dist
+    dist.barrier()
+
+def empty_cache():
+    torch = sys.modules.get('torch', None)
+    if torch is not None and torch.cuda.is_available():
+        torch.cuda.empty_cache()
+
 def splitlen(s, sym='/'):
     return len(s.split(sym))
 
@@ -98,11 +121,6 @@ def cn_string(s):
         return True
     return False
 
-try:
-    import decord
-except ImportError:
-    pass
-
 def timestr(second=True, minute=False):
     s = datetime.datetime.now().strftime('%Y%m%d%H%M%S')[2:]
     if second:
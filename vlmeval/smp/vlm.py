@@ -2,10 +2,13 @@ import os, io
 import pandas as pd
 import numpy as np
 import string
-from uuid import uuid4
+import hashlib
+import threading
 import os.path as osp
 import base64
+from collections import OrderedDict
 from PIL import Image
+from .file import cached_md5
 
 def mmqa_display(question):
     question = {k.lower(): v for k, v in question.items()}
@@ -13,14 +16,14 @@ def mmqa_display(question):
     keys = [k for k in keys if k not in ['index', 'image']]
 
     images = question['image']
-    if isinstance(images, str):
+    if not isinstance(images, list):
         images = [images]
 
     idx = question.pop('index', 'XXX')
     print(f'INDEX: {idx}')
 
     for im in images:
-        image = decode_base64_to_image(im, target_size=512)
+        image = decode_base64_to_image(str(im), target_size=512)
         display(image)
         
     for k in keys:
@@ -31,24 +34,59 @@ def mmqa_display(question):
             if False in pd.isna(question[k]):
                 print(f'{k.upper()}. {question[k]}')
 
-def encode_image_to_base64(img, target_size=-1):
-    # if target_size == -1, will not do resizing
-    # else, will set the max_size ot (target_size, target_size)
+# (image content hash, target_size, quality) -> base64 JPEG payload, in LRU order.
+# Retries and multi-model sweeps over the same image reuse the encoded bytes.
+_b64_cache = OrderedDict()
+_b64_cache_bytes = 0
+_b64_cache_lock = threading.Lock()
+B64_CACHE_MAX_BYTES = int(os.environ.get('VLMEVAL_B64_CACHE_BYTES', 256 * 1024 ** 2))
+
+def _b64_cache_get(key):
+    with _b64_cache_lock:
+        if key in _b64_cache:
+            _b64_cache.move_to_end(key)
+            return _b64_cache[key]
+    return None
+
+def _b64_cache_put(key, value):
+    global _b64_cache_bytes
+    with _b64_cache_lock:
+        if key in _b64_cache:
+            return
+        _b64_cache[key] = value
+        _b64_cache_bytes += len(value)
+        while _b64_cache_bytes > B64_CACHE_MAX_BYTES and len(_b64_cache) > 1:
+            _, old = _b64_cache.popitem(last=False)
+            _b64_cache_bytes -= len(old)
+
+def _encode_jpeg(img, target_size=-1, quality=75):
     if img.mode in ("RGBA", "P"):
         img = img.convert("RGB")
-    tmp = osp.join('/tmp', str(uuid4()) + '.jpg')
     if target_size > 0:
+        img = img.copy()
         img.thumbnail((target_size, target_size))
-    img.save(tmp)
-    with open(tmp, 'rb') as image_file:
-        image_data = image_file.read()
-    ret = base64.b64encode(image_data).decode('utf-8')
-    os.remove(tmp)
+    buf = io.BytesIO()
+    img.save(buf, format='JPEG', quality=quality)
+    return base64.b64encode(buf.getvalue()).decode('utf-8')
+
+def encode_image_to_base64(img, target_size=-1, quality=75):
+    # if target_size == -1, will not do resizing
+    # else, will set the max_size ot (target_size, target_size)
+    key = (hashlib.md5(img.tobytes()).hexdigest(), img.mode, img.size, target_size, quality)
+    ret = _b64_cache_get(key)
+    if ret is None:
+        ret = _encode_jpeg(img, target_size=target_size, quality=quality)
+        _b64_cache_put(key, ret)
     return ret
 
-def encode_image_file_to_base64(image_path, target_size=-1):
-    image = Image.open(image_path)
-    return encode_image_to_base64(image, target_size=target_size)
+def encode_image_file_to_base64(image_path, target_size=-1, quality=75):
+    # Keyed by the file content, a cache hit does not even decode the image
+    key = ('file-md5:' + cached_md5(image_path), target_size, quality)
+    ret = _b64_cache_get(key)
+    if ret is None:
+        ret = _encode_jpeg(Image.open(image_path), target_size=target_size, quality=quality)
+        _b64_cache_put(key, ret)
+    return ret
     
 def decode_base64_to_image(base64_string, target_size=-1):
     image_data = base64.b64decode(base64_string)
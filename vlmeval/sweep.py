@@ -0,0 +1,357 @@
+import fnmatch
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from tabulate import tabulate
+from vlmeval.api import init_run
+from vlmeval.config import supported_VLM
+from vlmeval.inference import FAIL_MSG, build_model, infer_data_job, infer_item
+from vlmeval.utils import TSVDataset, dataset_URLs, abbr2full, materialize_images
+from vlmeval.utils.checkpoint import ResultWriter, load_results
+from vlmeval.utils.scheduler import schedule
+from vlmeval.smp import *
+
+# The lane of local models, which run one at a time (they hold the GPUs)
+LOCAL = 'local'
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Run a models x datasets sweep in one process, API models concurrently')
+    parser.add_argument(
+        '--data', type=str, nargs='+', required=True,
+        help='The datasets, shell-style patterns (e.g. "multi_step_*") match the supported and the local datasets')
+    parser.add_argument('--model', type=str, nargs='+', required=True)
+    parser.add_argument('--mode', type=str, default='all', choices=['all', 'infer'])
+    parser.add_argument(
+        '--nproc', type=int, default=4,
+        help='The default concurrency budget of each API provider, and the concurrency of the judges')
+    parser.add_argument(
+        '--budget', type=str, nargs='+', default=[],
+        help='The concurrency budget of some providers (API wrapper classes), e.g. GPT4V=32 QwenVLAPI=8')
+    parser.add_argument('--eval-workers', type=int, default=2, help='The number of concurrent evaluations')
+    parser.add_argument(
+        '--stream', action='store_true',
+        help='Run the judge calls of API models while their inference is running (see StreamEvaluator)')
+    parser.add_argument('--retry', type=int, default=None, help='retry numbers for API VLMs')
+    parser.add_argument(
+        '--max-concurrency', type=int, default=None, help='The upper bound of in-flight requests of API VLMs')
+    parser.add_argument('--judge', type=str, default=None)
+    parser.add_argument('--ignore', action='store_true', help='Ignore failed indices. ')
+    parser.add_argument('--verbose', action='store_true')
+    parser.add_argument(
+        '--prepare', action='store_true', help='Decode all images of the datasets (in parallel) before the inference')
+    args = parser.parse_args()
+    return args
+
+
+def provider_of(model_name):
+    # The API models of a wrapper class share an endpoint (and usually an account), thus a budget
+    if supported_VLM.is_api(model_name):
+        return supported_VLM.spec(model_name)[0]
+    return LOCAL
+
+
+def parse_budgets(items):
+    budgets = {}
+    for item in items:
+        provider, budget = item.split('=')
+        budgets[provider] = int(budget)
+    return budgets
+
+
+def resolve_datasets(names, logger):
+    """The datasets of ``--data``, as in ``run.py``: the supported datasets and the local ones (a TSV file
+    under ``LMUDataRoot()``). A shell-style pattern matches all of them, in sorted order.
+
+    Returns:
+        list[str]: The dataset names.
+        set[str]: The local (custom) datasets among them.
+    """
+    root = LMUDataRoot()
+    local = sorted(osp.splitext(x)[0] for x in os.listdir(root) if x.endswith('.tsv'))
+    datasets, custom = [], set()
+    for name in names:
+        if any(c in name for c in '*?['):
+            matched = sorted(fnmatch.filter(set(dataset_URLs) | set(local), name))
+            if not len(matched):
+                logger.error(f'No dataset matches {name}, will be skipped. ')
+        else:
+            matched = [name if name in dataset_URLs else abbr2full(name)]
+        for dataset_name in matched:
+            if dataset_name not in dataset_URLs:
+                if not osp.exists(osp.join(root, f'{dataset_name}.tsv')):
+                    logger.error(f'Cannot find the local dataset {dataset_name}, will be skipped. ')
+                    continue
+                custom.add(dataset_name)
+            if dataset_name not in datasets:
+                datasets.append(dataset_name)
+    return datasets, custom
+
+
+def evaluate_job(result_file, dataset_name, nproc=4, judge=None, retry=None, verbose=False, custom_flag=False):
+    import vlmeval.evaluate as evaluate
+    judge_kwargs = evaluate.build_judge_kwargs(dataset_name, judge=judge, nproc=nproc, verbose=verbose, retry=retry)
+    return evaluate.evaluate_result(result_file, dataset_name, custom_flag=custom_flag, **judge_kwargs)
+
+
+class DatasetPool:
+    """The datasets of a sweep, each loaded once and shared by all models (read only)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._locks = {}
+        self._datasets = {}
+
+    def get(self, dataset_name):
+        with self._lock:
+            lock = self._locks.setdefault(dataset_name, threading.Lock())
+        # Another model may be loading the same dataset, wait for it rather than loading it twice
+        with lock:
+            if dataset_name not in self._datasets:
+                self._datasets[dataset_name] = TSVDataset(dataset_name)
+            return self._datasets[dataset_name]
+
+
+class Sweep:
+    """Run the inference and evaluation of a models x datasets matrix in a single process.
+
+    Each (API model, dataset) pair is a job of its own. The requests of all jobs of a provider (the
+    API wrapper class, e.g. ``GPT4V`` for all OpenAI models) go through a thread pool of the provider's
+    budget, so that the providers run concurrently without one of them starving the others, and the
+    pending requests of a provider are served in submission order. Local models run one at a time
+    through ``infer_data_job``. Datasets are loaded once for all API models. A pair is evaluated (in a
+    pool of ``eval_workers`` processes) as soon as its inference finishes, while the rest of the matrix
+    is still running.
+
+    Predictions are checkpointed and written with the same layout as ``run.py``, so either of them
+    can resume the work of the other.
+
+    Args:
+        models (list[str]): The model names.
+        datasets (list[str]): The dataset names.
+        custom (set[str], optional): The local datasets among ``datasets`` (see ``resolve_datasets``).
+            Defaults to None.
+        nproc (int): The default budget of each provider, and the concurrency of the judges. Defaults to 4.
+        budgets (dict, optional): {provider: budget}, overriding ``nproc``. Defaults to None.
+        eval_workers (int): The number of concurrent evaluations. Defaults to 2.
+        mode (str): 'all' (inference and evaluation) or 'infer'. Defaults to 'all'.
+        model_kwargs (dict, optional): Per-run overrides of the API models (see ``ModelRegistry.build``).
+            Defaults to None.
+        judge_kwargs (dict, optional): The ``judge``, ``retry`` and ``verbose`` of ``build_judge_kwargs``.
+            Defaults to None.
+        ignore_failed (bool): Do not retry failed API requests of existing predictions. Defaults to False.
+        verbose (bool): Print the responses. Defaults to False.
+        stream (bool): Warm the evaluator checkpoints of API models while their inference is running.
+            Defaults to False.
+    """
+
+    def __init__(self, models, datasets, custom=None, nproc=4, budgets=None, eval_workers=2, mode='all',
+                 model_kwargs=None, judge_kwargs=None, ignore_failed=False, verbose=False, stream=False):
+        self.models = models
+        self.datasets = datasets
+        self.custom = custom or set()
+        self.nproc = nproc
+        self.budgets = budgets or {}
+        self.eval_workers = eval_workers
+        self.mode = mode
+        self.model_kwargs = model_kwargs or {}
+        self.judge_kwargs = judge_kwargs or {}
+        self.ignore_failed = ignore_failed
+        self.verbose = verbose
+        self.stream = stream
+
+        self.logger = get_logger('Sweep')
+        self.dataset_pool = DatasetPool()
+        self._lock = threading.Lock()
+        self._models = {}
+        self.records = []
+
+    def budget(self, provider):
+        return self.budgets.get(provider, self.nproc)
+
+    def get_model(self, model_name):
+        with self._lock:
+            if model_name not in self._models:
+                self._models[model_name] = build_model(model_name, self.model_kwargs)
+            return self._models[model_name]
+
+    def infer_api(self, model_name, dataset_name, executor):
+        """The inference of an API model on a dataset, the requests are run by the provider ``executor``."""
+        result_file = result_path(f'{model_name}/{model_name}_{dataset_name}')
+        # The shard of rank 0 in a single-process run of `infer_data_job`
+        out_file = f'{model_name}/01_{dataset_name}.jsonl'
+        res = {}
+        if osp.exists(result_file):
+            data = load(result_file)
+            res = {
+                k: v for k, v in zip(data['index'], data['prediction'])
+                if self.ignore_failed or FAIL_MSG not in str(v)}
+            if len(res) == len(data):
+                return result_file, 0
+        res.update(load_results(out_file))
+
+        stream = None
+        if self.stream and self.mode == 'all':
+            import vlmeval.evaluate as evaluate
+            judge_kwargs = evaluate.build_judge_kwargs(dataset_name, nproc=self.nproc, **self.judge_kwargs)
+            stream = evaluate.build_stream(
+                result_file, dataset_name, custom_flag=dataset_name in self.custom, **judge_kwargs)
+            for k, v in res.items():
+                stream.feed(k, v)
+
+        dataset = self.dataset_pool.get(dataset_name)
+        model = self.get_model(model_name)
+        data = dataset.data[~dataset.data['index'].isin(res)]
+        # Longest requests first, the results are written as they complete
+        futures = {}
+        for batch in schedule(data):
+            line = data.iloc[batch[0]]
+            futures[executor.submit(infer_item, model, dataset, line, dataset_name)] = line['index']
+        try:
+            with ResultWriter(out_file) as writer:
+                for fut in as_completed(futures):
+                    response = fut.result()
+                    if self.verbose:
+                        print(response, flush=True)
+                    res[futures[fut]] = response
+                    writer.write(futures[fut], response)
+                    if stream is not None:
+                        stream.feed(futures[fut], response)
+        except BaseException:
+            for fut in futures:
+                fut.cancel()
+            raise
+        finally:
+            # The evaluation job (in another process) then reads the warm checkpoints
+            if stream is not None:
+                stream.drain()
+
+        data = dataset.data.drop(columns=['image'])
+        assert len(res) == len(data)
+        data['prediction'] = [str(res[x]) for x in data['index']]
+        dump(data, result_file)
+        os.remove(out_file)
+        return result_file, len(futures)
+
+    def run_api(self, model_name, dataset_name, executor, eval_pool):
+        t = time.time()
+        result_file, num = self.infer_api(model_name, dataset_name, executor)
+        self.finish(model_name, dataset_name, result_file, num, time.time() - t, eval_pool)
+
+    def run_local(self, model_name, local_lock, eval_pool):
+        # All datasets of a local model in a row, the model is built once and released at the end
+        with local_lock:
+            model = model_name
+            for dataset_name in self.datasets:
+                t = time.time()
+                model = infer_data_job(
+                    model, model_name=model_name, dataset_name=dataset_name, verbose=self.verbose,
+                    ignore_failed=self.ignore_failed)
+                result_file = result_path(f'{model_name}/{model_name}_{dataset_name}')
+                self.finish(model_name, dataset_name, result_file, None, time.time() - t, eval_pool)
+            del model
+            empty_cache()
+
+    def finish(self, model_name, dataset_name, result_file, num, cost, eval_pool):
+        self.logger.info(f'Inference of {model_name} on {dataset_name} finished in {cost:.1f}s. ')
+        record = dict(model=model_name, dataset=dataset_name, predicted=num, infer_time=round(cost, 1), eval=None)
+        if eval_pool is not None:
+            record['eval'] = eval_pool.submit(
+                evaluate_job, result_file, dataset_name, nproc=self.nproc, custom_flag=dataset_name in self.custom,
+                **self.judge_kwargs)
+        with self._lock:
+            self.records.append(record)
+
+    def run(self):
+        """Run the sweep.
+
+        Returns:
+            pd.DataFrame: A record per (model, dataset) pair: the number of predicted items, the
+                inference time and the status.
+        """
+        self.records = []
+        for model_name in self.models:
+            os.makedirs(model_name, exist_ok=True)
+        lanes = defaultdict(list)
+        for model_name in self.models:
+            lanes[provider_of(model_name)].append(model_name)
+        self.logger.info(
+            'Sweep lanes: ' + ', '.join(f'{p} (budget {self.budget(p)}): {m}' for p, m in lanes.items()))
+
+        # Spawned processes: evaluators fork their own pools, which is not safe from a threaded process
+        eval_pool = None
+        if self.mode == 'all':
+            eval_pool = ProcessPoolExecutor(self.eval_workers, mp_context=multiprocessing.get_context('spawn'))
+        executors = {p: ThreadPoolExecutor(self.budget(p)) for p in lanes if p != LOCAL}
+        local_lock = threading.Lock()
+        jobs = {}
+        with ThreadPoolExecutor(max(len(self.models) * len(self.datasets), 1)) as pool:
+            for provider, models in lanes.items():
+                for model_name in models:
+                    if provider == LOCAL:
+                        job = pool.submit(self.run_local, model_name, local_lock, eval_pool)
+                        jobs[job] = (model_name, None)
+                        continue
+                    for dataset_name in self.datasets:
+                        job = pool.submit(self.run_api, model_name, dataset_name, executors[provider], eval_pool)
+                        jobs[job] = (model_name, dataset_name)
+
+            failed = []
+            for job in as_completed(jobs):
+                if job.exception() is not None:
+                    model_name, dataset_name = jobs[job]
+                    self.logger.error(f'Sweep job {model_name} / {dataset_name} failed: {job.exception()}')
+                    failed.append(dict(model=model_name, dataset=dataset_name, status=str(job.exception())))
+        for executor in executors.values():
+            executor.shutdown()
+
+        records = []
+        for record in self.records:
+            fut = record.pop('eval')
+            record['status'] = 'inferred'
+            if fut is not None:
+                try:
+                    record['status'] = 'evaluated' if fut.result() else 'no evaluator'
+                except Exception as err:
+                    self.logger.error(f'Evaluation of {record["model"]} on {record["dataset"]} failed: {err}')
+                    record['status'] = f'eval failed: {err}'
+            records.append(record)
+        if eval_pool is not None:
+            eval_pool.shutdown()
+        return pd.DataFrame(records + failed)
+
+
+def main():
+    logger = get_logger('Sweep')
+    args = parse_args()
+    # The API workers and judges started below share the rate limiter state of the sweep
+    init_run()
+    _, world_size = get_rank_and_world_size()
+    assert world_size == 1, 'The sweep runs in a single process, use run.py for distributed inference'
+
+    datasets, custom = resolve_datasets(args.data, logger)
+    models = [x for x in args.model if x in supported_VLM]
+    for model_name in set(args.model) - set(models):
+        logger.error(f'Model {model_name} is not supported, will be skipped. ')
+
+    # Images are decoded once, before any model needs them
+    if args.prepare:
+        for dataset_name in datasets:
+            if dataset_name in dataset_URLs:
+                materialize_images(dataset_name)
+
+    model_kwargs = dict(max_concurrency=args.max_concurrency)
+    if args.retry is not None:
+        model_kwargs.update(retry=args.retry, verbose=args.verbose)
+    sweep = Sweep(
+        models, datasets, custom=custom, nproc=args.nproc, budgets=parse_budgets(args.budget),
+        eval_workers=args.eval_workers, mode=args.mode, model_kwargs=model_kwargs,
+        judge_kwargs=dict(judge=args.judge, retry=args.retry, verbose=args.verbose),
+        ignore_failed=args.ignore, verbose=args.verbose, stream=args.stream)
+    res = sweep.run()
+    logger.info('Sweep summary: \n' + tabulate(res, headers='keys', showindex=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,16 @@
-from .matching_util import can_infer, can_infer_option, can_infer_text
+from .matching_util import can_infer, can_infer_option, can_infer_text, can_infer_batch, ChoiceMatcher
 from .mp_util import track_progress_rich
+from .async_util import track_progress_async, atrack_progress
+from .checkpoint import load_checkpoint
 from .custom_prompt import CustomPrompt
 from .dataset_config import dataset_URLs, img_root_map, DATASET_TYPE, abbr2full
 from .dataset import TSVDataset, split_MMMU
+from .materialize import materialize_images
 
 
 __all__ = [
-    'can_infer', 'can_infer_option', 'can_infer_text', 'track_progress_rich', 
+    'can_infer', 'can_infer_option', 'can_infer_text', 'can_infer_batch', 'ChoiceMatcher', 'track_progress_rich', 'track_progress_async',
+    'atrack_progress', 'load_checkpoint',
     'TSVDataset', 'dataset_URLs', 'img_root_map', 'DATASET_TYPE', 'CustomPrompt',
-    'split_MMMU', 'abbr2full'
+    'split_MMMU', 'abbr2full', 'materialize_images'
 ]
\ No newline at end of file
@@ -0,0 +1,123 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Sized
+
+from rich.progress import (BarColumn, MofNCompleteColumn, Progress,
+                           TaskProgressColumn, TextColumn)
+from .checkpoint import CheckpointJournal
+from .mp_util import _SkipFirstTimeRemainingColumn
+
+
+def _call(func, inputs):
+    if not isinstance(inputs, (tuple, list, dict)):
+        inputs = (inputs, )
+    if isinstance(inputs, dict):
+        return partial(func, **inputs)
+    return partial(func, *inputs)
+
+
+async def atrack_progress(func: Callable,
+                          tasks: Sized = tuple(),
+                          concurrency: int = 16,
+                          description: str = 'Processing',
+                          save=None, keys=None,
+                          compact_every: int = 1000,
+                          callback: Callable = None,
+                          color: str = 'blue') -> list:
+    """The asyncio counterpart of ``track_progress_rich``, to be awaited inside a running event loop.
+
+    All tasks are scheduled at once, while at most ``concurrency`` of them are in flight. ``func`` can be
+    a coroutine function (e.g. ``GPT4V.agenerate``) or a blocking callable, which is then run in a
+    thread pool of ``concurrency`` workers. Finished tasks are recorded in the ``save`` checkpoint
+    journal (see :class:`CheckpointJournal`) as soon as they complete.
+
+    Args:
+        func (callable): The (async) function to be applied to each task.
+        tasks (Sized): The tasks, with the same format as in ``track_progress_rich``.
+        concurrency (int): The maximal number of in-flight tasks. Defaults to 16.
+        description (str): The description of progress bar.
+        save (str, optional): The checkpoint file. Defaults to None.
+        keys (list, optional): The checkpoint key of each task. Defaults to None.
+        compact_every (int): Compact the checkpoint journal every this many records.
+        callback (callable, optional): Called with ``(key, result)`` of every finished task (see
+            ``track_progress_rich``). Defaults to None.
+        color (str): The color of progress bar. Defaults to "blue".
+
+    Returns:
+        list: The task results, in the order of ``tasks``.
+    """
+    if concurrency <= 0:
+        raise ValueError('concurrency must be a positive number')
+    if keys is not None:
+        assert len(keys) == len(tasks)
+    assert save is None or keys is not None
+
+    is_async = asyncio.iscoroutinefunction(func)
+    executor = None if is_async else ThreadPoolExecutor(concurrency)
+    loop = asyncio.get_running_loop()
+    sem = asyncio.Semaphore(concurrency)
+
+    async def run_one(task, idx):
+        async with sem:
+            if is_async:
+                return await _call(func, task)(), idx
+            return await loop.run_in_executor(executor, _call(func, task)), idx
+
+    prog_bar = Progress(
+        TextColumn('{task.description}'),
+        BarColumn(),
+        _SkipFirstTimeRemainingColumn(skip_times=concurrency),
+        MofNCompleteColumn(),
+        TaskProgressColumn(show_speed=True),
+    )
+    task_id = prog_bar.add_task(total=len(tasks), color=color, description=description)
+    ckpt = CheckpointJournal(save, compact_every=compact_every) if save is not None else None
+    verbose = os.environ.get('VERBOSE', False)
+
+    results = [None] * len(tasks)
+    futures = [asyncio.ensure_future(run_one(task, i)) for i, task in enumerate(tasks)]
+    try:
+        with prog_bar:
+            for fut in asyncio.as_completed(futures):
+                result, idx = await fut
+                results[idx] = result
+                if callback is not None:
+                    callback(idx if keys is None else keys[idx], result)
+                if ckpt is not None:
+                    ckpt.append(keys[idx], result)
+                    if verbose:
+                        print(keys[idx], result, flush=True)
+                prog_bar.update(task_id, advance=1, refresh=True)
+    finally:
+        for fut in futures:
+            fut.cancel()
+        if ckpt is not None:
+            ckpt.close()
+        if executor is not None:
+            executor.shutdown(wait=False)
+    return results
+
+
+def track_progress_async(func: Callable, tasks: Sized = tuple(), concurrency: int = 16, **kwargs) -> list:
+    """Run :func:`atrack_progress` in a new event loop, a drop-in alternative of ``track_progress_rich``
+    for I/O bound tasks (like API calls) that supports thousands of in-flight tasks in one process.
+
+    Examples:
+        >>> import asyncio
+
+        >>> async def func(x):
+        ...    await asyncio.sleep(1)
+        ...    return x**2
+        >>> track_progress_async(func, range(1000), concurrency=500)
+    """
+    from vlmeval.api.session import close_async_sessions
+
+    async def main():
+        try:
+            return await atrack_progress(func, tasks, concurrency=concurrency, **kwargs)
+        finally:
+            await close_async_sessions()
+
+    return asyncio.run(main())
@@ -0,0 +1,19 @@
+def left_pad(sequences, pad_id):
+    """Collate 1-D token id tensors into a left-padded batch for decoder-only generation.
+
+    Args:
+        sequences (list[torch.Tensor]): The token ids of each sample.
+        pad_id (int): The padding token id.
+
+    Returns:
+        tuple: (input_ids, attention_mask), both of shape (batch, max_len).
+    """
+    import torch
+    max_len = max(len(x) for x in sequences)
+    input_ids = torch.full((len(sequences), max_len), pad_id, dtype=sequences[0].dtype)
+    attention_mask = torch.zeros((len(sequences), max_len), dtype=torch.long)
+    for i, x in enumerate(sequences):
+        input_ids[i, max_len - len(x):] = x
+        attention_mask[i, max_len - len(x):] = 1
+    return input_ids, attention_mask
+
@@ -0,0 +1,199 @@
+import json
+import os
+import os.path as osp
+import pickle
+import time
+from ..smp import load, dump
+
+
+def journal_path(save):
+    return save + '.journal'
+
+
+def _read_journal(pth):
+    records = []
+    if not osp.exists(pth):
+        return records
+    with open(pth, 'rb') as fin:
+        while True:
+            try:
+                records.append(pickle.load(fin))
+            except EOFError:
+                break
+            except Exception:
+                # A truncated tail record is left behind if the writer crashed mid-append
+                break
+    return records
+
+
+def _write_snapshot(ans, save):
+    tmp = osp.join(osp.dirname(save), '.' + osp.basename(save))
+    dump(ans, tmp)
+    os.replace(tmp, save)
+
+
+def load_checkpoint(save):
+    """Load the checkpoint dict ``save``, replaying the records still pending in its journal.
+
+    Args:
+        save (str): The snapshot file (the ``save`` argument of ``track_progress_rich``).
+
+    Returns:
+        dict: The snapshot updated with all journaled records, {} if neither exists.
+    """
+    ans = load(save) if osp.exists(save) else {}
+    for k, v in _read_journal(journal_path(save)):
+        ans[k] = v
+    return ans
+
+
+def compact_checkpoint(save):
+    """Fold the journal of ``save`` into the snapshot and remove the journal.
+
+    The snapshot is replaced atomically before the journal is removed, so a crash in between only
+    leaves records that will be replayed (idempotently) next time.
+    """
+    jpth = journal_path(save)
+    ans = load_checkpoint(save)
+    if osp.exists(jpth):
+        _write_snapshot(ans, save)
+        os.remove(jpth)
+    return ans
+
+
+class CheckpointJournal:
+    """Append-only checkpoint for ``track_progress_rich``.
+
+    Every finished task is appended as one pickled ``(key, value)`` record to ``{save}.journal``, which
+    is periodically compacted into the ``save`` snapshot (and always on ``close``). Only one writer
+    (the process that collects the results) is expected per checkpoint.
+
+    Args:
+        save (str): The snapshot file, loadable with ``load``.
+        compact_every (int): Compact the journal after this many records. Defaults to 1000.
+        sync_interval (float): Minimal interval (seconds) between two fsync calls. Defaults to 1.
+    """
+
+    def __init__(self, save, compact_every=1000, sync_interval=1.0):
+        self.save = save
+        self.compact_every = compact_every
+        self.sync_interval = sync_interval
+        # Fold the leftovers of an interrupted run before appending new records
+        compact_checkpoint(save)
+        self.fout = open(journal_path(save), 'ab')
+        self.pending = 0
+        self.last_sync = time.time()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def sync(self):
+        self.fout.flush()
+        os.fsync(self.fout.fileno())
+        self.last_sync = time.time()
+
+    def append(self, key, value):
+        pickle.dump((key, value), self.fout)
+        self.fout.flush()
+        self.pending += 1
+        if time.time() - self.last_sync >= self.sync_interval:
+            self.sync()
+        if self.pending >= self.compact_every:
+            self.compact()
+
+    def compact(self):
+        self.sync()
+        _write_snapshot(load_checkpoint(self.save), self.save)
+        self.fout.truncate(0)
+        self.pending = 0
+
+    def close(self):
+        if self.fout.closed:
+            return
+        self.compact()
+        self.fout.close()
+        os.remove(journal_path(self.save))
+
+
+def _jsonable(x):
+    # numpy scalars (e.g. int64 indices of a DataFrame) are not json serializable
+    return x.item() if hasattr(x, 'item') else x
+
+
+def iter_results(pth):
+    """Stream the (index, prediction) records of a result file written by ``ResultWriter``.
+
+    A legacy pickled dict is supported as well. A truncated tail line (crash mid-write) is skipped.
+    """
+    if not pth.endswith('.jsonl'):
+        yield from load(pth).items()
+        return
+    with open(pth, encoding='utf-8') as fin:
+        for line in fin:
+            if not line.endswith('\n'):
+                break
+            record = json.loads(line)
+            yield record['index'], record['prediction']
+
+
+def load_results(pth):
+    """The {index: prediction} dict of the result file ``pth``, {} if it does not exist."""
+    if not osp.exists(pth):
+        return {}
+    return dict(iter_results(pth))
+
+
+class ResultWriter:
+    """Append-only JSONL writer for inference results, one ``{"index", "prediction"}`` line per response.
+
+    Every response is written (and flushed to the OS) as soon as it is produced, fsync calls are
+    batched to at most one per ``sync_interval`` seconds. Read it back with ``load_results``.
+
+    Args:
+        pth (str): The result file, ends with ``.jsonl``.
+        sync_interval (float): Minimal interval (seconds) between two fsync calls. Defaults to 1.
+    """
+
+    def __init__(self, pth, sync_interval=1.0):
+        assert pth.endswith('.jsonl')
+        self.pth = pth
+        self.sync_interval = sync_interval
+        self._drop_partial_tail()
+        self.fout = open(pth, 'a', encoding='utf-8')
+        self.last_sync = time.time()
+
+    def _drop_partial_tail(self):
+        # A crash mid-write leaves a partial line, appending after it would corrupt the next record
+        if not osp.exists(self.pth) or os.path.getsize(self.pth) == 0:
+            return
+        with open(self.pth, 'rb+') as fh:
+            data = fh.read()
+            if not data.endswith(b'\n'):
+                fh.truncate(data.rfind(b'\n') + 1)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def write(self, index, prediction):
+        record = dict(index=_jsonable(index), prediction=_jsonable(prediction))
+        self.fout.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self.fout.flush()
+        if time.time() - self.last_sync >= self.sync_interval:
+            self.sync()
+
+    def sync(self):
+        self.fout.flush()
+        os.fsync(self.fout.fileno())
+        self.last_sync = time.time()
+
+    def close(self):
+        if self.fout.closed:
+            return
+        self.sync()
+        self.fout.close()
@@ -1,5 +1,5 @@
 from ..smp import *
-from .dataset_config import img_root_map
+from .materialize import image_root, image_targets, load_manifest, write_image
 from abc import abstractmethod
 
 class CustomPrompt:
@@ -14,18 +14,13 @@ class CustomPrompt:
     
     def dump_image(self, line, dataset):
         assert isinstance(dataset, str)
-        img_root = osp.join('images', img_root_map[dataset])
+        img_root = image_root(dataset)
         os.makedirs(img_root, exist_ok=True)
-        if isinstance(line['image'], list):        
-            tgt_path = []
-            assert 'image_path' in line
-            for img, im_name in zip(line['image'], line['image_path']):
-                path = osp.join(img_root, im_name)
-                if not read_ok(path):
-                    decode_base64_to_image_file(img, path)
-                tgt_path.append(path)
-        else:
-            tgt_path = osp.join(img_root, f"{line['index']}.jpg")
-            if not read_ok(tgt_path):
-                decode_base64_to_image_file(line['image'], tgt_path)
-        return tgt_path
\ No newline at end of file
+        # Images listed in the manifest of `materialize_images` are known to be complete
+        manifest = load_manifest(img_root)
+        tgt_path = []
+        for img, path in image_targets(line, dataset):
+            if osp.relpath(path, img_root) not in manifest and not read_ok(path):
+                write_image(img, path)
+            tgt_path.append(path)
+        return tgt_path if isinstance(line['image'], list) else tgt_path[0]
\ No newline at end of file
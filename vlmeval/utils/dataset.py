@@ -3,6 +3,7 @@ import hashlib
 from ..smp import *
 from .dataset_config import dataset_URLs, dataset_md5_dict, img_root_map, DATASET_TYPE
 from .custom_prompt import CustomPrompt
+from .dataset_cache import DatasetCache
 
 def isliststr(s):
     return (s[0] == '[') and (s[-1] == ']')
@@ -49,14 +50,24 @@ class TSVDataset(CustomPrompt):
         file_name = url.split('/')[-1]
         data_path = osp.join(self.data_root, file_name)
 
-        if osp.exists(data_path) and md5(data_path) == dataset_md5_dict[dataset]:
+        # The processed frame is cached in a columnar format, rebuilt only when the TSV changes
+        cache = DatasetCache(data_path, dataset if skip_noimg else dataset + '_all')
+        if osp.exists(data_path) and cache.source_md5() == dataset_md5_dict[dataset]:
             pass
         else:
             warnings.warn("The dataset tsv is not downloaded")
             download_file(url, data_path)
 
-        data = load(data_path)
         self.skip_noimg = skip_noimg
+        self.data = cache.load_or_build(lambda: self.prepare_data(data_path, dataset, skip_noimg))
+
+        img_root = img_root if img_root is not None else osp.join('images', img_root_map[dataset])
+        os.makedirs(img_root, exist_ok=True)
+        self.img_root = img_root
+
+    @staticmethod
+    def prepare_data(data_path, dataset, skip_noimg=True):
+        data = load(data_path)
         if skip_noimg:
             data = data[~pd.isna(data['image'])]
 
@@ -84,12 +95,7 @@ class TSVDataset(CustomPrompt):
             ]
         if np.all([istype(x, int) for x in data['index']]):
             data['index'] = [int(x) for x in data['index']]
-            
-        self.data = data
-
-        img_root = img_root if img_root is not None else osp.join('images', img_root_map[dataset])
-        os.makedirs(img_root, exist_ok=True)
-        self.img_root = img_root
+        return data
 
     def __len__(self):
         return len(self.data)
@@ -0,0 +1,219 @@
+import json
+import mmap
+import os
+import os.path as osp
+import warnings
+import pandas as pd
+import portalocker
+from ..smp import LMUDataRoot, md5
+
+CACHE_VERSION = 1
+
+# path -> read-only mmap of an image blob, opened once per process. The pages are shared by the
+# page cache across ranks and pool workers.
+_blobs = {}
+
+
+def open_blob(pth):
+    stat = os.stat(pth)
+    # A rebuilt blob is a new inode, the mmaps of the old one stay valid for their users
+    key = (os.getpid(), pth, stat.st_ino, stat.st_mtime)
+    if key not in _blobs:
+        if stat.st_size == 0:
+            # mmap does not accept empty files
+            _blobs[key] = b''
+        else:
+            with open(pth, 'rb') as fin:
+                _blobs[key] = mmap.mmap(fin.fileno(), 0, access=mmap.ACCESS_READ)
+    return _blobs[key]
+
+
+class ImageRef:
+    """A lazy base64 image, stored at ``[offset, offset + length)`` of the blob ``blob``.
+
+    It only carries its location (also when pickled into pool workers), the base64 string is read
+    from the mmap of the blob by ``str(ref)``.
+    """
+
+    __slots__ = ('blob', 'offset', 'length')
+
+    def __init__(self, blob, offset, length):
+        self.blob = blob
+        self.offset = offset
+        self.length = length
+
+    def __str__(self):
+        return open_blob(self.blob)[self.offset: self.offset + self.length].decode('ascii')
+
+    def __repr__(self):
+        return f'ImageRef({self.blob}, offset={self.offset}, length={self.length})'
+
+    def __eq__(self, other):
+        if isinstance(other, ImageRef):
+            return (self.blob, self.offset, self.length) == (other.blob, other.offset, other.length)
+        return str(self) == other
+
+    def __hash__(self):
+        return hash((self.blob, self.offset, self.length))
+
+
+def _islist(x):
+    return isinstance(x, (list, tuple))
+
+
+class DatasetCache:
+    """One-time columnar conversion of a benchmark TSV.
+
+    The processed frame of ``TSVDataset`` is stored under ``{LMUDataRoot}/.cache/{name}/``:
+    ``meta.parquet`` holds every column but the images (list columns are json-encoded, and the
+    ``image`` column is replaced by the ``[offset, length]`` of each image in the blob),
+    ``images.bin`` holds each distinct base64 image once, and ``key.json`` holds the size, mtime and
+    md5 of the source TSV the cache was built from. The md5 is only recomputed when the size or
+    mtime of the source changes. Without ``pyarrow``, the meta frame is pickled instead.
+
+    In the loaded frame, the ``image`` column holds ``ImageRef`` objects (lists of them for
+    multi-image rows) rather than the base64 strings.
+
+    Args:
+        data_path (str): The source TSV.
+        name (str): The cache name, usually the dataset name (with a variant suffix if needed).
+    """
+
+    def __init__(self, data_path, name):
+        self.data_path = data_path
+        self.root = osp.join(LMUDataRoot(), '.cache', name)
+        self.key_file = osp.join(self.root, 'key.json')
+        self.blob_file = osp.join(self.root, 'images.bin')
+        self._md5 = None
+
+    def _stamp(self):
+        stat = os.stat(self.data_path)
+        return dict(size=stat.st_size, mtime=stat.st_mtime)
+
+    def _read_key(self):
+        if not osp.exists(self.key_file):
+            return None
+        try:
+            with open(self.key_file) as fin:
+                key = json.load(fin)
+        except Exception:
+            return None
+        return key if key.get('version', None) == CACHE_VERSION else None
+
+    def source_md5(self):
+        """The md5 of the source TSV, taken from ``key.json`` if the source is unchanged since."""
+        stamp = self._stamp()
+        key = self._read_key()
+        if key is not None and key['size'] == stamp['size'] and key['mtime'] == stamp['mtime']:
+            return key['md5']
+        if self._md5 is None or self._md5[0] != stamp:
+            self._md5 = (stamp, md5(self.data_path))
+        return self._md5[1]
+
+    def valid(self):
+        key = self._read_key()
+        if key is None or not osp.exists(self.data_path):
+            return False
+        stamp = self._stamp()
+        if key['size'] != stamp['size'] or key['mtime'] != stamp['mtime']:
+            return False
+        return osp.exists(osp.join(self.root, key['meta'])) and osp.exists(self.blob_file)
+
+    def load(self):
+        """The cached frame, None if the cache is missing or stale."""
+        if not self.valid():
+            return None
+        key = self._read_key()
+        meta_file = osp.join(self.root, key['meta'])
+        if meta_file.endswith('.parquet'):
+            data = pd.read_parquet(meta_file)
+            # Parquet turns NaN into None in object columns, restore what `read_csv` gives
+            for k in data.columns:
+                if data[k].dtype == object:
+                    data[k] = data[k].where(data[k].notna(), float('nan'))
+        else:
+            data = pd.read_pickle(meta_file)
+        for k in key['list_columns']:
+            data[k] = [json.loads(x) for x in data[k]]
+        if key['image']:
+            data['image'] = self.resolve(data['image'])
+        return data
+
+    def resolve(self, refs):
+        # Rows sharing an image share the ImageRef
+        memo = {}
+
+        def get(ref):
+            off, length = ref
+            if off not in memo:
+                memo[off] = ImageRef(self.blob_file, off, length)
+            return memo[off]
+
+        refs = [json.loads(x) for x in refs]
+        return [[get(r) for r in ref] if _islist(ref[0]) else get(ref) for ref in refs]
+
+    def save(self, data):
+        src_md5 = self.source_md5()
+        data = data.copy()
+        os.makedirs(self.root, exist_ok=True)
+        # Invalidate first, so that readers never pair the old key with new files
+        if osp.exists(self.key_file):
+            os.remove(self.key_file)
+        has_image = 'image' in data
+        if has_image:
+            # Each distinct image is written once, rows sharing an image share its offset
+            offsets, pos = {}, 0
+            tmp_blob = osp.join(self.root, '.images.bin')
+            with open(tmp_blob, 'wb') as fout:
+                def put(im):
+                    nonlocal pos
+                    im = str(im)
+                    if im not in offsets:
+                        buf = im.encode('ascii')
+                        fout.write(buf)
+                        offsets[im] = [pos, len(buf)]
+                        pos += len(buf)
+                    return offsets[im]
+                refs = [[put(x) for x in im] if _islist(im) else put(im) for im in data['image']]
+            data['image'] = [json.dumps(r) for r in refs]
+        list_columns = [k for k in data.columns if k != 'image' and any(_islist(x) for x in data[k])]
+        for k in list_columns:
+            data[k] = [json.dumps(x, ensure_ascii=False) for x in data[k]]
+
+        meta = 'meta.parquet'
+        try:
+            data.to_parquet(osp.join(self.root, '.' + meta))
+        except ImportError:
+            meta = 'meta.pkl'
+            data.to_pickle(osp.join(self.root, '.' + meta))
+        except Exception as err:
+            warnings.warn(f'Failed to write the parquet cache of {self.data_path} ({err}), pickle it instead. ')
+            meta = 'meta.pkl'
+            data.to_pickle(osp.join(self.root, '.' + meta))
+
+        if has_image:
+            os.replace(tmp_blob, self.blob_file)
+        else:
+            open(self.blob_file, 'wb').close()
+        os.replace(osp.join(self.root, '.' + meta), osp.join(self.root, meta))
+        key = dict(
+            version=CACHE_VERSION, md5=src_md5, meta=meta,
+            image=has_image, list_columns=list_columns, **self._stamp())
+        # key.json is written last, a cache is never valid before all its files are in place
+        tmp_key = osp.join(self.root, '.key.json')
+        with open(tmp_key, 'w') as fout:
+            json.dump(key, fout)
+        os.replace(tmp_key, self.key_file)
+
+    def load_or_build(self, build):
+        """Load the cache, or build the frame with ``build()`` and cache it (once across processes)."""
+        data = self.load()
+        if data is not None:
+            return data
+        os.makedirs(self.root, exist_ok=True)
+        with portalocker.Lock(osp.join(self.root, '.lock'), mode='a', timeout=3600):
+            data = self.load()
+            if data is None:
+                self.save(build())
+                data = self.load()
+        return data
@@ -1,64 +1,113 @@
 import string
-import copy as cp
 import os
+from collections import OrderedDict
 from ..smp import *
 
-def can_infer_option(answer, choices):
-    verbose = os.environ.get('VERBOSE', 0)
-    # Choices is a dictionary
-    if 'Failed to obtain answer via API' in answer:
-        return False
-    
-    bard_err = [
-        "Sorry, I can't help with images of people yet.",
-        "I can't process this file."
-    ]
-    for err in bard_err:
-        if err in answer:
-            return 'Z'
-    
-    def count_choice(splits, choices, prefix='', suffix=''):
-        cnt = 0
-        for c in choices:
-            if prefix + c + suffix in splits:
-                cnt += 1
-        return cnt
-
-    answer_mod = cp.copy(answer)
-    chars = '.()[],:;!*#{}'
-    for c in chars:
-        answer_mod = answer_mod.replace(c, ' ')
-        
-    splits = [x.strip() for x in answer_mod.split()]
-    count = count_choice(splits, choices)
-
-    if count == 1:
-        for ch in choices:
-            if 'A' in splits and len(splits) > 3 and verbose:
+# Punctuation that separates an option letter from its context, e.g. "(A)", "A.", "[B]"
+OPTION_SEPS = '.()[],:;!*#{}'
+_option_table = str.maketrans(OPTION_SEPS, ' ' * len(OPTION_SEPS))
+
+BARD_ERRORS = [
+    "Sorry, I can't help with images of people yet.",
+    "I can't process this file."
+]
+
+
+class ChoiceMatcher:
+    """Infer the option chosen by a free-form answer among ``choices``, a dict {option letter: option text}.
+
+    Built once per choice set: the option letters and the lowercased option texts are prepared at
+    construction, so matching an answer costs one ``str.translate`` and one ``split`` (letter matching)
+    plus one ``lower`` (text matching). ``matcher(answer)`` is ``can_infer(answer, choices)`` and
+    ``matcher.batch(answers)`` applies it to a whole prediction column.
+
+    Args:
+        choices (dict): The options, e.g. {'A': 'cat', 'B': 'dog'}.
+    """
+
+    def __init__(self, choices):
+        self.options = list(choices)
+        self.option_set = set(self.options)
+        self.texts = [(k, str(v).lower()) for k, v in choices.items()]
+        self.text_ok = all(k in string.ascii_uppercase for k in self.options)
+
+    def infer_option(self, answer):
+        if 'Failed to obtain answer via API' in answer:
+            return False
+        for err in BARD_ERRORS:
+            if err in answer:
+                return 'Z'
+
+        splits = answer.translate(_option_table).split()
+        found = self.option_set.intersection(splits)
+        if len(found) == 1:
+            if 'A' in splits and len(splits) > 3 and os.environ.get('VERBOSE', 0):
                 logger = get_logger('Evaluation')
                 logger.info(f'A might be a quantifier in the string: {answer}.')
                 return False
-            if ch in splits:
-                return ch
-    elif count == 0 and count_choice(splits, {'Z', ''}) == 1:
-        return 'Z'
-    return False
+            return found.pop()
+        elif not len(found) and 'Z' in splits:
+            return 'Z'
+        return False
+
+    def infer_text(self, answer):
+        assert self.text_ok
+        answer = answer.lower()
+        cands = [k for k, text in self.texts if text in answer]
+        if len(cands) == 1:
+            return cands[0]
+        return False
+
+    def __call__(self, answer):
+        answer = str(answer)
+        copt = self.infer_option(answer)
+        return copt if copt else self.infer_text(answer)
+
+    def batch(self, answers):
+        return [self(x) for x in answers]
+
+
+# Matchers of the recently used choice sets, e.g. the shared options of yes / no or rating questions
+_matchers = OrderedDict()
+MATCHER_CACHE_SIZE = 4096
+
+
+def build_matcher(choices):
+    """The (cached) ``ChoiceMatcher`` of ``choices``."""
+    key = tuple((k, str(v)) for k, v in choices.items())
+    matcher = _matchers.get(key, None)
+    if matcher is None:
+        matcher = ChoiceMatcher(choices)
+        _matchers[key] = matcher
+        if len(_matchers) > MATCHER_CACHE_SIZE:
+            _matchers.popitem(last=False)
+    return matcher
+
+
+def can_infer_batch(answers, choices):
+    """``can_infer`` over a column of answers.
+
+    Args:
+        answers (list): The answers.
+        choices (dict | list[dict]): The choices shared by all answers, or the choices of each answer.
+
+    Returns:
+        list: The inferred option of each answer (False if it can not be inferred).
+    """
+    if isinstance(choices, dict):
+        return build_matcher(choices).batch(answers)
+    assert len(answers) == len(choices)
+    return [build_matcher(c)(x) for x, c in zip(answers, choices)]
+
+
+def can_infer_option(answer, choices):
+    return build_matcher(choices).infer_option(answer)
+
 
 def can_infer_text(answer, choices):
-    answer = answer.lower()
     assert isinstance(choices, dict)
-    for k in choices:
-        assert k in string.ascii_uppercase
-        choices[k] = str(choices[k]).lower()
-    cands = []
-    for k in choices:
-        if choices[k] in answer:
-            cands.append(k)
-    if len(cands) == 1:
-        return cands[0]
-    return False
+    return build_matcher(choices).infer_text(answer)
+
 
 def can_infer(answer, choices):
-    answer = str(answer)
-    copt = can_infer_option(answer, choices)
-    return copt if copt else can_infer_text(answer, choices)
\ No newline at end of file
+    return build_matcher(choices)(answer)
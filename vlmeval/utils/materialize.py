@@ -0,0 +1,102 @@
+import json
+import threading
+from ..smp import *
+from .dataset_config import img_root_map
+from .mp_util import track_progress_rich
+
+MANIFEST = 'manifest.json'
+
+# (img_root, mtime) -> manifest, reloaded only when the manifest file changes
+_manifests = {}
+
+
+def image_root(dataset):
+    return osp.join('images', img_root_map[dataset])
+
+
+def image_targets(line, dataset):
+    """The (image, path) pairs of a dataset record, ``image`` being a base64 string or an ``ImageRef``."""
+    img_root = image_root(dataset)
+    if isinstance(line['image'], list):
+        assert 'image_path' in line
+        return [(img, osp.join(img_root, im_name)) for img, im_name in zip(line['image'], line['image_path'])]
+    return [(line['image'], osp.join(img_root, f"{line['index']}.jpg"))]
+
+
+def load_manifest(img_root):
+    """The manifest of ``img_root``: {file name: [index, size, md5]}, {} if it has not been prepared."""
+    pth = osp.join(img_root, MANIFEST)
+    if not osp.exists(pth):
+        return {}
+    key = (osp.abspath(img_root), osp.getmtime(pth))
+    if key not in _manifests:
+        with open(pth) as fin:
+            _manifests[key] = json.load(fin)
+    return _manifests[key]
+
+
+def write_image(image, path):
+    """Decode ``image`` (a base64 string or an ``ImageRef``) to ``path``, atomically.
+
+    The image is written to a temporary file private to the calling thread and renamed into place, so
+    concurrent writers of the same image (e.g. the models of a sweep) never read a partial file.
+    """
+    dirname, basename = osp.split(path)
+    # The extension of the temporary file decides the format PIL writes
+    tmp = osp.join(dirname, f'.{os.getpid()}.{threading.get_ident()}.{basename}')
+    decode_base64_to_image_file(str(image), tmp)
+    os.replace(tmp, path)
+
+
+def _materialize(index, image, path):
+    # Images dumped lazily by a previous run are kept as they are
+    if not read_ok(path):
+        write_image(image, path)
+    return index, os.path.getsize(path), md5(path)
+
+
+def materialize_images(dataset, nproc=None):
+    """Decode all images of ``dataset`` to ``images/{img_root}`` before inference.
+
+    Images are decoded by a process pool and renamed into place once written, so an interrupted run
+    never leaves a partial file. The (index, path, size, md5) of every image is then recorded in
+    ``manifest.json`` under the image root, ``CustomPrompt.dump_image`` skips the files listed there
+    without opening them. Images already listed in the manifest are not processed again.
+
+    Args:
+        dataset (str): The dataset name.
+        nproc (int, optional): The pool size. Defaults to the number of CPUs (at most 32).
+
+    Returns:
+        dict: The manifest, {file name: [index, size, md5]}.
+    """
+    from .dataset import TSVDataset
+    logger = get_logger('Prepare')
+    data = TSVDataset(dataset).data
+    img_root = image_root(dataset)
+    os.makedirs(img_root, exist_ok=True)
+    manifest = dict(load_manifest(img_root))
+
+    tasks, names, seen = [], [], set()
+    for i in range(len(data)):
+        line = data.iloc[i]
+        for image, path in image_targets(line, dataset):
+            name = osp.relpath(path, img_root)
+            if name not in manifest and name not in seen:
+                tasks.append(dict(index=line['index'], image=image, path=path))
+                names.append(name)
+                seen.add(name)
+
+    if len(tasks):
+        nproc = min(32, os.cpu_count() or 1) if nproc is None else nproc
+        results = track_progress_rich(
+            _materialize, tasks, nproc=nproc, chunksize=16, description=f'Materializing {dataset}')
+        for name, res in zip(names, results):
+            index, size, hash = res
+            manifest[name] = [int(index) if isinstance(index, (int, np.integer)) else str(index), size, hash]
+        tmp = osp.join(img_root, '.' + MANIFEST)
+        with open(tmp, 'w') as fout:
+            json.dump(manifest, fout)
+        os.replace(tmp, osp.join(img_root, MANIFEST))
+    logger.info(f'{len(manifest)} images of {dataset} are materialized under {img_root}, {len(tasks)} newly. ')
+    return manifest
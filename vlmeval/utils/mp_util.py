@@ -8,6 +8,7 @@ from rich.text import Text
 import os.path as osp
 import portalocker
 from ..smp import load, dump
+from .checkpoint import CheckpointJournal
 
 
 class _Worker:
@@ -57,6 +58,9 @@ def track_progress_rich(func: Callable,
                         chunksize: int = 1,
                         description: str = 'Processing',
                         save=None, keys=None,
+                        journal: bool = True,
+                        compact_every: int = 1000,
+                        callback: Callable = None,
                         color: str = 'blue') -> list:
     """Track the progress of parallel task execution with a progress bar. The
     built-in :mod:`multiprocessing` module is used for process pools and tasks
@@ -84,6 +88,20 @@ def track_progress_rich(func: Callable,
             Defaults to 1.
         description (str): The description of progress bar.
             Defaults to "Process".
+        save (str, optional): The checkpoint file (a dict keyed by ``keys``)
+            to record every finished task in. Defaults to None.
+        keys (list, optional): The checkpoint key of each task, required
+            when ``save`` is set. Defaults to None.
+        journal (bool): If True, finished tasks are appended to
+            ``{save}.journal`` and compacted into ``save`` every
+            ``compact_every`` records and at the end. Otherwise, ``save`` is
+            rewritten under a file lock for every finished task. Use
+            :func:`load_checkpoint` to read a checkpoint that may hold a
+            journal. Defaults to True.
+        compact_every (int): See ``journal``. Defaults to 1000.
+        callback (callable, optional): Called with ``(key, result)`` of every
+            finished task as soon as it is collected, in the calling process.
+            The key is the task position if ``keys`` is None. Defaults to None.
         color (str): The color of progress bar. Defaults to "blue".
 
     Examples:
@@ -138,26 +156,44 @@ def track_progress_rich(func: Callable,
         total=task_num, color=color, description=description)
     tasks = _tasks_with_index(tasks)
 
+    ckpt = None
+    if save is not None and journal:
+        ckpt = CheckpointJournal(save, compact_every=compact_every)
+
+    def record(idx, result, verbose):
+        if callback is not None:
+            callback(idx if keys is None else keys[idx], result)
+        if save is None:
+            return
+        if ckpt is not None:
+            ckpt.append(keys[idx], result)
+            if verbose:
+                print(keys[idx], result, flush=True)
+            return
+        with portalocker.Lock(save, timeout=5) as fh:
+            ans = load(save)
+            ans[keys[idx]] = result
+
+            if verbose:
+                print(keys[idx], result, flush=True)
+
+            dump(ans, save)
+            fh.flush()
+            os.fsync(fh.fileno())
+
     # Use single process when nproc is 1, else use multiprocess.
     with prog_bar:
         if nproc == 1:
             results = []
-            for task in tasks:
-                result, idx = worker(task)
-                results.append(worker(task)[0])
-                if save is not None:
-                    with portalocker.Lock(save, timeout=5) as fh:
-                        ans = load(save)
-                        ans[keys[idx]] = result
-
-                        if os.environ.get('VERBOSE', True):
-                            print(keys[idx], result, flush=True)
-
-                        dump(ans, save)
-                        fh.flush()
-                        os.fsync(fh.fileno())
-                
-                prog_bar.update(task_id, advance=1, refresh=True)
+            try:
+                for task in tasks:
+                    result, idx = worker(task)
+                    results.append(result)
+                    record(idx, result, os.environ.get('VERBOSE', True))
+                    prog_bar.update(task_id, advance=1, refresh=True)
+            finally:
+                if ckpt is not None:
+                    ckpt.close()
         else:
             with Pool(nproc) as pool:
                 results = []
@@ -167,24 +203,15 @@ def track_progress_rich(func: Callable,
                     for result in gen:
                         result, idx = result
                         unordered_results.append((result, idx))
-
-                        if save is not None:
-                            with portalocker.Lock(save, timeout=5) as fh:
-                                ans = load(save)
-                                ans[keys[idx]] = result
-
-                                if os.environ.get('VERBOSE', False):
-                                    print(keys[idx], result, flush=True)
-
-                                dump(ans, save)
-                                fh.flush()
-                                os.fsync(fh.fileno())
-
+                        record(idx, result, os.environ.get('VERBOSE', False))
                         results.append(None)
                         prog_bar.update(task_id, advance=1, refresh=True)
                 except Exception as e:
                     prog_bar.stop()
                     raise e
+                finally:
+                    if ckpt is not None:
+                        ckpt.close()
             for result, idx in unordered_results:
                 results[idx] = result
     return results
\ No newline at end of file
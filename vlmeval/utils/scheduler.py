@@ -0,0 +1,76 @@
+import string
+import pandas as pd
+
+# The rough prompt cost of one image, in tokens (e.g. 576 patches for a 336px ViT-L/14)
+IMAGE_TOKENS = 576
+
+
+def count_images(line):
+    if 'image' not in line:
+        return 0
+    image = line['image']
+    if isinstance(image, list):
+        return len(image)
+    return 0 if pd.isna(image) else 1
+
+
+def estimate_tokens(line):
+    """A cheap estimate of the text tokens of a record (question, hint and options), without a tokenizer.
+
+    ASCII text is counted as 4 characters per token and any other character (e.g. CJK) as one token.
+    """
+    text = str(line['question']) if 'question' in line else ''
+    for k in ['hint'] + list(string.ascii_uppercase):
+        if k in line and not pd.isna(line[k]):
+            text += str(line[k])
+    n_ascii = sum(c.isascii() for c in text)
+    return (n_ascii + 3) // 4 + len(text) - n_ascii
+
+
+def estimate_cost(line):
+    return estimate_tokens(line) + IMAGE_TOKENS * count_images(line)
+
+
+def schedule(data, batch_size=1, max_batch_tokens=None):
+    """Order the records of ``data`` for dispatching, longest first.
+
+    With ``batch_size == 1`` (API models, or local models without ``batch_generate``), records are
+    sorted by decreasing estimated cost, so that the long multi-step prompts start early and the
+    concurrency slots are not left idle behind a few long requests at the end. Otherwise, records
+    are bucketed by image count (samples of a batch share the image layout) and packed into batches
+    of similar cost, of at most ``batch_size`` records and, if ``max_batch_tokens`` is set, at most
+    ``max_batch_tokens`` padded tokens (``len(batch) * max cost``).
+
+    Args:
+        data (pd.DataFrame): The records to schedule.
+        batch_size (int): The maximal number of records per batch. Defaults to 1.
+        max_batch_tokens (int, optional): The padded token budget of a batch. Defaults to None.
+
+    Returns:
+        list[list[int]]: Batches of positions (``iloc``) in ``data``, in dispatch order.
+    """
+    lines = [data.iloc[i] for i in range(len(data))]
+    costs = [estimate_cost(line) for line in lines]
+    order = sorted(range(len(lines)), key=lambda i: -costs[i])
+    if batch_size <= 1:
+        return [[i] for i in order]
+
+    buckets = {}
+    for i in order:
+        buckets.setdefault(count_images(lines[i]), []).append(i)
+    batches = []
+    for bucket in buckets.values():
+        batch = []
+        for i in bucket:
+            # The bucket is sorted, the first record of a batch has the largest cost
+            full = len(batch) == batch_size
+            if max_batch_tokens is not None and len(batch):
+                full = full or (len(batch) + 1) * costs[batch[0]] > max_batch_tokens
+            if full:
+                batches.append(batch)
+                batch = []
+            batch.append(i)
+        if len(batch):
+            batches.append(batch)
+    batches.sort(key=lambda b: -costs[b[0]])
+    return batches
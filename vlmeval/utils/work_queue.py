@@ -0,0 +1,103 @@
+import json
+import os
+import os.path as osp
+import time
+import portalocker
+
+
+class WorkQueue:
+    """A chunked work queue shared by the ranks of a distributed run through a locked JSON file.
+
+    Ranks pull chunks of dataset positions until the queue is drained, so that fast ranks take over
+    the work of slow ones instead of waiting for them at the barrier. Once the queue is drained, an
+    idle rank re-dispatches the chunk of a straggler (a chunk leased for longer than
+    ``straggler_factor`` times the median chunk duration, e.g. a rank stuck on long generations).
+    Whichever rank finishes the chunk first marks it done, and the other one abandons it after its
+    current item (see ``is_done``). The file must live on a filesystem shared by all ranks.
+
+    Args:
+        path (str): The queue file.
+        straggler_factor (float): Re-dispatch chunks leased for this many median chunk durations.
+            Defaults to 2.
+    """
+
+    def __init__(self, path, straggler_factor=2):
+        self.path = path
+        self.straggler_factor = straggler_factor
+
+    @classmethod
+    def create(cls, path, positions, chunk_size, **kwargs):
+        """Create (or reset) the queue of ``positions``, to be called by a single rank."""
+        chunks = [positions[i: i + chunk_size] for i in range(0, len(positions), chunk_size)]
+        state = dict(
+            chunks=chunks, pending=list(range(len(chunks))), leased={}, done=[], durations=[])
+        tmp = osp.join(osp.dirname(path), '.' + osp.basename(path))
+        with open(tmp, 'w') as fout:
+            json.dump(state, fout)
+        os.replace(tmp, path)
+        return cls(path, **kwargs)
+
+    def _update(self, func):
+        with portalocker.Lock(self.path, mode='r+', timeout=600) as fh:
+            state = json.load(fh)
+            ret = func(state, time.time())
+            fh.seek(0)
+            fh.truncate()
+            json.dump(state, fh)
+            fh.flush()
+        return ret
+
+    def pull(self, rank):
+        """Lease the next chunk to ``rank``.
+
+        Returns:
+            tuple: (chunk_id, positions), or None if there is nothing left to do for ``rank``.
+        """
+        def func(state, now):
+            if len(state['pending']):
+                cid = state['pending'].pop(0)
+                state['leased'][str(cid)] = [[rank, now]]
+                return cid, state['chunks'][cid]
+            if not len(state['durations']):
+                return None
+            durations = sorted(state['durations'])
+            threshold = self.straggler_factor * durations[len(durations) // 2]
+            # The chunk leased for the longest time, each chunk is re-dispatched once at most
+            candidates = [
+                (leases[0][1], int(cid)) for cid, leases in state['leased'].items()
+                if len(leases) == 1 and leases[0][0] != rank and now - leases[0][1] > threshold]
+            if not len(candidates):
+                return None
+            _, cid = min(candidates)
+            state['leased'][str(cid)].append([rank, now])
+            return cid, state['chunks'][cid]
+        return self._update(func)
+
+    def finish(self, cid, rank):
+        def func(state, now):
+            leases = state['leased'].pop(str(cid), None)
+            if cid in state['done']:
+                return
+            state['done'].append(cid)
+            if leases is not None:
+                start = [ts for r, ts in leases if r == rank]
+                if len(start):
+                    state['durations'].append(now - start[0])
+        self._update(func)
+
+    def is_done(self, cid):
+        with portalocker.Lock(self.path, mode='r', timeout=600, flags=portalocker.LOCK_SH | portalocker.LOCK_NB) as fh:
+            return cid in json.load(fh)['done']
+
+    def iter_chunks(self, rank, interval=1):
+        """Yield the chunks for ``rank`` until all chunks are done or leased to others for good."""
+        while True:
+            item = self.pull(rank)
+            if item is not None:
+                yield item
+                continue
+            # Nothing to pull: stop once no chunk can become a straggler to re-dispatch anymore
+            state = self._update(lambda state, now: dict(leased=state['leased']))
+            if all(len(leases) > 1 or leases[0][0] == rank for leases in state['leased'].values()):
+                return
+            time.sleep(interval)
@@ -1,19 +1,50 @@
-import torch
-torch.set_grad_enabled(False)
-torch.manual_seed(1234)
-from .qwen_vl import QwenVL, QwenVLChat
-from .transcore_m import TransCoreM
-from .pandagpt import PandaGPT
-from .open_flamingo import OpenFlamingo
-from .idefics import IDEFICS
-from .llava import LLaVA
-from .instructblip import InstructBLIP
-from .visualglm import VisualGLM
-from .minigpt4 import MiniGPT4
-from .xcomposer import XComposer
-from .mplug_owl2 import mPLUG_Owl2
-from .llava_xtuner import LLaVA_XTuner
-from .cogvlm import CogVlm
-from .sharedcaptioner import SharedCaptioner
-from .emu import Emu
-from .monkey import Monkey, MonkeyChat
+import importlib
+
+# Model classes are imported on first access (PEP 562), so that API-only runs and the evaluators do
+# not import torch and the dependencies of every model.
+_registry = {
+    'QwenVL': 'qwen_vl',
+    'QwenVLChat': 'qwen_vl',
+    'TransCoreM': 'transcore_m',
+    'PandaGPT': 'pandagpt',
+    'OpenFlamingo': 'open_flamingo',
+    'IDEFICS': 'idefics',
+    'LLaVA': 'llava',
+    'InstructBLIP': 'instructblip',
+    'VisualGLM': 'visualglm',
+    'MiniGPT4': 'minigpt4',
+    'XComposer': 'xcomposer',
+    'mPLUG_Owl2': 'mplug_owl2',
+    'LLaVA_XTuner': 'llava_xtuner',
+    'CogVlm': 'cogvlm',
+    'SharedCaptioner': 'sharedcaptioner',
+    'Emu': 'emu',
+    'Monkey': 'monkey',
+    'MonkeyChat': 'monkey',
+}
+
+__all__ = list(_registry)
+
+_torch_ready = False
+
+
+def _init_torch():
+    # The global torch settings of local inference, applied before the first model module is imported
+    global _torch_ready
+    if not _torch_ready:
+        import torch
+        torch.set_grad_enabled(False)
+        torch.manual_seed(1234)
+        _torch_ready = True
+
+
+def __getattr__(name):
+    if name in _registry:
+        _init_torch()
+        module = importlib.import_module(f'.{_registry[name]}', __name__)
+        return getattr(module, name)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -4,6 +4,7 @@ import warnings
 import os.path as osp
 from vlmeval.smp import isimg
 from ..utils import CustomPrompt
+from ..utils.batching import left_pad
 import re
 
 class Monkey:
@@ -17,15 +18,23 @@ class Monkey:
         model = AutoModelForCausalLM.from_pretrained(model_path, device_map='cpu', trust_remote_code=True)
         model.eval()
         self.model = model.cuda()
+        # The number of samples per `batch_generate` call
+        self.batch_size = kwargs.pop('batch_size', 8)
         self.kwargs = kwargs
         warnings.warn(f"Following kwargs received: {self.kwargs}, will use as generation config. ")
         torch.cuda.empty_cache()
+
+    def build_input(self, image_path, prompt, dataset=None):
+        return f'<img>{image_path}</img> {prompt} Answer:'
     
     def generate(self, image_path, prompt, dataset=None):
-        cur_prompt = f'<img>{image_path}</img> {prompt} Answer:'
-        input_ids = self.tokenizer(cur_prompt, return_tensors='pt', padding='longest')
-        attention_mask = input_ids.attention_mask
-        input_ids = input_ids.input_ids
+        return self.batch_generate([dict(image=image_path, text=prompt)], dataset=dataset)[0]
+
+    def batch_generate(self, structs, dataset=None):
+        input_ids, attention_mask = left_pad([
+            self.tokenizer(self.build_input(s['image'], s['text'], dataset), return_tensors='pt').input_ids[0]
+            for s in structs
+        ], self.tokenizer.eod_id)
         
         output_ids = self.model.generate(
                 input_ids=input_ids.cuda(),
@@ -41,9 +50,9 @@ class Monkey:
                 pad_token_id=self.tokenizer.eod_id,
                 eos_token_id=self.tokenizer.eod_id,
             )
-        response = self.tokenizer.decode(output_ids[0][input_ids.size(1):].cpu(), skip_special_tokens=True).strip()
-        
-        return response
+        return [
+            self.tokenizer.decode(x[input_ids.size(1):].cpu(), skip_special_tokens=True).strip() for x in output_ids
+        ]
 
 class MonkeyChat:
 
@@ -54,6 +63,8 @@ class MonkeyChat:
         self.model_path = model_path
         self.tokenizer = AutoTokenizer.from_pretrained(model_path, trust_remote_code=True)
         self.model = AutoModelForCausalLM.from_pretrained(model_path, device_map='cuda', trust_remote_code=True).eval()
+        # The number of samples per `batch_generate` call
+        self.batch_size = kwargs.pop('batch_size', 8)
         self.kwargs = kwargs
         
         self.tokenizer.padding_side = 'left'
@@ -61,15 +72,20 @@ class MonkeyChat:
 
         warnings.warn(f"Following kwargs received: {self.kwargs}, will use as generation config. ")
         torch.cuda.empty_cache()
+
+    def build_input(self, image_path, prompt, dataset=None):
+        if dataset == 'MMVet':
+            return f'<img>{image_path}</img> {prompt} Answer: '
+        return f'<img>{image_path}</img> \n {prompt} Answer: '
     
     def generate(self, image_path, prompt, dataset=None):
-        if dataset == 'MMVet':
-            cur_prompt = f'<img>{image_path}</img> {prompt} Answer: '
-        else:
-            cur_prompt = f'<img>{image_path}</img> \n {prompt} Answer: '
-        input_ids = self.tokenizer(cur_prompt, return_tensors='pt', padding='longest')
-        attention_mask = input_ids.attention_mask
-        input_ids = input_ids.input_ids
+        return self.batch_generate([dict(image=image_path, text=prompt)], dataset=dataset)[0]
+
+    def batch_generate(self, structs, dataset=None):
+        input_ids, attention_mask = left_pad([
+            self.tokenizer(self.build_input(s['image'], s['text'], dataset), return_tensors='pt').input_ids[0]
+            for s in structs
+        ], self.tokenizer.eod_id)
         
         output_ids = self.model.generate(
                 input_ids=input_ids.cuda(),
@@ -85,6 +101,6 @@ class MonkeyChat:
                 pad_token_id=self.tokenizer.eod_id,
                 eos_token_id=self.tokenizer.eod_id,
             )
-        response = self.tokenizer.decode(output_ids[0][input_ids.size(1):].cpu(), skip_special_tokens=True).strip()
-        
-        return response
+        return [
+            self.tokenizer.decode(x[input_ids.size(1):].cpu(), skip_special_tokens=True).strip() for x in output_ids
+        ]
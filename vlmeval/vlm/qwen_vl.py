@@ -3,6 +3,7 @@ from transformers import AutoModelForCausalLM, AutoTokenizer
 import warnings
 import os.path as osp
 from vlmeval.smp import isimg
+from ..utils.batching import left_pad
 import re
 
 class QwenVL:
@@ -14,6 +15,8 @@ class QwenVL:
         self.model_path = model_path
         self.tokenizer = AutoTokenizer.from_pretrained(model_path, trust_remote_code=True)
         self.model = AutoModelForCausalLM.from_pretrained(model_path, device_map='cuda', trust_remote_code=True).eval()
+        # The number of samples per `batch_generate` call
+        self.batch_size = kwargs.pop('batch_size', 8)
         self.kwargs = kwargs
         warnings.warn(f"Following kwargs received: {self.kwargs}, will use as generation config. ")
         torch.cuda.empty_cache()
@@ -28,6 +31,19 @@ class QwenVL:
         response = self.tokenizer.decode(pred.cpu()[0], skip_special_tokens=False)
         response = response.split(prompt)[1].split('<|endoftext|>')[0]
         return response
+
+    def batch_generate(self, structs, dataset=None):
+        queries = [self.tokenizer.from_list_format([{'image': s['image']}, {'text': s['text']}]) for s in structs]
+        input_ids, attention_mask = left_pad(
+            [self.tokenizer(q, return_tensors='pt').input_ids[0] for q in queries], self.tokenizer.eod_id)
+        pred = self.model.generate(
+            input_ids=input_ids.to(self.model.device), attention_mask=attention_mask.to(self.model.device),
+            pad_token_id=self.tokenizer.eod_id, **self.kwargs)
+        responses = []
+        for p in pred.cpu():
+            response = self.tokenizer.decode(p[input_ids.shape[1]:], skip_special_tokens=False)
+            responses.append(response.split('<|endoftext|>')[0])
+        return responses
     
     def multi_generate(self, image_paths, prompt, dataset=None):
         vl_list = [{'image': img} for img in image_paths] + [{'text': prompt}]